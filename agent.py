@@ -1,68 +1,163 @@
+import logging
+import os
+import sys
+
 from dotenv import load_dotenv
-from google.generativeai.client import configure as genai_configure
-from google.generativeai.generative_models import GenerativeModel as genai
-from livekit import agents
-from livekit.agents import AgentSession, Agent, RoomInputOptions
-from livekit.plugins import (
-    noise_cancellation,
-)
-from livekit.plugins import google
+
+from startup import import_timer, log_startup_report
+
+# Load .env before any module reads its settings at import time
+load_dotenv()
+
+with import_timer("livekit.agents"):
+    from livekit import agents
+    from livekit.agents import AgentSession, Agent, RoomInputOptions
+with import_timer("livekit.plugins"):
+    # Plugins register themselves at import, so they have to be loaded on the main thread
+    from livekit.plugins import (
+        noise_cancellation,
+    )
+    from livekit.plugins import google
 from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
-from tools import get_weather, recognize_song,get_agent_capabilities, search_web, send_email, read_emails, search_emails, set_reminder, calculate_medication_schedule, check_health_symptoms, help_with_technology, get_news_summary, convert_units, emergency_contacts_info, find_local_services, get_current_date_time, spark_imagination, search_google, search_google_news, visit_website, read_article, write_code_with_gemini, explain_code_with_gemini, debug_code_with_gemini, learn_programming_with_gemini
+from http_client import close_http_client
+from reminders import get_scheduler
+from metrics import start_metrics_server
+from loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from news_digest import close_news_digests, get_news_digests
+
+TOOL_NAMES = [
+    "get_weather",
+    "search_web",
+    "answer_complex_question",
+    "search_google",
+    "search_google_news",
+    "send_email",
+    "check_email_status",
+    "read_emails",
+    "search_emails",
+    "set_reminder",
+    "calculate_medication_schedule",
+    "check_health_symptoms",
+    "help_with_technology",
+    "get_news_summary",
+    "convert_units",
+    "emergency_contacts_info",
+    "find_local_services",
+    "get_current_date_time",
+    "spark_imagination",
+    "visit_website",
+    "visit_websites",
+    "read_article",
+    "write_code_with_gemini",
+    "explain_code_with_gemini",
+    "debug_code_with_gemini",
+    "learn_programming_with_gemini",
+    "recognize_song",
+    "get_agent_capabilities",
+]
+
+
+def load_tools() -> list:
+    """Import the tools module and build the Assistant's tool list."""
+    with import_timer("tools"):
+        import tools
+    return [getattr(tools, name) for name in TOOL_NAMES]
 
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(self, tools: list) -> None:
         super().__init__(
             instructions=AGENT_INSTRUCTION,
             llm=google.beta.realtime.RealtimeModel(
                 voice="Aoede",
                 temperature=0.8,
             ),
-            tools=[
-                get_weather,
-                search_web,
-                search_google,
-                search_google_news,
-                send_email,
-                read_emails,
-                search_emails,
-                set_reminder,
-                calculate_medication_schedule,
-                check_health_symptoms,
-                help_with_technology,
-                get_news_summary,
-                convert_units,
-                emergency_contacts_info,
-                find_local_services,
-                get_current_date_time,
-                spark_imagination,
-                visit_website,
-                read_article,
-                write_code_with_gemini,
-                explain_code_with_gemini,
-                debug_code_with_gemini,
-                learn_programming_with_gemini,
-                recognize_song,
-                get_agent_capabilities
-            ]
+            tools=tools
         )
 
 
+def prewarm(proc: agents.JobProcess):
+    """Load the tools and shared clients once per worker process, before any job arrives."""
+    proc.userdata["tools"] = load_tools()
+
+    from gemini_client import get_gemini_client
+    from search_cache import get_search_cache
+
+    with import_timer("google.generativeai"):
+        get_gemini_client()
+    get_search_cache()
+    get_scheduler()
+    start_metrics_server()
+    log_startup_report("prewarm")
+
+
+def build_stream_tts():
+    """
+    TTS that speaks Gemini tool answers while they stream in.
+
+    The realtime model can only speak once a tool has returned, so streamed
+    answers need a separate TTS. Google Cloud TTS offers the realtime model's
+    own voice; it needs service-account credentials, and without them tools
+    fall back to returning the whole answer.
+    """
+    if os.getenv("GEMINI_STREAM_TO_VOICE", "1") == "0" or not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        return None
+    return google.TTS(voice_name=os.getenv("STREAM_TTS_VOICE", "en-US-Chirp3-HD-Aoede"))
+
+
+async def close_mail_sessions():
+    # The mail modules are only imported once a mail tool has been used
+    if "imap_pool" in sys.modules:
+        await sys.modules["imap_pool"].close_imap_pool()
+    if "smtp_outbox" in sys.modules:
+        await sys.modules["smtp_outbox"].close_outboxes()
+
+
+async def resume_spooled_mail():
+    from smtp_outbox import resume_spooled
+
+    try:
+        await resume_spooled()
+    except Exception as e:
+        logging.error(f"Could not resume mail spooled at an earlier shutdown: {e}")
+
+
 async def entrypoint(ctx: agents.JobContext):
+    # Report stalls that would make the realtime audio stutter
+    start_loop_watchdog()
+    ctx.add_shutdown_callback(stop_loop_watchdog)
+    ctx.add_shutdown_callback(close_http_client)
+    ctx.add_shutdown_callback(close_mail_sessions)
     await ctx.connect()
     
-    session = AgentSession()
+    stream_tts = build_stream_tts()
+    session = AgentSession(tts=stream_tts) if stream_tts is not None else AgentSession()
 
     await session.start(
         room=ctx.room,
-        agent=Assistant(),
+        agent=Assistant(ctx.proc.userdata.get("tools") or load_tools()),
         room_input_options=RoomInputOptions(
             video_enabled=True,
             noise_cancellation=noise_cancellation.BVC(),
         ),
     )
 
+    # Deliver due reminders (including ones set in earlier visits) into this room
+    scheduler = get_scheduler()
+    await scheduler.attach(ctx.room.name, session)
+
+    async def detach_reminders():
+        scheduler.detach(ctx.room.name)
+
+    ctx.add_shutdown_callback(detach_reminders)
+
+    # Mail left undelivered by an earlier shutdown goes out now, not on the user's next send_email
+    await resume_spooled_mail()
+
+    # One running job per host keeps the shared news digests warm; this one takes over when it is free
+    get_news_digests().start()
+    ctx.add_shutdown_callback(close_news_digests)
+
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
@@ -0,0 +1,461 @@
+"""
+Local stand-ins for every service the tools talk to.
+
+All servers bind to 127.0.0.1 on a free port and run on background threads,
+so the event loop under test only sees real sockets, never mocks.
+"""
+import asyncio
+import base64
+import json
+import re
+import socketserver
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+
+from gemini_client import GeminiClient
+from search_providers import SearchHit, SearchProvider
+
+ORIGINAL_HOST_HEADER = "X-Original-Host"
+
+_WORDS = ("garden tea morning river music walk family health market weather story "
+          "letter window village doctor bread train city evening friend").split()
+
+
+def _sentence(seed: int, words: int = 14) -> str:
+    text = " ".join(_WORDS[(seed * 7 + i * 3) % len(_WORDS)] for i in range(words))
+    return text.capitalize() + "."
+
+
+def article_html(path: str, paragraphs: int = 40) -> str:
+    """A news-style page of roughly 30 KB with navigation, headings and links."""
+    seed = sum(path.encode())
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(30))
+    body = []
+    for i in range(paragraphs):
+        if i % 8 == 0:
+            body.append(f"<h2>Part {i // 8 + 1}: {_sentence(seed + i, 5)}</h2>")
+        links = f' See <a href="/related/{i}">related story {i}</a>.' if i % 3 == 0 else ""
+        body.append(f"<p>{_sentence(seed + i)} {_sentence(seed + i + 1, 20)}{links}</p>")
+    return f"""<!DOCTYPE html>
+<html><head><title>Local article {path}</title>
+<meta name="description" content="{_sentence(seed, 10)}">
+<script>var analytics = {{"page": "{path}"}};</script>
+<style>body {{ font-family: serif; }}</style></head>
+<body><nav><ul>{nav}</ul></nav>
+<header><h1>{_sentence(seed, 6)}</h1></header>
+<article>{"".join(body)}</article>
+<footer><p>Copyright local news</p></footer></body></html>"""
+
+
+WTTR_FORMAT_3 = "{city}: ⛅️ +29°C"
+
+
+def wttr_j1(city: str) -> Dict[str, Any]:
+    """A wttr.in ?format=j1 payload trimmed to the fields weather.py reads."""
+    hourly = [{"time": str(hour), "tempC": str(26 + hour // 300), "chanceofrain": str(hour // 30),
+               "precipMM": "0.0", "weatherDesc": [{"value": "Partly cloudy"}]} for hour in range(0, 2400, 300)]
+    return {
+        "current_condition": [{"temp_C": "29", "FeelsLikeC": "33", "humidity": "74", "windspeedKmph": "9",
+                               "localObsDateTime": "2025-06-01 10:00 AM", "weatherDesc": [{"value": "Partly cloudy"}]}],
+        "nearest_area": [{"areaName": [{"value": city.title()}], "country": [{"value": "Bangladesh"}]}],
+        "weather": [{"maxtempC": "33", "mintempC": "26", "hourly": hourly}],
+    }
+
+AUDD_RESPONSE = {
+    "status": "success",
+    "result": {
+        "title": "Local Song",
+        "artist": "Benchmark Band",
+        "album": "Offline",
+        "release_date": "2020-01-01",
+        "song_link": "https://lis.tn/local",
+    },
+}
+
+
+class _WebHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self) -> None:
+        time.sleep(self.server.latency)
+        host = self.headers.get(ORIGINAL_HOST_HEADER, "").lower()
+        path = self.path.split("?")[0]
+        if host == "wttr.in":
+            city = httpx.URL(self.path).path.strip("/") or "Dhaka"
+            if "format=j1" in self.path:
+                self._reply(200, json.dumps(wttr_j1(city)).encode(), "application/json")
+            else:
+                self._reply(200, WTTR_FORMAT_3.format(city=city).encode(), "text/plain; charset=utf-8")
+        elif host == "api.audd.io":
+            length = int(self.headers.get("Content-Length", "0"))
+            self.rfile.read(length)
+            self._reply(200, json.dumps(AUDD_RESPONSE).encode(), "application/json")
+        else:
+            self._reply(200, article_html(host + path).encode(), "text/html; charset=utf-8")
+
+    def do_GET(self) -> None:
+        self._route()
+
+    def do_POST(self) -> None:
+        self._route()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class FakeWebServer:
+    """Serves canned wttr.in, AudD and article responses, keyed on the original host."""
+
+    def __init__(self, latency: float):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _WebHandler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self.port = self._server.server_address[1]
+
+    def start(self) -> "FakeWebServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-web", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class RewriteTransport(httpx.AsyncBaseTransport):
+    """Send every request to the local web server, remembering the host it was meant for."""
+
+    def __init__(self, port: int):
+        self._port = port
+        self._inner = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=50, max_keepalive_connections=20))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers[ORIGINAL_HOST_HEADER] = request.url.host
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self._port)
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+@dataclass
+class FakeMessage:
+    uid: int
+    sender: str
+    subject: str
+    date: str
+    body: str
+    seen: bool
+
+    def header_bytes(self) -> bytes:
+        return (f"From: {self.sender}\r\nSubject: {self.subject}\r\nDate: {self.date}\r\n"
+                f"Message-ID: <{self.uid}@local>\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n").encode()
+
+
+def make_mailbox(count: int) -> List[FakeMessage]:
+    now = datetime.now(timezone.utc)
+    return [
+        FakeMessage(
+            uid=i,
+            sender=f"Friend {i % 12} <friend{i % 12}@example.com>",
+            subject=f"{_sentence(i, 4)[:-1]} #{i}",
+            date=format_datetime(now - timedelta(hours=count - i)),
+            body="\r\n".join(_sentence(i + j, 16) for j in range(12)),
+            seen=i % 4 != 0,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def _parse_set(spec: str, highest: int) -> List[int]:
+    ids: List[int] = []
+    for part in spec.split(","):
+        start, _, end = part.partition(":")
+        low = highest if start == "*" else int(start)
+        high = low if not end else (highest if end == "*" else int(end))
+        ids.extend(range(min(low, high), max(low, high) + 1))
+    return ids
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+    """The subset of IMAP4rev1 that imap_pool, imap_fetch and mail_index use."""
+
+    def _send(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        messages: List[FakeMessage] = self.server.messages
+        self._send("* OK [CAPABILITY IMAP4rev1 AUTH=PLAIN] local IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode(errors="replace").rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            time.sleep(self.server.latency)
+
+            if command == "CAPABILITY":
+                self._send("* CAPABILITY IMAP4rev1 AUTH=PLAIN")
+            elif command in ("SELECT", "EXAMINE"):
+                self._send(f"* {len(messages)} EXISTS")
+                self._send("* 0 RECENT")
+                self._send("* OK [UIDVALIDITY 1] UIDs valid")
+                self._send(f"* OK [UIDNEXT {len(messages) + 1}] Predicted next UID")
+            elif command == "STATUS":
+                mailbox = args.rsplit(" (", 1)[0]
+                self._send(f"* STATUS {mailbox} (UIDVALIDITY 1 UIDNEXT {len(messages) + 1})")
+            elif command == "UID":
+                sub, _, rest_args = args.partition(" ")
+                if sub.upper() == "SEARCH":
+                    self._search(messages, rest_args)
+                elif sub.upper() == "FETCH":
+                    self._fetch(messages, rest_args)
+            elif command == "LOGOUT":
+                self._send("* BYE logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            self._send(f"{tag} OK {command} completed")
+
+    def _search(self, messages: List[FakeMessage], criteria: str) -> None:
+        words = criteria.upper().split()
+        if "UNSEEN" in words:
+            uids = [m.uid for m in messages if not m.seen]
+        elif words and words[0] == "UID":
+            wanted = set(_parse_set(words[1], len(messages)))
+            uids = [m.uid for m in messages if m.uid in wanted]
+        else:
+            uids = [m.uid for m in messages]
+        self._send("* SEARCH " + " ".join(map(str, uids)))
+
+    def _fetch(self, messages: List[FakeMessage], args: str) -> None:
+        spec, _, items = args.partition(" ")
+        wanted = set(_parse_set(spec, len(messages)))
+        partial = re.search(r"BODY\.PEEK\[TEXT\]<0\.(\d+)>", items)
+        for seq, message in enumerate(messages, start=1):
+            if message.uid not in wanted:
+                continue
+            flags = "\\Seen" if message.seen else ""
+            header = message.header_bytes()
+            self.wfile.write(
+                f"* {seq} FETCH (UID {message.uid} FLAGS ({flags}) "
+                f"BODY[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID CONTENT-TYPE)] {{{len(header)}}}\r\n".encode()
+                + header)
+            if partial:
+                text = message.body.encode()[:int(partial.group(1))]
+                self.wfile.write(f" BODY[TEXT]<0> {{{len(text)}}}\r\n".encode() + text)
+            self.wfile.write(b")\r\n")
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages: List[FakeMessage], latency: float):
+        super().__init__(("127.0.0.1", 0), _ImapHandler)
+        self.messages = messages
+        self.latency = latency
+        self.port = self.server_address[1]
+
+    def start(self) -> "FakeImapServer":
+        threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Plain ESMTP with AUTH PLAIN; messages are counted and dropped."""
+
+    def _send(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        self._send("220 local ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            time.sleep(self.server.latency)
+            if verb == "EHLO":
+                self._send("250-local")
+                self._send("250-AUTH PLAIN")
+                self._send("250 SIZE 10485760")
+            elif verb == "AUTH":
+                base64.b64decode(line.split()[-1])
+                self._send("235 2.7.0 Authentication successful")
+            elif verb == "DATA":
+                self._send("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.delivered += 1
+                self._send("250 2.0.0 Queued")
+            elif verb == "QUIT":
+                self._send("221 Bye")
+                return
+            else:
+                self._send("250 OK")
+
+
+class FakeSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.latency = latency
+        self.delivered = 0
+        self.port = self.server_address[1]
+
+    def start(self) -> "FakeSmtpServer":
+        threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeDuckDuckGo(SearchProvider):
+    """Blocking search provider standing in for DuckDuckGo."""
+
+    name = "duckduckgo"
+
+    def __init__(self, latency: float):
+        # No rate limit: the benchmark measures this code, not throttling
+        super().__init__(rate_per_second=1e6, burst=10**6)
+        self.latency = latency
+
+    def search(self, query: str, num_results: int) -> List[SearchHit]:
+        time.sleep(self.latency)
+        seed = sum(query.encode())
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        return [SearchHit(f"{query} {i}", f"https://results{i % 3}.example.com/{slug}/{i}",
+                          f"{query}: {_sentence(seed + i, 24)}") for i in range(num_results)]
+
+
+def install_fake_googlesearch(latency: float) -> None:
+    """Register a googlesearch module whose search() yields local article URLs."""
+    module = types.ModuleType("googlesearch")
+
+    def search(query: str, num_results: int = 10, **kwargs: Any) -> Iterator[str]:
+        time.sleep(latency)
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        for i in range(num_results):
+            yield f"https://news{i % 3}.example.com/{slug}/{i}"
+
+    module.search = search
+    sys.modules["googlesearch"] = module
+
+
+class _FakeUsage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = len(prompt.split())
+        self.candidates_token_count = len(text.split())
+
+
+class _FakeResponse:
+    def __init__(self, text: str, usage: Optional[_FakeUsage] = None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _FakeStream:
+    def __init__(self, chunks: List[str], delay: float, usage: _FakeUsage):
+        self._chunks = chunks
+        self._delay = delay
+        self.usage_metadata = usage
+
+    def __aiter__(self) -> AsyncIterator[_FakeResponse]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[_FakeResponse]:
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield _FakeResponse(chunk)
+
+
+class FakeGenerativeModel:
+    """Answers with a fixed-size markdown reply after a simulated time to first token."""
+
+    def __init__(self, first_token: float, chunk_delay: float, chunks: int = 12):
+        self.first_token = first_token
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+
+    def _reply(self, prompt: str) -> List[str]:
+        seed = sum(prompt.encode()) % 97
+        parts = [f"{_sentence(seed + i, 18)}\n" for i in range(self.chunks)]
+        parts.insert(self.chunks // 2, "```python\nprint('hello')\n```\n")
+        return parts
+
+    async def generate_content_async(self, prompt: str, stream: bool = False) -> Any:
+        await asyncio.sleep(self.first_token)
+        parts = self._reply(prompt)
+        usage = _FakeUsage(prompt, "".join(parts))
+        if stream:
+            return _FakeStream(parts, self.chunk_delay, usage)
+        await asyncio.sleep(self.chunk_delay * len(parts))
+        return _FakeResponse("".join(parts), usage)
+
+
+class FakeGeminiClient(GeminiClient):
+    """GeminiClient whose models are FakeGenerativeModel; the SDK is never imported."""
+
+    def __init__(self, first_token: float, chunk_delay: float):
+        self._models = {}
+        self.stats = {}
+        self._model = FakeGenerativeModel(first_token, chunk_delay)
+
+    def model(self, name: str) -> Any:
+        return self._model
+
+
+class FakeSession:
+    """Enough of AgentSession for tools: replies are dropped, spoken text is drained."""
+
+    def __init__(self, speak: bool):
+        self.tts = object() if speak else None
+        self.replies = 0
+        self._speech: List[asyncio.Task] = []
+
+    def generate_reply(self, instructions: str = "") -> None:
+        self.replies += 1
+
+    def say(self, text: Any, add_to_chat_ctx: bool = True) -> None:
+        async def _drain() -> None:
+            async for _ in text:
+                pass
+
+        if hasattr(text, "__aiter__"):
+            self._speech.append(asyncio.create_task(_drain()))
+
+    async def wait_for_speech(self) -> None:
+        if self._speech:
+            await asyncio.gather(*self._speech)
+            self._speech.clear()
+
+
+class FakeContext:
+    """Stands in for RunContext; the tools only read context.session."""
+
+    def __init__(self, session: FakeSession):
+        self.session = session
@@ -0,0 +1,75 @@
+"""
+Compare html_extract against the BeautifulSoup code visit_website and read_article used before.
+
+    python -m benchmarks.html_extract_bench [--paragraphs 10000] [--repeat 5]
+
+The "bs4" column replays what one tool call did: parse with html.parser, then
+find_all('p'), find_all(['h1','h2','h3']), find_all('a') and get_text().
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import article_html
+from html_extract import _lxml_available, extract_page
+
+
+def _bs4_extract(html: bytes, base_url: str) -> Dict[str, object]:
+    from urllib.parse import urljoin
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for script in soup(["script", "style"]):
+        script.decompose()
+    title = soup.find("title")
+    headings = [tag.get_text().strip() for tag in soup.find_all(["h1", "h2", "h3"])]
+    links = [(a.get_text().strip(), urljoin(base_url, str(a.get("href")))) for a in soup.find_all("a", href=True)]
+    paragraphs = [p.get_text().strip() for p in soup.find_all("p")]
+    article = soup.select_one("article") or soup
+    article_paragraphs = [p.get_text().strip() for p in article.find_all("p")]
+    text = soup.get_text()
+    return {"title": title, "headings": headings, "links": links, "paragraphs": paragraphs,
+            "article": article_paragraphs, "text": text}
+
+
+def _time(func: Callable[[], object], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=10000, help="page size; 10000 is about 2.5 MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = "https://news.example.org/long-read"
+    html = article_html("/long-read", paragraphs=args.paragraphs).encode()
+    print(f"Page size: {len(html) / 1e6:.2f} MB, best of {args.repeat}")
+
+    candidates: Dict[str, Callable[[], object]] = {
+        "html_extract (stdlib)": lambda: extract_page(html, url, "utf-8", backend="stdlib"),
+    }
+    if _lxml_available():
+        candidates["html_extract (lxml)"] = lambda: extract_page(html, url, "utf-8", backend="lxml")
+    else:
+        print("lxml not installed; skipping the lxml backend")
+    try:
+        import bs4  # noqa: F401
+        candidates["bs4 html.parser (before)"] = lambda: _bs4_extract(html, url)
+    except ImportError:
+        print("beautifulsoup4 not installed; skipping the old code path")
+
+    results = {name: min(_time(func, args.repeat)) for name, func in candidates.items()}
+    slowest = max(results.values())
+    for name, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(f"{name:<28}{seconds * 1000:>10.1f} ms{slowest / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Offline benchmark of every tool against local stand-in services.
+
+    python -m benchmarks.run                    # print the report
+    python -m benchmarks.run --save-baseline    # store it in benchmarks/baseline.json
+    python -m benchmarks.run --check            # exit 1 if it regressed against the baseline
+    python -m benchmarks.run --against main     # same, with the baseline measured at a git ref
+
+Run from the repository root. No network access is needed: HTTP goes to a
+local server through a rewriting transport, IMAP and SMTP to local servers,
+and DuckDuckGo, googlesearch and Gemini are replaced by in-process fakes with
+simulated latency.
+
+Latencies depend on the machine, so baseline.json is not committed: record it
+with --save-baseline on the machine that runs --check, or use --against to
+benchmark the given ref in a temporary git worktree first and compare to that.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; good enough for a few hundred samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+class LoopMonitor:
+    """
+    Measures how long the event loop was blocked.
+
+    A ticker sleeps for a short interval; any overshoot beyond the threshold
+    is time some callback held the loop.
+    """
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocked = 0.0
+        self.max_stall = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            if lag > self.threshold:
+                self.blocked += lag
+                self.stalls += 1
+                self.max_stall = max(self.max_stall, lag)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return {"blocked_seconds": self.blocked, "max_stall": self.max_stall, "stalls": self.stalls}
+
+
+def configure_environment(args: argparse.Namespace, imap_port: int, smtp_port: int, workdir: str) -> None:
+    """Point every module at the local servers; must run before tools is imported."""
+    os.environ.update({
+        "IMAP_HOST": "127.0.0.1",
+        "IMAP_PORT": str(imap_port),
+        "IMAP_SSL": "0",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_STARTTLS": "0",
+        "GMAIL_USER": "bench@example.com",
+        "GMAIL_APP_PASSWORD": "local",
+        "AUDD_API_TOKEN": "local",
+        "GEMINI_STREAM_TO_VOICE": "1" if args.speak else "0",
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search_cache.sqlite3"),
+        "MAIL_INDEX_PATH": os.path.join(workdir, "mail_index.sqlite3"),
+        "REMINDER_DB_PATH": os.path.join(workdir, "reminders.sqlite3"),
+    })
+
+
+async def _call(tool: Any, context: Any, kwargs: Dict[str, Any]) -> float:
+    started = time.perf_counter()
+    await tool(context, **kwargs)
+    await context.session.wait_for_speech()
+    return time.perf_counter() - started
+
+
+async def latency_phase(tools: Any, scenarios: List[Any], context: Any, iterations: int) -> Dict[str, List[float]]:
+    """Call each tool on its own, one call at a time."""
+    samples: Dict[str, List[float]] = {}
+    for scenario in scenarios:
+        tool = getattr(tools, scenario.tool)
+        await _call(tool, context, scenario.kwargs(-1))  # warm-up: connections, first mail sync
+        samples[scenario.name] = [await _call(tool, context, scenario.kwargs(i)) for i in range(iterations)]
+    return samples
+
+
+async def throughput_phase(tools: Any, scenarios: List[Any], contexts: List[Any],
+                           rounds: int) -> Tuple[int, float, List[float]]:
+    """Run N sessions at once, each cycling through every tool from a different starting point."""
+
+    async def _session(n: int, context: Any) -> List[float]:
+        latencies = []
+        for r in range(rounds):
+            for k in range(len(scenarios)):
+                scenario = scenarios[(n + k) % len(scenarios)]
+                latencies.append(await _call(getattr(tools, scenario.tool), context, scenario.kwargs(1000 * (n + 1) + r)))
+        return latencies
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_session(n, context) for n, context in enumerate(contexts)))
+    elapsed = time.perf_counter() - started
+    latencies = [value for session in results for value in session]
+    return len(latencies), elapsed, latencies
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks import fakes
+    from benchmarks.scenarios import SCENARIOS
+
+    web = fakes.FakeWebServer(args.http_latency).start()
+    imap = fakes.FakeImapServer(fakes.make_mailbox(args.mailbox_size), args.mail_latency).start()
+    smtp = fakes.FakeSmtpServer(args.mail_latency).start()
+    workdir = tempfile.mkdtemp(prefix="tool-bench-")
+    configure_environment(args, imap.port, smtp.port, workdir)
+
+    import gemini_client
+    import http_client
+    import search_providers
+    from executor import shutdown_executor
+    from reminders import get_scheduler
+
+    http_client.use_transport(fakes.RewriteTransport(web.port))
+    gemini_client._client = fakes.FakeGeminiClient(args.gemini_first_token, args.gemini_chunk_delay)
+    fakes.install_fake_googlesearch(args.search_latency)
+    search_providers.use_providers([fakes.FakeDuckDuckGo(args.search_latency),
+                                    search_providers.GoogleProvider(rate_per_second=1e6, burst=10**6)])
+    import tools
+
+    scenarios = [s for s in SCENARIOS if not args.tools or s.tool in args.tools]
+    scheduler = get_scheduler()
+    contexts = []
+    for n in range(max(1, args.sessions)):
+        session = fakes.FakeSession(speak=args.speak)
+        await scheduler.attach(f"bench-{n}", session)
+        contexts.append(fakes.FakeContext(session))
+
+    try:
+        monitor = LoopMonitor()
+        monitor.start()
+        samples = await latency_phase(tools, scenarios, contexts[0], args.iterations)
+        latency_loop = await monitor.stop()
+
+        monitor = LoopMonitor()
+        monitor.start()
+        calls, elapsed, load_latencies = await throughput_phase(tools, scenarios, contexts, args.rounds)
+        load_loop = await monitor.stop()
+    finally:
+        from imap_pool import close_imap_pool
+        from news_digest import close_news_digests
+        from smtp_outbox import close_outboxes
+
+        await close_outboxes()
+        await close_imap_pool()
+        await scheduler.close()
+        await close_news_digests()
+        await http_client.close_http_client()
+        shutdown_executor()
+        for server in (web, imap, smtp):
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "settings": {
+            "iterations": args.iterations,
+            "sessions": args.sessions,
+            "rounds": args.rounds,
+            "http_latency": args.http_latency,
+            "mail_latency": args.mail_latency,
+            "mailbox_size": args.mailbox_size,
+            "search_latency": args.search_latency,
+            "gemini_first_token": args.gemini_first_token,
+            "gemini_chunk_delay": args.gemini_chunk_delay,
+            "speak": args.speak,
+            "tools": [s.tool for s in scenarios],
+        },
+        "tools": {tool: _summary(values) for tool, values in samples.items()},
+        "throughput": {
+            "calls": calls,
+            "seconds": elapsed,
+            "calls_per_second": calls / elapsed if elapsed else 0.0,
+            **_summary(load_latencies),
+        },
+        "loop": {"sequential": latency_loop, "concurrent": load_loop},
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{'tool':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for tool, stats in results["tools"].items():
+        print(f"{tool:<32}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+    load = results["throughput"]
+    print(f"\n{results['settings']['sessions']} concurrent sessions: {load['calls']} calls in {load['seconds']:.2f}s "
+          f"= {load['calls_per_second']:.1f} calls/s, p50 {load['p50'] * 1000:.1f} ms, "
+          f"p95 {load['p95'] * 1000:.1f} ms, p99 {load['p99'] * 1000:.1f} ms")
+    for phase, loop in results["loop"].items():
+        print(f"Event loop blocked ({phase}): {loop['blocked_seconds'] * 1000:.1f} ms total, "
+              f"{loop['stalls']} stalls, longest {loop['max_stall'] * 1000:.1f} ms")
+
+
+def _settings_argv(args: argparse.Namespace) -> List[str]:
+    """The command-line options that change what is measured, to repeat a run elsewhere."""
+    argv = ["--iterations", str(args.iterations), "--sessions", str(args.sessions), "--rounds", str(args.rounds),
+            "--http-latency", str(args.http_latency), "--mail-latency", str(args.mail_latency),
+            "--mailbox-size", str(args.mailbox_size), "--search-latency", str(args.search_latency),
+            "--gemini-first-token", str(args.gemini_first_token),
+            "--gemini-chunk-delay", str(args.gemini_chunk_delay)]
+    if args.tools:
+        argv += ["--tools", *args.tools]
+    if args.speak:
+        argv.append("--speak")
+    return argv
+
+
+def measure_at(ref: str, args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    """
+    Run this benchmark as it is at a git ref, in a temporary worktree, and return its results.
+
+    Prints why and returns None when the ref cannot be checked out or has no
+    benchmark that writes --output.
+    """
+    root = Path(__file__).resolve().parent.parent
+    tmp = Path(tempfile.mkdtemp(prefix="tool-bench-ref-"))
+    worktree, output = tmp / "tree", tmp / "results.json"
+    added = subprocess.run(["git", "worktree", "add", "--detach", str(worktree), ref], cwd=root,
+                           capture_output=True, text=True)
+    if added.returncode != 0:
+        shutil.rmtree(tmp, ignore_errors=True)
+        print(f"Cannot check out {ref}: {added.stderr.strip()}")
+        return None
+    try:
+        if not (worktree / "benchmarks" / "run.py").exists():
+            print(f"{ref} has no benchmarks/run.py, so there is nothing to measure there; pick a ref that includes the benchmark")
+            return None
+        ran = subprocess.run([sys.executable, "-m", "benchmarks.run", *_settings_argv(args), "--output", str(output)],
+                             cwd=worktree)
+        if ran.returncode != 0 or not output.exists():
+            print(f"The benchmark at {ref} failed (exit code {ran.returncode}); no baseline to compare against")
+            return None
+        return json.loads(output.read_text())
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=root, check=False)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any],
+                     tolerance: float, slack: float) -> List[str]:
+    """Compare against a stored baseline; small absolute slack keeps fast tools from flapping."""
+    problems = []
+    for tool, stats in results["tools"].items():
+        base = baseline["tools"].get(tool)
+        if base is None:
+            continue
+        for key in ("p95", "p99"):
+            limit = base[key] * (1 + tolerance) + slack
+            if stats[key] > limit:
+                problems.append(f"{tool} {key} {stats[key] * 1000:.1f} ms > {limit * 1000:.1f} ms")
+
+    # Throughput and loop blocking cover every scenario, so they only compare over the same set
+    if results["settings"]["tools"] != baseline["settings"]["tools"]:
+        print("\nBaseline covers a different set of scenarios; comparing per-tool latency only")
+        return problems
+
+    rate, base_rate = results["throughput"]["calls_per_second"], baseline["throughput"]["calls_per_second"]
+    if rate < base_rate * (1 - tolerance):
+        problems.append(f"throughput {rate:.1f} calls/s < {base_rate * (1 - tolerance):.1f} calls/s")
+
+    for phase, loop in results["loop"].items():
+        base = baseline["loop"].get(phase)
+        if base is None:
+            continue
+        limit = base["max_stall"] * (1 + tolerance) + slack
+        if loop["max_stall"] > limit:
+            problems.append(f"event loop stall ({phase}) {loop['max_stall'] * 1000:.1f} ms > {limit * 1000:.1f} ms")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="sequential calls per tool")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions in the throughput phase")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over all tools per session")
+    parser.add_argument("--tools", nargs="*", help="only benchmark these tools")
+    parser.add_argument("--http-latency", type=float, default=0.03)
+    parser.add_argument("--mail-latency", type=float, default=0.005)
+    parser.add_argument("--mailbox-size", type=int, default=300)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--gemini-first-token", type=float, default=0.3)
+    parser.add_argument("--gemini-chunk-delay", type=float, default=0.02)
+    parser.add_argument("--speak", action="store_true", help="stream Gemini output into a fake TTS session")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression against the baseline")
+    parser.add_argument("--against", metavar="REF",
+                        help="measure the baseline at this git ref (e.g. main) instead of reading --baseline; implies --check")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute slowdown")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    baseline: Optional[Dict[str, Any]] = None
+    if args.against:
+        print(f"Measuring the baseline at {args.against}")
+        baseline = measure_at(args.against, args)
+        if baseline is None:
+            return 2
+        args.check = True
+        print()
+    results = asyncio.run(run_benchmark(args))
+    print_report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.check:
+        if baseline is None:
+            if not args.baseline.exists():
+                print(f"\nNo baseline at {args.baseline}; run with --save-baseline first, or use --against REF")
+                return 2
+            baseline = json.loads(args.baseline.read_text())
+        settings = {key: value for key, value in results["settings"].items() if key != "tools"}
+        if {key: value for key, value in baseline["settings"].items() if key != "tools"} != settings:
+            print("\nBaseline was recorded with different settings; not comparable")
+            return 2
+        problems = find_regressions(results, baseline, args.tolerance, args.slack_ms / 1000)
+        if problems:
+            print("\nRegressions:\n  " + "\n  ".join(problems))
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""One representative call per tool, varied by iteration so caches see realistic misses."""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+CODE_SAMPLE = """def average(values):
+    total = 0
+    for v in values:
+        total += v
+    return total / len(values)
+"""
+
+
+@dataclass(frozen=True)
+class Scenario:
+    tool: str
+    kwargs: Callable[[int], Dict[str, Any]]
+    label: str = ""  # tells apart several scenarios for one tool in reports
+
+    @property
+    def name(self) -> str:
+        return self.label or self.tool
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("get_weather", lambda i: {"city": ("Dhaka", "Chittagong", "Sylhet", "Khulna")[i % 4],
+                                       "mode": ("current", "today", "umbrella")[i % 3]}),
+    Scenario("search_web", lambda i: {"query": f"blood pressure diet tips {i}"}),
+    Scenario("answer_complex_question", lambda i: {"question": f"How do I keep my garden healthy in the monsoon {i}?",
+                                                   "search_depth": "comprehensive"}),
+    Scenario("get_factual_information", lambda i: {"topic": f"history of tea {i}"}),
+    Scenario("check_health_symptoms", lambda i: {"symptoms": f"mild headache and tiredness {i}"}),
+    Scenario("get_news_summary", lambda i: {"news_category": "health", "location": "Bangladesh"}),
+    Scenario("help_with_technology", lambda i: {"technology_issue": f"phone volume too low {i}", "device_type": "android"}),
+    Scenario("find_local_services", lambda i: {"service_type": "pharmacy", "location": f"Dhanmondi {i}"}),
+    Scenario("convert_units", lambda i: {"value": 98.6 + i, "from_unit": "fahrenheit", "to_unit": "celsius"}),
+    Scenario("emergency_contacts_info", lambda i: {"emergency_type": "medical"}),
+    Scenario("get_current_date_time", lambda i: {"query_type": "full"}),
+    Scenario("spark_imagination", lambda i: {"activity_type": "story", "topic": "river"}),
+    Scenario("search_google", lambda i: {"query": f"senior yoga classes {i}", "num_results": 5}),
+    Scenario("search_google", lambda i: {"query": f"monsoon garden care {i}", "num_results": 5, "with_summaries": True},
+             label="search_google (summaries)"),
+    Scenario("search_google_news", lambda i: {"topic": f"pension update {i}"}),
+    Scenario("visit_website", lambda i: {"url": f"https://www.example.com/page/{i}"}),
+    Scenario("visit_websites", lambda i: {"urls": [f"https://site{n}.example.com/result/{i}" for n in range(5)]}),
+    Scenario("read_article", lambda i: {"url": f"https://news.example.org/article/{i}"}),
+    Scenario("send_email", lambda i: {"to_email": "daughter@example.com", "subject": f"Hello {i}",
+                                      "message": "I am feeling well today. Talk soon."}),
+    Scenario("check_email_status", lambda i: {}),
+    Scenario("read_emails", lambda i: {"num_emails": 5, "unread_only": bool(i % 2)}),
+    Scenario("search_emails", lambda i: {"search_query": ("garden", "doctor", "letter", "friend3")[i % 4]}),
+    Scenario("set_reminder", lambda i: {"reminder_text": f"drink water {i}", "time_delay_minutes": 30}),
+    Scenario("calculate_medication_schedule", lambda i: {"medication_name": f"Metformin {i}", "dosage_times_per_day": 2,
+                                                         "days": 7, "set_reminders": False}),
+    Scenario("write_code_with_gemini", lambda i: {"programming_request": f"read a csv file {i}"}),
+    Scenario("explain_code_with_gemini", lambda i: {"code_snippet": CODE_SAMPLE}),
+    Scenario("debug_code_with_gemini", lambda i: {"code_with_error": CODE_SAMPLE, "error_message": "ZeroDivisionError"}),
+    Scenario("learn_programming_with_gemini", lambda i: {"topic": f"loops {i}"}),
+    Scenario("recognize_song", lambda i: {"audio_url": f"https://audio.example.com/clip{i}.mp3"}),
+    Scenario("get_agent_capabilities", lambda i: {"capability_category": "all"}),
+]
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from metrics import note_error
+
+
+@dataclass(frozen=True)
+class ToolLimit:
+    """Concurrency and deadline settings for one tool."""
+    max_concurrency: int
+    timeout: float
+
+
+@dataclass
+class ToolStats:
+    """Running counters for calls made through the execution layer."""
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    active: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    error_classes: Dict[str, int] = field(default_factory=dict)
+
+
+DEFAULT_LIMIT = ToolLimit(max_concurrency=4, timeout=15.0)
+
+# Per-tool limits. Network tools get short deadlines so a slow upstream turns
+# into a polite error message instead of a long silence in the conversation.
+TOOL_LIMITS: Dict[str, ToolLimit] = {
+    "get_weather": ToolLimit(max_concurrency=8, timeout=8.0),
+    "search_web": ToolLimit(max_concurrency=6, timeout=12.0),
+    "answer_complex_question": ToolLimit(max_concurrency=16, timeout=15.0),
+    "get_factual_information": ToolLimit(max_concurrency=6, timeout=12.0),
+    "check_health_symptoms": ToolLimit(max_concurrency=6, timeout=12.0),
+    "get_news_summary": ToolLimit(max_concurrency=6, timeout=12.0),
+    "help_with_technology": ToolLimit(max_concurrency=6, timeout=12.0),
+    "find_local_services": ToolLimit(max_concurrency=6, timeout=12.0),
+    "convert_units": ToolLimit(max_concurrency=4, timeout=12.0),
+    "search_google": ToolLimit(max_concurrency=4, timeout=15.0),
+    "search_google_news": ToolLimit(max_concurrency=4, timeout=12.0),
+    "visit_website": ToolLimit(max_concurrency=6, timeout=12.0),
+    "read_article": ToolLimit(max_concurrency=6, timeout=12.0),
+    "visit_websites": ToolLimit(max_concurrency=3, timeout=12.0),
+    "read_emails": ToolLimit(max_concurrency=2, timeout=30.0),
+    "search_emails": ToolLimit(max_concurrency=2, timeout=30.0),
+    "mail_sync": ToolLimit(max_concurrency=2, timeout=120.0),
+    "smtp_delivery": ToolLimit(max_concurrency=2, timeout=120.0),
+    # Search backends, shared by every search tool; a hedged search holds one slot per provider
+    "search:duckduckgo": ToolLimit(max_concurrency=6, timeout=12.0),
+    "search:google": ToolLimit(max_concurrency=4, timeout=12.0),
+    # Incremental HTML parsing of a streamed page, one chunk per call
+    "html_parse": ToolLimit(max_concurrency=4, timeout=10.0),
+    "recognize_song": ToolLimit(max_concurrency=2, timeout=25.0),
+    "write_code_with_gemini": ToolLimit(max_concurrency=3, timeout=60.0),
+    "explain_code_with_gemini": ToolLimit(max_concurrency=3, timeout=60.0),
+    "debug_code_with_gemini": ToolLimit(max_concurrency=3, timeout=60.0),
+    "learn_programming_with_gemini": ToolLimit(max_concurrency=3, timeout=60.0),
+}
+
+# Calls that wait longer than this for a free slot are logged, since the wait
+# is time the user spends listening to nothing.
+SLOW_WAIT_SECONDS = 1.0
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_stats: Dict[str, ToolStats] = {}
+
+
+def get_limit(tool_name: str) -> ToolLimit:
+    """Return the configured limit for a tool, falling back to the default."""
+    return TOOL_LIMITS.get(tool_name, DEFAULT_LIMIT)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        max_workers = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+    return _executor
+
+
+def _get_semaphore(tool_name: str) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(tool_name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(get_limit(tool_name).max_concurrency)
+        _semaphores[tool_name] = semaphore
+    return semaphore
+
+
+def _get_stats(tool_name: str) -> ToolStats:
+    stats = _stats.get(tool_name)
+    if stats is None:
+        stats = ToolStats()
+        _stats[tool_name] = stats
+    return stats
+
+
+def _record(tool_name: str, started: float, error: Optional[BaseException]) -> None:
+    stats = _get_stats(tool_name)
+    elapsed = time.perf_counter() - started
+    stats.active -= 1
+    stats.total_seconds += elapsed
+    stats.max_seconds = max(stats.max_seconds, elapsed)
+    if error is not None:
+        note_error(error)
+        name = type(error).__name__
+        stats.errors += 1
+        stats.error_classes[name] = stats.error_classes.get(name, 0) + 1
+
+
+async def _acquire(tool_name: str) -> None:
+    semaphore = _get_semaphore(tool_name)
+    wait_started = time.perf_counter()
+    await semaphore.acquire()
+    waited = time.perf_counter() - wait_started
+
+    stats = _get_stats(tool_name)
+    stats.calls += 1
+    stats.active += 1
+    stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+    if waited > SLOW_WAIT_SECONDS:
+        logging.warning(f"{tool_name} waited {waited:.2f}s for an execution slot")
+
+
+async def run_blocking(tool_name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking callable on the shared executor without stalling the event loop.
+
+    The tool's concurrency slot is held until the worker thread really finishes,
+    so a timed-out call still counts against the limit and cannot pile up threads.
+    """
+    limit = get_limit(tool_name)
+    await _acquire(tool_name)
+    started = time.perf_counter()
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), lambda: func(*args, **kwargs))
+
+    def _done(fut: "asyncio.Future[Any]") -> None:
+        error = None if fut.cancelled() else fut.exception()
+        _record(tool_name, started, error)
+        _get_semaphore(tool_name).release()
+
+    future.add_done_callback(_done)
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout=limit.timeout)
+    except asyncio.TimeoutError as e:
+        note_error(e)
+        _get_stats(tool_name).timeouts += 1
+        logging.warning(f"{tool_name} timed out after {limit.timeout:.1f}s")
+        raise
+
+
+@asynccontextmanager
+async def tool_slot(tool_name: str) -> AsyncIterator[ToolLimit]:
+    """
+    Hold one of the tool's concurrency slots for the duration of the block.
+
+    For native async work that cannot be expressed as a single awaitable, such
+    as consuming a stream; the caller applies the yielded limit's timeout.
+    """
+    await _acquire(tool_name)
+    started = time.perf_counter()
+    error: Optional[BaseException] = None
+
+    try:
+        yield get_limit(tool_name)
+    except asyncio.TimeoutError as e:
+        error = e
+        _get_stats(tool_name).timeouts += 1
+        logging.warning(f"{tool_name} timed out after {get_limit(tool_name).timeout:.1f}s")
+        raise
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _record(tool_name, started, error)
+        _get_semaphore(tool_name).release()
+
+
+async def run_async(tool_name: str, awaitable: Awaitable[Any]) -> Any:
+    """Await a native async call under the same per-tool limit and deadline."""
+    async with tool_slot(tool_name) as limit:
+        return await asyncio.wait_for(awaitable, timeout=limit.timeout)
+
+
+def get_executor_stats() -> Dict[str, ToolStats]:
+    """Return a snapshot of per-tool execution statistics."""
+    return {
+        name: ToolStats(
+            calls=s.calls,
+            errors=s.errors,
+            timeouts=s.timeouts,
+            active=s.active,
+            total_seconds=s.total_seconds,
+            max_seconds=s.max_seconds,
+            max_wait_seconds=s.max_wait_seconds,
+            error_classes=dict(s.error_classes),
+        )
+        for name, s in _stats.items()
+    }
+
+
+def shutdown_executor() -> None:
+    """Stop the shared executor; running calls are allowed to finish."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
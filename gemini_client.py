@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from executor import run_async, tool_slot
+from metrics import network_time, record_first_sentence
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+
+# Model used by each tool; each can be overridden with GEMINI_MODEL_<TOOL NAME>,
+# e.g. GEMINI_MODEL_LEARN_PROGRAMMING_WITH_GEMINI=gemini-1.5-flash.
+TOOL_MODELS: Dict[str, str] = {
+    tool: os.getenv(f"GEMINI_MODEL_{tool.upper()}", DEFAULT_MODEL)
+    for tool in (
+        "write_code_with_gemini",
+        "explain_code_with_gemini",
+        "debug_code_with_gemini",
+        "learn_programming_with_gemini",
+    )
+}
+
+
+@dataclass
+class GenerationResult:
+    """Text of one generation plus what it cost."""
+    text: str
+    model: str
+    latency: float
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class GenerationStats:
+    """Running totals per tool."""
+    calls: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    streams: int = 0
+    total_first_chunk: float = 0.0
+    spoken: int = 0
+    total_first_sentence: float = 0.0
+    max_first_sentence: float = 0.0
+
+
+def _response_text(response: Any) -> str:
+    # .text raises ValueError when the candidate was blocked or empty.
+    try:
+        return response.text or ""
+    except ValueError:
+        return ""
+
+
+class GeminiClient:
+    """
+    Process-wide Gemini client: the SDK is configured once and models are reused.
+
+    Calls go through the executor's run_async, so each tool keeps its
+    concurrency limit and deadline.
+    """
+
+    def __init__(self, api_key: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models: Dict[str, Any] = {}
+        self.stats: Dict[str, GenerationStats] = {}
+
+    def model(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is None:
+            model = self._genai.GenerativeModel(name)
+            self._models[name] = model
+        return model
+
+    def model_name(self, tool_name: str) -> str:
+        return TOOL_MODELS.get(tool_name, DEFAULT_MODEL)
+
+    def _record(self, tool_name: str, result: Optional[GenerationResult]) -> None:
+        stats = self.stats.setdefault(tool_name, GenerationStats())
+        stats.calls += 1
+        if result is None:
+            stats.errors += 1
+            return
+        stats.prompt_tokens += result.prompt_tokens
+        stats.output_tokens += result.output_tokens
+        stats.total_latency += result.latency
+        stats.max_latency = max(stats.max_latency, result.latency)
+        logging.info(
+            f"Gemini {tool_name} ({result.model}): {result.latency:.2f}s, "
+            f"{result.prompt_tokens} prompt / {result.output_tokens} output tokens"
+        )
+
+    async def generate(self, tool_name: str, prompt: str) -> GenerationResult:
+        name = self.model_name(tool_name)
+        started = time.perf_counter()
+        try:
+            with network_time():
+                response = await run_async(tool_name, self.model(name).generate_content_async(prompt))
+        except Exception:
+            self._record(tool_name, None)
+            raise
+
+        usage = getattr(response, "usage_metadata", None)
+        result = GenerationResult(
+            text=_response_text(response),
+            model=name,
+            latency=time.perf_counter() - started,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+        self._record(tool_name, result)
+        return result
+
+    async def stream(self, tool_name: str, prompt: str) -> AsyncIterator[str]:
+        """
+        Yield text chunks as the model produces them.
+
+        The tool's concurrency slot is held until the stream ends and the
+        tool's deadline covers the whole generation.
+        """
+        name = self.model_name(tool_name)
+        started = time.perf_counter()
+        first_chunk: Optional[float] = None
+        result: Optional[GenerationResult] = None
+
+        try:
+            async with tool_slot(tool_name) as limit:
+                async with asyncio.timeout(limit.timeout):
+                    with network_time():
+                        response = await self.model(name).generate_content_async(prompt, stream=True)
+                        async for chunk in response:
+                            text = _response_text(chunk)
+                            if not text:
+                                continue
+                            if first_chunk is None:
+                                first_chunk = time.perf_counter() - started
+                            yield text
+
+            usage = getattr(response, "usage_metadata", None)
+            result = GenerationResult(
+                text="",
+                model=name,
+                latency=time.perf_counter() - started,
+                prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+                output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+            )
+        finally:
+            self._record(tool_name, result)
+            if first_chunk is not None:
+                stats = self.stats[tool_name]
+                stats.streams += 1
+                stats.total_first_chunk += first_chunk
+
+    def record_first_sentence(self, tool_name: str, seconds: float) -> None:
+        """Record time from tool start until the first text was handed to speech."""
+        stats = self.stats.setdefault(tool_name, GenerationStats())
+        stats.spoken += 1
+        stats.total_first_sentence += seconds
+        stats.max_first_sentence = max(stats.max_first_sentence, seconds)
+        record_first_sentence(tool_name, seconds)
+        logging.info(f"Gemini {tool_name}: time to first sentence {seconds:.2f}s")
+
+
+_client: Optional[GeminiClient] = None
+
+
+def get_gemini_client() -> Optional[GeminiClient]:
+    """Return the shared client, or None when GOOGLE_API_KEY is not configured."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            return None
+        _client = GeminiClient(api_key)
+    return _client
@@ -0,0 +1,282 @@
+import codecs
+import logging
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+# Containers that usually hold an article's body, in order of preference;
+# read_article uses paragraphs from the first one present on the page.
+CONTENT_SELECTORS: List[Tuple[str, str]] = [
+    ("tag", "article"),
+    ("class", "article-body"),
+    ("class", "content"),
+    ("class", "post-content"),
+    ("class", "entry-content"),
+    ("tag", "main"),
+]
+
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+HEADING_TAGS = {"h1", "h2", "h3"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+# Opening any of these ends an open <p>, as in the HTML spec.
+CLOSES_PARAGRAPH = {"address", "article", "aside", "blockquote", "div", "dl", "fieldset", "footer",
+                    "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol",
+                    "p", "pre", "section", "table", "ul"}
+BLOCK_TAGS = CLOSES_PARAGRAPH | {"br", "li", "tr", "td", "th", "title", "dd", "dt", "figcaption"}
+
+# Caps that keep a multi-megabyte page from producing a multi-megabyte result.
+MAX_TEXT_CHARS = 50_000
+MAX_LINKS = 500
+
+
+@dataclass
+class PageContent:
+    """Everything the website tools need from one page, collected in a single pass."""
+    title: str = ""
+    headings: List[str] = field(default_factory=list)
+    links: List[Tuple[str, str]] = field(default_factory=list)  # (text, absolute URL)
+    paragraphs: List[str] = field(default_factory=list)
+    article_paragraphs: List[str] = field(default_factory=list)
+    text: str = ""
+
+
+def _clean(parts: List[str]) -> str:
+    return " ".join("".join(parts).split())
+
+
+class _Extractor:
+    """
+    Streaming handler fed start/end/data events by either parser backend.
+
+    Keeps a stack of open elements so it knows which collectors (paragraph,
+    heading, link, title, content container) the current text belongs to.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.page = PageContent()
+        self._stack: List[Tuple[str, Dict[str, object]]] = []
+        self._skip = 0
+        self._paragraph: Optional[List[str]] = None
+        self._heading: Optional[List[str]] = None
+        self._link: Optional[Tuple[str, List[str]]] = None
+        self._title: Optional[List[str]] = None
+        self._text: List[str] = []
+        self.text_size = 0
+        self._open_containers: List[int] = []
+        self._container_paragraphs: Dict[int, List[str]] = {}
+
+    def start(self, tag: str, attrs: Dict[str, Optional[str]]) -> None:
+        tag = tag.lower()
+        if self._paragraph is not None and tag in CLOSES_PARAGRAPH:
+            self._close_up_to("p")
+        if tag in BLOCK_TAGS:
+            self._boundary()
+        if tag in VOID_TAGS:
+            return
+
+        roles: Dict[str, object] = {}
+        if tag in SKIPPED_TAGS:
+            self._skip += 1
+            roles["skip"] = True
+        elif tag == "p":
+            self._paragraph = []
+        elif tag in HEADING_TAGS and self._heading is None:
+            self._heading = []
+            roles["heading"] = True
+        elif tag == "a" and attrs.get("href") and self._link is None:
+            self._link = (str(attrs["href"]), [])
+            roles["link"] = True
+        elif tag == "title" and self._title is None and not self.page.title:
+            self._title = []
+            roles["title"] = True
+
+        classes = (attrs.get("class") or "").split()
+        for index, (kind, name) in enumerate(CONTENT_SELECTORS):
+            if index in self._container_paragraphs:
+                continue
+            if (kind == "tag" and tag == name) or (kind == "class" and name in classes):
+                self._container_paragraphs[index] = []
+                self._open_containers.append(index)
+                roles.setdefault("containers", []).append(index)
+        self._stack.append((tag, roles))
+
+    def end(self, tag: str) -> None:
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._boundary()
+        if tag in VOID_TAGS or not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        self._close_up_to(tag)
+
+    def _close_up_to(self, tag: str) -> None:
+        while self._stack:
+            open_tag, roles = self._stack.pop()
+            self._finish(open_tag, roles)
+            if open_tag == tag:
+                return
+
+    def _finish(self, tag: str, roles: Dict[str, object]) -> None:
+        if roles.get("skip"):
+            self._skip -= 1
+        if tag == "p" and self._paragraph is not None:
+            text = _clean(self._paragraph)
+            self._paragraph = None
+            if text:
+                self.page.paragraphs.append(text)
+                for index in self._open_containers:
+                    self._container_paragraphs[index].append(text)
+        if roles.get("heading") and self._heading is not None:
+            text = _clean(self._heading)
+            self._heading = None
+            if text:
+                self.page.headings.append(text)
+        if roles.get("link") and self._link is not None:
+            href, parts = self._link
+            self._link = None
+            if len(self.page.links) < MAX_LINKS:
+                self.page.links.append((_clean(parts), urljoin(self.base_url, href)))
+        if roles.get("title") and self._title is not None:
+            self.page.title = _clean(self._title)
+            self._title = None
+        for index in roles.get("containers", ()):
+            self._open_containers.remove(index)
+
+    def _add_text(self, data: str) -> None:
+        if self.text_size < MAX_TEXT_CHARS:
+            self._text.append(data)
+            self.text_size += len(data)
+
+    def _boundary(self) -> None:
+        # A block edge separates words even when the markup has no whitespace there
+        for parts in (self._paragraph, self._heading, self._title):
+            if parts is not None:
+                parts.append(" ")
+        self._add_text("\n")
+
+    def data(self, data: str) -> None:
+        if self._skip:
+            return
+        if self._title is not None:
+            self._title.append(data)
+        if self._paragraph is not None:
+            self._paragraph.append(data)
+        if self._heading is not None:
+            self._heading.append(data)
+        if self._link is not None:
+            self._link[1].append(data)
+        self._add_text(data)
+
+    def close(self) -> PageContent:
+        self._close_up_to("")
+        page = self.page
+        chosen = min(self._container_paragraphs, default=None)
+        page.article_paragraphs = self._container_paragraphs[chosen] if chosen is not None else list(page.paragraphs)
+        # Same clean-up the tools used on get_text(): one line per block, runs of spaces dropped
+        lines = (line.strip() for line in "".join(self._text).splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        page.text = " ".join(chunk for chunk in chunks if chunk)
+        return page
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, handler: _Extractor):
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handler.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handler.start(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.handler.end(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self.handler.end(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.handler.data(data)
+
+
+def _lxml_available() -> bool:
+    try:
+        import lxml.etree  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+_use_lxml: Optional[bool] = None
+
+
+def _default_backend() -> str:
+    global _use_lxml
+    if _use_lxml is None:
+        _use_lxml = _lxml_available()
+        if not _use_lxml:
+            logging.info("lxml not installed, HTML extraction will use the stdlib parser")
+    return "lxml" if _use_lxml else "stdlib"
+
+
+def _codec(encoding: Optional[str]) -> str:
+    try:
+        return codecs.lookup(encoding or "utf-8").name
+    except LookupError:
+        return "utf-8"
+
+
+class PageExtractor:
+    """
+    Incremental form of extract_page: feed() bytes as they arrive, then close().
+
+    collected_chars tells the caller how much readable text has been seen, so
+    a download can stop as soon as there is enough.
+    """
+
+    def __init__(self, base_url: str = "", encoding: Optional[str] = None, backend: Optional[str] = None):
+        self._handler = _Extractor(base_url)
+        if (backend or _default_backend()) == "lxml":
+            from lxml import etree
+
+            # Without a declared charset libxml2 detects it from the BOM or <meta>
+            self._parser = etree.HTMLParser(target=self._handler, encoding=_codec(encoding) if encoding else None)
+            self._decoder = None
+        else:
+            self._parser = _StdlibParser(self._handler)
+            self._decoder = codecs.getincrementaldecoder(_codec(encoding))(errors="replace")
+
+    @property
+    def collected_chars(self) -> int:
+        return self._handler.text_size
+
+    def feed(self, data: bytes) -> None:
+        if self._decoder is None:
+            self._parser.feed(data)
+        else:
+            self._parser.feed(self._decoder.decode(data))
+
+    def close(self) -> PageContent:
+        if self._decoder is None:
+            return self._parser.close()
+        self._parser.feed(self._decoder.decode(b"", final=True))
+        self._parser.close()
+        return self._handler.close()
+
+
+def extract_page(html: Union[str, bytes], base_url: str = "", encoding: Optional[str] = None,
+                 backend: Optional[str] = None) -> PageContent:
+    """
+    Parse a page once and collect title, headings, links, paragraphs and readable text.
+
+    Uses lxml's C parser with an event target when it is installed and the
+    standard library's HTMLParser otherwise; backend='lxml' or 'stdlib' forces one.
+    Blocking and CPU-bound: call it through run_blocking.
+    """
+    if isinstance(html, str):
+        html, encoding = html.encode("utf-8"), "utf-8"
+    extractor = PageExtractor(base_url, encoding, backend)
+    extractor.feed(html)
+    return extractor.close()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import network_time
+
+# Browser-like User-Agent; several news sites refuse the default httpx one.
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Concurrent requests allowed to one host; keeps a burst of tool calls from
+# opening dozens of sockets to the same site.
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "6"))
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    # httpx pools per origin, so max_connections bounds the whole process and
+    # max_keepalive_connections bounds idle sockets kept warm for reuse.
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    http2 = _http2_available()
+    if not http2:
+        logging.info("h2 package not installed, HTTP client will use HTTP/1.1 only")
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=limits,
+        transport=_transport,
+        timeout=DEFAULT_TIMEOUT,
+        headers=DEFAULT_HEADERS,
+        follow_redirects=True,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide async HTTP client, creating it on first use.
+
+    The client is tied to the event loop it was created on; if a new loop is
+    running (for example a fresh job process), a new client is built.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = _build_client()
+        _client_loop = loop
+        _host_slots.clear()
+    return _client
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Route requests through a custom transport, such as local stand-in servers; call before the first request."""
+    global _transport, _client
+    _transport = transport
+    _client = None
+
+
+def host_slot(url: str) -> asyncio.Semaphore:
+    """Return the semaphore limiting concurrent requests to the URL's host."""
+    host = urlsplit(url).netloc.lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        _host_slots[host] = slot
+    return slot
+
+
+async def request(method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Send a request through the shared client, respecting the per-host limit."""
+    client = get_http_client()
+    with network_time():
+        async with host_slot(url):
+            return await client.request(method, url, **kwargs)
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+    """
+    Send a request and yield the response with its body still unread.
+
+    The host slot is held until the block exits, and the response is closed
+    there too, so a caller that stops reading early releases the connection.
+    """
+    client = get_http_client()
+    async with host_slot(url):
+        with network_time():
+            response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+
+async def close_http_client() -> None:
+    """Close pooled connections; safe to call more than once."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logging.info("Closed shared HTTP client")
+    _client = None
+    _client_loop = None
+    _host_slots.clear()
@@ -0,0 +1,137 @@
+import email
+import imaplib
+import re
+from dataclasses import dataclass, field
+from email.header import decode_header, make_header
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Headers needed to show a message and to decode a partial body preview.
+HEADER_FIELDS = "FROM SUBJECT DATE MESSAGE-ID CONTENT-TYPE CONTENT-TRANSFER-ENCODING"
+
+# Bytes of the message text fetched for a preview. Attachments come after
+# the text part in practically every client's output, so this stays small.
+PREVIEW_BYTES = 4096
+
+_SEQ_RE = re.compile(rb"^(\d+) \(")
+_UID_RE = re.compile(rb"UID (\d+)")
+_FLAGS_RE = re.compile(rb"FLAGS \(([^)]*)\)")
+
+
+@dataclass
+class MailSummary:
+    """Headers and a short plain-text preview of one message."""
+    seq: bytes
+    uid: Optional[int] = None
+    sender: str = ""
+    subject: str = ""
+    date: str = ""
+    message_id: str = ""
+    preview: str = ""
+    flags: List[str] = field(default_factory=list)
+
+
+def decode_mime_header(value: Optional[str]) -> str:
+    """Decode an RFC 2047 header into a plain string."""
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+def _plain_text_preview(header_bytes: bytes, text_bytes: bytes) -> str:
+    # Rebuild a (possibly truncated) message from the fetched headers and the
+    # first PREVIEW_BYTES of the body; the MIME parser tolerates the cut-off.
+    message = email.message_from_bytes(header_bytes.rstrip(b"\r\n") + b"\r\n\r\n" + text_bytes)
+    parts = message.walk() if message.is_multipart() else [message]
+    for part in parts:
+        if part.get_content_type() != "text/plain":
+            continue
+        try:
+            payload = part.get_payload(decode=True) or b""
+        except Exception:
+            continue
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            return payload.decode(charset, errors="replace")
+        except LookupError:
+            return payload.decode("utf-8", errors="replace")
+    return ""
+
+
+def _parse_fetch_response(data: Sequence) -> Dict[bytes, Tuple[MailSummary, Dict[str, bytes]]]:
+    """Group an imaplib FETCH response by message, collecting literals and attributes."""
+    messages: Dict[bytes, Tuple[MailSummary, Dict[str, bytes]]] = {}
+    current: Optional[Tuple[MailSummary, Dict[str, bytes]]] = None
+
+    for item in data:
+        descriptor = item[0] if isinstance(item, tuple) else item
+        if not isinstance(descriptor, bytes):
+            continue
+
+        match = _SEQ_RE.match(descriptor)
+        if match:
+            seq = match.group(1)
+            current = messages.setdefault(seq, (MailSummary(seq=seq), {}))
+        if current is None:
+            continue
+
+        summary, literals = current
+        uid_match = _UID_RE.search(descriptor)
+        if uid_match:
+            summary.uid = int(uid_match.group(1))
+        flags_match = _FLAGS_RE.search(descriptor)
+        if flags_match:
+            summary.flags = flags_match.group(1).decode(errors="replace").split()
+
+        if isinstance(item, tuple):
+            if b"HEADER" in descriptor:
+                literals["header"] = item[1]
+            elif b"TEXT" in descriptor:
+                literals["text"] = item[1]
+
+    return messages
+
+
+def fetch_summaries(mail: imaplib.IMAP4, ids: Sequence[bytes], with_preview: bool = False,
+                    by_uid: bool = False, preview_bytes: int = PREVIEW_BYTES) -> List[MailSummary]:
+    """
+    Fetch headers (and optionally a bounded text preview) for many messages in one command.
+
+    BODY.PEEK is used throughout, so reading a preview does not mark messages as seen.
+    Results come back in the order of ids.
+    """
+    if not ids:
+        return []
+
+    items = f"UID FLAGS BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})]"
+    if with_preview:
+        items += f" BODY.PEEK[TEXT]<0.{preview_bytes}>"
+
+    id_set = b",".join(ids).decode()
+    if by_uid:
+        status, data = mail.uid("FETCH", id_set, f"({items})")
+    else:
+        status, data = mail.fetch(id_set, f"({items})")
+    if status != 'OK':
+        raise imaplib.IMAP4.error(f"FETCH failed: {data}")
+
+    parsed = _parse_fetch_response(data)
+    summaries = []
+    for summary, literals in parsed.values():
+        header_bytes = literals.get("header", b"")
+        headers = email.message_from_bytes(header_bytes)
+        summary.sender = decode_mime_header(headers.get("From"))
+        summary.subject = decode_mime_header(headers.get("Subject"))
+        summary.date = headers.get("Date", "")
+        summary.message_id = headers.get("Message-ID", "").strip()
+        if with_preview:
+            summary.preview = _plain_text_preview(header_bytes, literals.get("text", b""))
+        summaries.append(summary)
+
+    if by_uid:
+        by_key = {str(s.uid).encode(): s for s in summaries}
+    else:
+        by_key = {s.seq: s for s in summaries}
+    return [by_key[i] for i in ids if i in by_key]
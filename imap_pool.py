@@ -0,0 +1,257 @@
+import asyncio
+import imaplib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from executor import run_blocking
+
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+# Plain IMAP is only meant for local test servers.
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"
+
+# Sessions per account; Gmail allows 15 concurrent IMAP connections per user.
+MAX_SESSIONS_PER_ACCOUNT = int(os.getenv("IMAP_MAX_SESSIONS", "2"))
+# Idle sessions get a NOOP this often so the server does not drop them.
+KEEPALIVE_INTERVAL = 120.0
+# Idle sessions older than this are logged out; Gmail closes at ~30 minutes.
+MAX_IDLE_SECONDS = 20 * 60
+# A checked-out session unused for longer than this is probed before use.
+PROBE_AFTER_SECONDS = 30.0
+
+# Errors that mean the connection itself is gone rather than the command failed.
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+def quote_mailbox(folder: str) -> str:
+    """Quote a mailbox name for imaplib, which sends arguments verbatim."""
+    if folder.startswith('"') or not any(c in folder for c in ' ()"\\'):
+        return folder
+    return '"' + folder.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class ImapSession:
+    """One authenticated IMAP connection plus the folder it currently has selected."""
+
+    def __init__(self, user: str, password: str):
+        self.user = user
+        self._password = password
+        self.conn: Optional[imaplib.IMAP4] = None
+        self.selected: Optional[str] = None
+        self.last_used = 0.0
+        self.reused = False
+
+    def connect(self) -> None:
+        if IMAP_SSL:
+            conn = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT, timeout=20)
+        else:
+            conn = imaplib.IMAP4(IMAP_HOST, IMAP_PORT, timeout=20)
+        try:
+            conn.login(self.user, self._password)
+        except Exception:
+            conn.shutdown()
+            raise
+        self.conn = conn
+        self.selected = None
+        self.last_used = time.monotonic()
+        logging.info(f"Opened IMAP session for {self.user}")
+
+    def ensure_alive(self) -> None:
+        """Connect if needed, probing a long-idle connection with NOOP first."""
+        if self.conn is None:
+            self.connect()
+            return
+        if time.monotonic() - self.last_used > PROBE_AFTER_SECONDS:
+            self.noop()
+
+    def noop(self) -> None:
+        assert self.conn is not None
+        self.conn.noop()
+        self.last_used = time.monotonic()
+
+    def select(self, folder: str) -> imaplib.IMAP4:
+        """Select a folder, skipping the round-trip when it is already selected."""
+        assert self.conn is not None
+        if self.selected != folder:
+            status, data = self.conn.select(quote_mailbox(folder))
+            if status != 'OK':
+                self.selected = None
+                raise imaplib.IMAP4.error(f"Could not select folder {folder}: {data}")
+            self.selected = folder
+        self.last_used = time.monotonic()
+        return self.conn
+
+    def close(self) -> None:
+        if self.conn is None:
+            return
+        try:
+            self.conn.logout()
+        except Exception:
+            pass
+        self.conn = None
+        self.selected = None
+
+
+class _Lease:
+    """
+    One checked-out session's trip through a worker thread.
+
+    If the caller gives up (timeout or cancellation) while the thread is still
+    using the session, the thread logs it out when func returns, so the login
+    is never leaked and a busy socket is never handed to the next call.
+    """
+
+    def __init__(self, session: ImapSession, func: Callable[[ImapSession], Any]):
+        self.session = session
+        self.func = func
+        self._lock = threading.Lock()
+        self._started = False
+        self._finished = False
+        self._abandoned = False
+
+    def call(self) -> Any:
+        with self._lock:
+            if self._abandoned:
+                return None  # the caller is gone and has closed the session
+            self._started = True
+        try:
+            self.session.ensure_alive()
+            return self.func(self.session)
+        finally:
+            with self._lock:
+                self._finished = True
+                abandoned = self._abandoned
+            if abandoned:
+                self.session.close()
+
+    def abandon(self) -> bool:
+        """Give the session up; True when no thread is using it and the caller must close it."""
+        with self._lock:
+            self._abandoned = True
+            return not self._started or self._finished
+
+
+class ImapPool:
+    """
+    Per-account pool of authenticated IMAP sessions shared across tool calls.
+
+    Callers pass a synchronous function that receives an ImapSession; it runs
+    on the shared executor. A session whose connection dropped is replaced and
+    the call retried once.
+    """
+
+    def __init__(self, max_sessions_per_account: int = MAX_SESSIONS_PER_ACCOUNT):
+        self.max_sessions_per_account = max_sessions_per_account
+        self._idle: Dict[str, List[ImapSession]] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def _slot(self, user: str) -> asyncio.Semaphore:
+        slot = self._slots.get(user)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_sessions_per_account)
+            self._slots[user] = slot
+        return slot
+
+    def _checkout(self, user: str, password: str) -> ImapSession:
+        idle = self._idle.get(user)
+        if idle:
+            session = idle.pop()
+            session.reused = True
+            return session
+        return ImapSession(user, password)
+
+    def _checkin(self, session: ImapSession) -> None:
+        self._idle.setdefault(session.user, []).append(session)
+
+    def _ensure_keepalive(self) -> None:
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    async def run(self, tool_name: str, user: str, password: str,
+                  func: Callable[[ImapSession], Any]) -> Any:
+        """Run func with a live session for the account, reconnecting once on failure."""
+        self._ensure_keepalive()
+
+        async with self._slot(user):
+            for attempt in range(2):
+                session = self._checkout(user, password)
+                lease = _Lease(session, func)
+                try:
+                    result = await run_blocking(tool_name, lease.call)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    if lease.abandon():
+                        asyncio.ensure_future(run_blocking("imap_keepalive", session.close))
+                    logging.warning(f"Dropping IMAP session for {user} after timeout or cancellation")
+                    raise
+                except CONNECTION_ERRORS as e:
+                    await run_blocking(tool_name, session.close)
+                    if attempt == 0 and session.reused:
+                        logging.info(f"IMAP session for {user} went stale ({e}), reconnecting")
+                        continue
+                    raise
+                except imaplib.IMAP4.error:
+                    # A NO/BAD reply leaves the connection usable.
+                    self._checkin(session)
+                    raise
+                except Exception:
+                    await run_blocking(tool_name, session.close)
+                    raise
+                self._checkin(session)
+                return result
+
+    async def _keepalive_loop(self) -> None:
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            for user, sessions in list(self._idle.items()):
+                keep = []
+                # Take the sessions out while probing so no tool call grabs one mid-NOOP.
+                self._idle[user] = []
+                for session in sessions:
+                    idle_for = time.monotonic() - session.last_used
+                    try:
+                        if idle_for > MAX_IDLE_SECONDS:
+                            await run_blocking("imap_keepalive", session.close)
+                            continue
+                        if idle_for > KEEPALIVE_INTERVAL:
+                            await run_blocking("imap_keepalive", session.noop)
+                        keep.append(session)
+                    except Exception as e:
+                        logging.info(f"Idle IMAP session for {user} dropped: {e}")
+                        session.conn = None
+                self._idle.setdefault(user, []).extend(keep)
+
+    async def close(self) -> None:
+        """Log out every idle session and stop the keepalive task."""
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        sessions = [s for idle in self._idle.values() for s in idle]
+        self._idle.clear()
+        for session in sessions:
+            await run_blocking("imap_keepalive", session.close)
+
+    def idle_counts(self) -> Dict[str, int]:
+        """Return the number of idle sessions kept per account."""
+        return {user: len(sessions) for user, sessions in self._idle.items()}
+
+
+_pool: Optional[ImapPool] = None
+
+
+def get_imap_pool() -> ImapPool:
+    """Return the worker-wide IMAP pool."""
+    global _pool
+    if _pool is None:
+        _pool = ImapPool()
+    return _pool
+
+
+async def close_imap_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
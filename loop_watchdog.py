@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import List, Optional, Tuple
+
+from metrics import record_loop_lag, record_stall
+
+# A stall is any gap between ticks longer than this; audio frames are 10-20 ms,
+# so anything past ~100 ms is audible.
+STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100")) / 1000
+TICK_INTERVAL = 0.02
+STACK_DEPTH = 12
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _attribute(frame: Optional[FrameType]) -> Tuple[str, str]:
+    """
+    Name the tool (or, failing that, the repo function) running in a frame stack.
+
+    Returns (owner, location). A tool wrapped by metrics.instrumented is found
+    as the frame directly inside the wrapper; code running outside any tool,
+    such as a fan-out task, falls back to the innermost function in this repo.
+    """
+    location = ""
+    repo_function = ""
+    inner: Optional[FrameType] = None
+    while frame is not None:
+        code = frame.f_code
+        if not location:
+            location = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} in {code.co_name}"
+        if code.co_name == "wrapper" and code.co_filename.endswith("metrics.py") and inner is not None:
+            return inner.f_code.co_name, location
+        if not repo_function and code.co_filename.startswith(_REPO_DIR) and not code.co_filename.endswith(
+                "loop_watchdog.py"):
+            repo_function = f"{os.path.splitext(os.path.basename(code.co_filename))[0]}.{code.co_name}"
+        inner = frame
+        frame = frame.f_back
+    return repo_function or "unknown", location
+
+
+class LoopWatchdog:
+    """
+    Detects event-loop stalls from a helper thread.
+
+    A coroutine on the loop stamps a heartbeat every TICK_INTERVAL. The thread
+    notices when the heartbeat is late, captures the loop thread's stack while
+    the stall is still happening, and reports it once the loop runs again.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float = STALL_THRESHOLD):
+        self.loop = loop
+        self.threshold = threshold
+        self.stalls = 0
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped = threading.Event()
+        self._ticker: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._ticker = self.loop.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + TICK_INTERVAL
+            await asyncio.sleep(TICK_INTERVAL)
+            now = time.monotonic()
+            record_loop_lag(max(0.0, now - expected))
+            self._last_tick = now
+
+    def _capture(self) -> Tuple[str, str, List[str]]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        owner, location = _attribute(frame)
+        stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+        return owner, location, stack
+
+    def _watch(self) -> None:
+        stalled_tick: Optional[float] = None
+        captured: Tuple[str, str, List[str]] = ("unknown", "", [])
+        while not self._stopped.wait(TICK_INTERVAL / 2):
+            last_tick = self._last_tick
+            if stalled_tick is None:
+                if time.monotonic() - last_tick - TICK_INTERVAL > self.threshold:
+                    stalled_tick = last_tick
+                    captured = self._capture()
+            elif last_tick != stalled_tick:
+                self._report(last_tick - stalled_tick - TICK_INTERVAL, *captured)
+                stalled_tick = None
+
+    def _report(self, seconds: float, owner: str, location: str, stack: List[str]) -> None:
+        self.stalls += 1
+        record_stall(owner, seconds)
+        logging.warning(
+            f"Event loop stalled for {seconds * 1000:.0f} ms in {owner} ({location})",
+            extra={
+                "event": "event_loop_stall",
+                "stall_ms": round(seconds * 1000),
+                "tool": owner,
+                "location": location,
+                "stack": "".join(stack),
+            },
+        )
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog() -> Optional[LoopWatchdog]:
+    """Start watching the running loop; set LOOP_WATCHDOG=0 to disable."""
+    global _watchdog
+    if os.getenv("LOOP_WATCHDOG", "1") == "0":
+        return None
+    loop = asyncio.get_running_loop()
+    if _watchdog is None or _watchdog.loop is not loop:
+        if _watchdog is not None:
+            _watchdog.stop()
+        _watchdog = LoopWatchdog(loop)
+        _watchdog.start()
+    return _watchdog
+
+
+async def stop_loop_watchdog() -> None:
+    global _watchdog
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
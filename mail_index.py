@@ -0,0 +1,487 @@
+import asyncio
+import imaplib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from executor import get_limit, run_blocking
+from imap_fetch import MailSummary, fetch_summaries
+from imap_pool import ImapSession, get_imap_pool, quote_mailbox
+from metrics import record_cache, start_shared, wait_shared
+
+MAIL_INDEX_PATH = os.getenv("MAIL_INDEX_PATH", "mail_index.sqlite3")
+
+# The index is served without touching the server if it was synced this recently.
+SYNC_MAX_AGE_SECONDS = 60.0
+# Messages pulled on the first sync of a folder; older mail is indexed afterwards
+# by a background backfill, BACKFILL_MESSAGES per pooled session checkout.
+INITIAL_SYNC_MESSAGES = 200
+BACKFILL_MESSAGES = 500
+# Pause between backfill steps so tool calls get a pooled session in between.
+BACKFILL_PAUSE_SECONDS = 1.0
+# UIDs per FETCH command during a sync.
+SYNC_BATCH_SIZE = 100
+# Bytes of body text indexed per message.
+INDEX_BODY_BYTES = 8192
+# How often expunged messages are pruned (needs a full UID listing).
+PRUNE_INTERVAL_SECONDS = 30 * 60
+
+_STATUS_RE = re.compile(r"(UIDVALIDITY|UIDNEXT|MESSAGES|UNSEEN) (\d+)")
+
+SEARCH_COLUMNS = {"subject": "subject", "from": "sender", "body": "body"}
+SERVER_SEARCH_KEYS = {"subject": "SUBJECT", "from": "FROM", "body": "BODY"}
+
+
+@dataclass
+class FolderState:
+    """What the index last saw of a mailbox on the server."""
+    uidvalidity: int
+    uidnext: int
+    synced_at: float
+    pruned_at: float
+    # Every UID from here up is indexed; 1 once the backfill has reached the
+    # oldest message, 0 for folders indexed before this was tracked.
+    indexed_from: int = 0
+    # Mailbox counts from the server's last STATUS; -1 when not known yet.
+    messages: int = -1
+    unseen: int = -1
+
+    @property
+    def complete(self) -> bool:
+        return self.indexed_from == 1
+
+
+def _sent_timestamp(date_header: str) -> float:
+    try:
+        return parsedate_to_datetime(date_header).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return 0.0
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching words starting with each given word, quoting each as a literal."""
+    words = re.findall(r"\w+", text, flags=re.UNICODE)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _imap_quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class MailIndex:
+    """
+    Local SQLite index of mailbox headers and plain-text bodies.
+
+    Uses an FTS5 table for search when the SQLite build has it, and falls back
+    to LIKE matching otherwise. Safe to use from executor threads.
+    """
+
+    def __init__(self, path: str = MAIL_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS folders (
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uidnext INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                pruned_at REAL NOT NULL DEFAULT 0,
+                indexed_from INTEGER NOT NULL DEFAULT 0,
+                messages INTEGER NOT NULL DEFAULT -1,
+                unseen INTEGER NOT NULL DEFAULT -1,
+                PRIMARY KEY (account, folder)
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                sender TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                date TEXT NOT NULL,
+                sent_at REAL NOT NULL,
+                body TEXT NOT NULL,
+                seen INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (account, folder, uid)
+            );
+            CREATE INDEX IF NOT EXISTS messages_by_date ON messages (account, folder, sent_at);
+        """)
+        # Indexes created before the backfill existed lack its columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(folders)")}
+        for column, definition in (("indexed_from", "INTEGER NOT NULL DEFAULT 0"),
+                                   ("messages", "INTEGER NOT NULL DEFAULT -1"),
+                                   ("unseen", "INTEGER NOT NULL DEFAULT -1")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE folders ADD COLUMN {column} {definition}")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                "sender, subject, body, content='messages', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            logging.warning("SQLite FTS5 not available, mail search will use LIKE matching")
+            self.fts = False
+        self._conn.commit()
+
+    def folder_state(self, account: str, folder: str) -> Optional[FolderState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, uidnext, synced_at, pruned_at, indexed_from, messages, unseen "
+                "FROM folders WHERE account = ? AND folder = ?", (account, folder)
+            ).fetchone()
+        return FolderState(*row) if row else None
+
+    def save_folder_state(self, account: str, folder: str, state: FolderState) -> None:
+        """Store a sync's results; indexed_from is only written for a new folder, the backfill owns it after that."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO folders (account, folder, uidvalidity, uidnext, synced_at, pruned_at, "
+                "indexed_from, messages, unseen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (account, folder) DO UPDATE SET uidvalidity = excluded.uidvalidity, "
+                "uidnext = excluded.uidnext, synced_at = excluded.synced_at, pruned_at = excluded.pruned_at, "
+                "messages = excluded.messages, unseen = excluded.unseen",
+                (account, folder, state.uidvalidity, state.uidnext, state.synced_at, state.pruned_at,
+                 state.indexed_from, state.messages, state.unseen),
+            )
+            self._conn.commit()
+
+    def set_indexed_from(self, account: str, folder: str, uidvalidity: int, uid: int) -> None:
+        """Record backfill progress, unless the folder was reset under a new UIDVALIDITY meanwhile."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE folders SET indexed_from = ? WHERE account = ? AND folder = ? AND uidvalidity = ?",
+                (uid, account, folder, uidvalidity),
+            )
+            self._conn.commit()
+
+    def oldest_uid(self, account: str, folder: str) -> Optional[int]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(uid) FROM messages WHERE account = ? AND folder = ?", (account, folder)
+            ).fetchone()[0]
+
+    def _delete_ids(self, ids: List[int]) -> None:
+        if self.fts:
+            for message_id in ids:
+                row = self._conn.execute(
+                    "SELECT sender, subject, body FROM messages WHERE id = ?", (message_id,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "INSERT INTO messages_fts (messages_fts, rowid, sender, subject, body) "
+                        "VALUES ('delete', ?, ?, ?, ?)", (message_id, *row)
+                    )
+        self._conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in ids])
+
+    def reset_folder(self, account: str, folder: str) -> None:
+        """Forget a folder after its UIDVALIDITY changed."""
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT id FROM messages WHERE account = ? AND folder = ?", (account, folder))]
+            self._delete_ids(ids)
+            self._conn.execute("DELETE FROM folders WHERE account = ? AND folder = ?", (account, folder))
+            self._conn.commit()
+
+    def add_messages(self, account: str, folder: str, summaries: Iterable[MailSummary]) -> None:
+        with self._lock:
+            for s in summaries:
+                if s.uid is None:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO messages "
+                    "(account, folder, uid, sender, subject, date, sent_at, body, seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (account, folder, s.uid, s.sender, s.subject, s.date,
+                     _sent_timestamp(s.date), s.preview, int("\\Seen" in s.flags)),
+                )
+                if self.fts and cursor.rowcount:
+                    self._conn.execute(
+                        "INSERT INTO messages_fts (rowid, sender, subject, body) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid, s.sender, s.subject, s.preview),
+                    )
+            self._conn.commit()
+
+    def set_unseen(self, account: str, folder: str, unseen_uids: Set[int]) -> None:
+        """Bring read/unread state in line with the server's UNSEEN set."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE messages SET seen = 1 WHERE account = ? AND folder = ?", (account, folder))
+            self._conn.executemany(
+                "UPDATE messages SET seen = 0 WHERE account = ? AND folder = ? AND uid = ?",
+                [(account, folder, uid) for uid in unseen_uids],
+            )
+            self._conn.commit()
+
+    def prune(self, account: str, folder: str, live_uids: Set[int]) -> None:
+        """Drop messages that were expunged on the server."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, uid FROM messages WHERE account = ? AND folder = ?", (account, folder)
+            ).fetchall()
+            gone = [message_id for message_id, uid in rows if uid not in live_uids]
+            if gone:
+                self._delete_ids(gone)
+                self._conn.commit()
+
+    def _rows_to_summaries(self, rows: List[Tuple]) -> List[MailSummary]:
+        return [
+            MailSummary(seq=str(uid).encode(), uid=uid, sender=sender, subject=subject,
+                        date=date, preview=body, flags=["\\Seen"] if seen else [])
+            for uid, sender, subject, date, body, seen in rows
+        ]
+
+    def search(self, account: str, folder: str, query: str, search_in: str = "all",
+               limit: int = 10) -> Tuple[int, List[MailSummary]]:
+        """Return (total matches, newest matches first)."""
+        column = SEARCH_COLUMNS.get(search_in)
+        with self._lock:
+            if self.fts:
+                match = _fts_query(query)
+                if not match:
+                    return 0, []
+                if column:
+                    match = f"{column} : ({match})"
+                where = ("m.account = ? AND m.folder = ? AND m.id IN "
+                         "(SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+                params: Tuple = (account, folder, match)
+            else:
+                columns = [column] if column else list(SEARCH_COLUMNS.values())
+                where = "m.account = ? AND m.folder = ? AND (" + " OR ".join(
+                    f"m.{c} LIKE ?" for c in columns) + ")"
+                params = (account, folder, *[f"%{query}%"] * len(columns))
+
+            total = self._conn.execute(f"SELECT COUNT(*) FROM messages m WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT m.uid, m.sender, m.subject, m.date, m.body, m.seen FROM messages m "
+                f"WHERE {where} ORDER BY m.sent_at DESC, m.uid DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return total, self._rows_to_summaries(rows)
+
+    def recent(self, account: str, folder: str, unread_only: bool = False,
+               limit: int = 5) -> Tuple[int, List[MailSummary]]:
+        """Return (total messages, newest first) for a folder."""
+        where = "account = ? AND folder = ?" + (" AND seen = 0" if unread_only else "")
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM messages WHERE {where}", (account, folder)).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT uid, sender, subject, date, body, seen FROM messages WHERE {where} "
+                f"ORDER BY uid DESC LIMIT ?", (account, folder, limit)
+            ).fetchall()
+        return total, self._rows_to_summaries(rows)
+
+
+def _uid_search(session: ImapSession, *criteria: str) -> List[int]:
+    assert session.conn is not None
+    status, data = session.conn.uid("SEARCH", None, *criteria)
+    if status != 'OK':
+        raise RuntimeError(f"UID SEARCH {' '.join(criteria)} failed: {data}")
+    return [int(uid) for uid in data[0].split()]
+
+
+def sync_folder(session: ImapSession, index: MailIndex, folder: str) -> None:
+    """
+    Bring the index up to date with one folder using UIDVALIDITY/UIDNEXT deltas.
+
+    Only messages with UIDs at or above the last seen UIDNEXT are fetched; flags
+    are refreshed with a single UID SEARCH UNSEEN. The first sync of a folder
+    indexes the newest INITIAL_SYNC_MESSAGES; backfill_folder() does the rest.
+    """
+    account = session.user
+    mail = session.select(folder)
+    status, data = mail.status(quote_mailbox(folder), "(UIDVALIDITY UIDNEXT MESSAGES UNSEEN)")
+    if status != 'OK':
+        raise RuntimeError(f"STATUS {folder} failed: {data}")
+    values = {name.lower(): int(value) for name, value in _STATUS_RE.findall(data[0].decode(errors="replace"))}
+
+    state = index.folder_state(account, folder)
+    if state is not None and state.uidvalidity != values["uidvalidity"]:
+        logging.info(f"UIDVALIDITY of {folder} changed, rebuilding mail index")
+        index.reset_folder(account, folder)
+        state = None
+
+    start_uid = state.uidnext if state else 1
+    indexed_from = state.indexed_from if state else 1
+    if values["uidnext"] > start_uid:
+        new_uids = [uid for uid in _uid_search(session, "UID", f"{start_uid}:*") if uid >= start_uid]
+        if state is None and len(new_uids) > INITIAL_SYNC_MESSAGES:
+            new_uids = new_uids[-INITIAL_SYNC_MESSAGES:]
+            indexed_from = new_uids[0]
+        _index_uids(mail, index, account, folder, new_uids)
+        logging.info(f"Indexed {len(new_uids)} new messages in {folder}")
+
+    unseen_uids = set(_uid_search(session, "UNSEEN"))
+    index.set_unseen(account, folder, unseen_uids)
+
+    now = time.time()
+    pruned_at = state.pruned_at if state else now
+    if state is not None and now - state.pruned_at > PRUNE_INTERVAL_SECONDS:
+        index.prune(account, folder, set(_uid_search(session, "ALL")))
+        pruned_at = now
+
+    index.save_folder_state(account, folder, FolderState(
+        uidvalidity=values["uidvalidity"], uidnext=values["uidnext"],
+        synced_at=now, pruned_at=pruned_at, indexed_from=indexed_from,
+        messages=values.get("messages", -1), unseen=values.get("unseen", len(unseen_uids))))
+    if state is not None and state.indexed_from == 0:
+        # Indexed before backfill progress was tracked: resume below the oldest message held
+        index.set_indexed_from(account, folder, values["uidvalidity"],
+                               index.oldest_uid(account, folder) or values["uidnext"])
+
+
+def _index_uids(mail: imaplib.IMAP4, index: MailIndex, account: str, folder: str, uids: List[int]) -> None:
+    for i in range(0, len(uids), SYNC_BATCH_SIZE):
+        batch = [str(uid).encode() for uid in uids[i:i + SYNC_BATCH_SIZE]]
+        summaries = fetch_summaries(mail, batch, with_preview=True, by_uid=True,
+                                    preview_bytes=INDEX_BODY_BYTES)
+        index.add_messages(account, folder, summaries)
+
+
+def backfill_folder(session: ImapSession, index: MailIndex, folder: str) -> bool:
+    """Index the next BACKFILL_MESSAGES older than the indexed range; True once the folder is complete."""
+    account = session.user
+    state = index.folder_state(account, folder)
+    if state is None or state.indexed_from <= 1:
+        return True
+    mail = session.select(folder)
+    older = [uid for uid in _uid_search(session, "UID", f"1:{state.indexed_from - 1}") if uid < state.indexed_from]
+    batch = older[-BACKFILL_MESSAGES:]
+    _index_uids(mail, index, account, folder, batch)
+    indexed_from = batch[0] if len(older) > len(batch) else 1
+    index.set_indexed_from(account, folder, state.uidvalidity, indexed_from)
+    logging.info(f"Backfilled {len(batch)} older messages in {folder}, {len(older) - len(batch)} to go")
+    return indexed_from == 1
+
+
+def _criteria(query: str, search_in: str) -> List[str]:
+    quoted = _imap_quote(query)
+    key = SERVER_SEARCH_KEYS.get(search_in)
+    if key:
+        return [key, quoted]
+    return ["OR", "OR", "SUBJECT", quoted, "FROM", quoted, "BODY", quoted]
+
+
+def server_query(session: ImapSession, folder: str, criteria: List[str], limit: int,
+                 with_preview: bool = False) -> Tuple[int, List[MailSummary]]:
+    """Run a UID SEARCH on the server itself; returns (total matches, newest matches first)."""
+    mail = session.select(folder)
+    uids = _uid_search(session, *criteria)
+    newest = [str(uid).encode() for uid in reversed(uids[-limit:])] if limit > 0 else []
+    return len(uids), fetch_summaries(mail, newest, with_preview=with_preview, by_uid=True)
+
+
+_index: Optional[MailIndex] = None
+_syncs: Dict[Tuple[str, str], asyncio.Task] = {}
+_backfills: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def get_mail_index() -> MailIndex:
+    """Return the process-wide mail index."""
+    global _index
+    if _index is None:
+        _index = MailIndex()
+    return _index
+
+
+async def _sync(user: str, password: str, folder: str) -> None:
+    index = get_mail_index()
+    await get_imap_pool().run("mail_sync", user, password, lambda s: sync_folder(s, index, folder))
+    key = (user, folder)
+    task = _backfills.get(key)
+    if task is None or task.done():
+        state = index.folder_state(user, folder)
+        if state is not None and not state.complete:
+            task = start_shared(_backfill(user, password, folder))
+            task.add_done_callback(lambda t: _log_sync_failure(folder, t))
+            _backfills[key] = task
+
+
+async def _backfill(user: str, password: str, folder: str) -> None:
+    index = get_mail_index()
+    while not await get_imap_pool().run("mail_sync", user, password, lambda s: backfill_folder(s, index, folder)):
+        await asyncio.sleep(BACKFILL_PAUSE_SECONDS)
+
+
+async def refresh_index(tool_name: str, user: str, password: str, folder: str) -> Optional[FolderState]:
+    """
+    Make sure the index can answer for a folder, returning its state.
+
+    A recently synced folder is served as-is. A stale one is served as-is too
+    while a sync runs in the background; only a folder never synced before
+    makes the caller wait for the server.
+    """
+    index = get_mail_index()
+    state = await run_blocking(tool_name, index.folder_state, user, folder)
+    fresh = state is not None and time.time() - state.synced_at < SYNC_MAX_AGE_SECONDS
+    record_cache(tool_name, "mail_index", fresh)
+    if fresh:
+        return state
+
+    key = (user, folder)
+    task = _syncs.get(key)
+    if task is None or task.done():
+        task = start_shared(_sync(user, password, folder))
+        task.add_done_callback(lambda t: _log_sync_failure(folder, t))
+        _syncs[key] = task
+
+    if state is None:
+        await asyncio.wait_for(wait_shared(task), timeout=get_limit(tool_name).timeout)
+        state = await run_blocking(tool_name, index.folder_state, user, folder)
+    return state
+
+
+async def read_mail(tool_name: str, user: str, password: str, folder: str, unread_only: bool,
+                    limit: int) -> Tuple[int, List[MailSummary]]:
+    """
+    Return (messages in the mailbox, newest first) from the index.
+
+    The count is the server's, from the last sync. While the index does not
+    reach back far enough to fill the request, the server is asked directly.
+    """
+    state = await refresh_index(tool_name, user, password, folder)
+    indexed, summaries = await run_blocking(tool_name, get_mail_index().recent, user, folder, unread_only, limit)
+    total = (state.unseen if unread_only else state.messages) if state is not None else -1
+    if total < 0:
+        total = indexed
+    if state is not None and not state.complete and len(summaries) < min(limit, total):
+        criteria = ["UNSEEN" if unread_only else "ALL"]
+        total, summaries = await get_imap_pool().run(
+            tool_name, user, password, lambda s: server_query(s, folder, criteria, limit, with_preview=True))
+    return total, summaries
+
+
+async def search_mail(tool_name: str, user: str, password: str, folder: str, query: str,
+                      search_in: str = "all", limit: int = 10, deep: bool = False) -> Tuple[int, List[MailSummary]]:
+    """
+    Return (total matches, newest first), searching the index first.
+
+    Falls back to a server-side UID SEARCH only while the index may be
+    missing older matches because its backfill has not finished, or when
+    deep asks for it (the server also matches inside words). A complete
+    index finding nothing is trusted, so "did X email me?" costs no round
+    trip.
+    """
+    state = await refresh_index(tool_name, user, password, folder)
+    total, summaries = await run_blocking(tool_name, get_mail_index().search, user, folder, query, search_in, limit)
+    if deep or ((state is None or not state.complete) and total < limit):
+        logging.info(f"Mail index had {total} matches for '{query}', searching {folder} on the server")
+        criteria = _criteria(query, search_in)
+        total, summaries = await get_imap_pool().run(
+            tool_name, user, password, lambda s: server_query(s, folder, criteria, limit))
+    return total, summaries
+
+
+def _log_sync_failure(folder: str, task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Mail index sync of {folder} failed: {task.exception()}")
@@ -0,0 +1,341 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Set METRICS_PORT to serve /metrics from each worker process. Job processes
+# each take the first free port in METRICS_PORT .. METRICS_PORT + METRICS_PORT_RANGE - 1.
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_PORT_RANGE = int(os.getenv("METRICS_PORT_RANGE", "16"))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus-style upper bounds."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+@dataclass
+class ToolCall:
+    """
+    Measurements for one tool invocation.
+
+    Network time is the wall time during which at least one upstream call
+    (HTTP, search, IMAP, Gemini) was in flight, so concurrent fan-out is not
+    double counted. Processing time is the rest.
+    """
+    tool: str
+    started: float = field(default_factory=time.perf_counter)
+    network_seconds: float = 0.0
+    error_class: Optional[str] = None
+    _in_flight: int = 0
+    _since: float = 0.0
+
+    def network_started(self) -> None:
+        if self._in_flight == 0:
+            self._since = time.perf_counter()
+        self._in_flight += 1
+
+    def network_finished(self) -> None:
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self.network_seconds += time.perf_counter() - self._since
+
+
+_current: ContextVar[Optional[ToolCall]] = ContextVar("tool_call", default=None)
+_lock = threading.Lock()
+_calls: Dict[Tuple[str, str], int] = {}
+_errors: Dict[Tuple[str, str], int] = {}
+_cache: Dict[Tuple[str, str, str], int] = {}
+_latency: Dict[Tuple[str, str], Histogram] = {}
+_sizes: Dict[str, Histogram] = {}
+_in_progress: Dict[str, int] = {}
+_loop_lag = Histogram(LAG_BUCKETS)
+_stalls: Dict[str, Histogram] = {}
+_providers: Dict[Tuple[str, str], int] = {}
+_circuits: Dict[str, int] = {}
+_first_sentence: Dict[str, Histogram] = {}
+
+
+def _histogram(store: Dict[Any, Histogram], key: Any, buckets: Tuple[float, ...]) -> Histogram:
+    histogram = store.get(key)
+    if histogram is None:
+        histogram = store[key] = Histogram(buckets)
+    return histogram
+
+
+@contextmanager
+def network_time() -> Iterator[None]:
+    """Count the block as time spent waiting on an upstream service."""
+    call = _current.get()
+    if call is None:
+        yield
+        return
+    call.network_started()
+    try:
+        yield
+    finally:
+        call.network_finished()
+
+
+T = TypeVar("T")
+
+
+def start_shared(coro: Coroutine[Any, Any, T]) -> "asyncio.Task[T]":
+    """
+    Start work that several tool calls may wait on, outside any one call.
+
+    The task runs in an empty context, so its network time and errors are not
+    charged to whichever call happened to start it; each caller measures its
+    own wait with wait_shared().
+    """
+    return asyncio.get_running_loop().create_task(coro, context=Context())
+
+
+async def wait_shared(task: "asyncio.Task[T]") -> T:
+    """Wait for shared work as the current tool call: the wait is network time and a failure is its error."""
+    with network_time():
+        try:
+            # Shielded so one caller's deadline does not cancel the work for the others
+            return await asyncio.shield(task)
+        except Exception as e:
+            note_error(e)
+            raise
+
+
+def note_error(error: BaseException) -> None:
+    """Attribute an error to the running tool call, even if the tool later handles it."""
+    call = _current.get()
+    if call is not None and call.error_class is None:
+        call.error_class = type(error).__name__
+
+
+def record_cache(tool_name: str, cache: str, hit: bool) -> None:
+    key = (tool_name, cache, "hit" if hit else "miss")
+    with _lock:
+        _cache[key] = _cache.get(key, 0) + 1
+
+
+def record_loop_lag(seconds: float) -> None:
+    with _lock:
+        _loop_lag.observe(seconds)
+
+
+def record_stall(owner: str, seconds: float) -> None:
+    """Record an event-loop stall attributed to a tool (or repo function)."""
+    with _lock:
+        _histogram(_stalls, owner, LAG_BUCKETS).observe(seconds)
+
+
+def record_provider(provider: str, outcome: str) -> None:
+    """Count a search provider request: ok, empty, error or skipped (circuit open)."""
+    key = (provider, outcome)
+    with _lock:
+        _providers[key] = _providers.get(key, 0) + 1
+
+
+def set_circuit_state(provider: str, is_open: bool) -> None:
+    with _lock:
+        _circuits[provider] = int(is_open)
+
+
+def record_first_sentence(tool_name: str, seconds: float) -> None:
+    """Record how long a streamed answer took from tool start until its first sentence went to speech."""
+    with _lock:
+        _histogram(_first_sentence, tool_name, LATENCY_BUCKETS).observe(seconds)
+
+
+def _finish(call: ToolCall, result: Any, error: Optional[BaseException]) -> None:
+    elapsed = time.perf_counter() - call.started
+    if error is not None:
+        call.error_class = type(error).__name__
+        outcome = "exception"
+    else:
+        outcome = "error" if call.error_class else "ok"
+    # A stream still in flight when the tool returns counts up to now.
+    network = min(call.network_seconds, elapsed)
+
+    with _lock:
+        _in_progress[call.tool] = _in_progress.get(call.tool, 1) - 1
+        _calls[(call.tool, outcome)] = _calls.get((call.tool, outcome), 0) + 1
+        if call.error_class:
+            key = (call.tool, call.error_class)
+            _errors[key] = _errors.get(key, 0) + 1
+        _histogram(_latency, (call.tool, "total"), LATENCY_BUCKETS).observe(elapsed)
+        _histogram(_latency, (call.tool, "network"), LATENCY_BUCKETS).observe(network)
+        _histogram(_latency, (call.tool, "processing"), LATENCY_BUCKETS).observe(elapsed - network)
+        if isinstance(result, str):
+            _histogram(_sizes, call.tool, SIZE_BUCKETS).observe(len(result.encode("utf-8")))
+
+
+def instrumented(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Record count, latency split, error class and response size for a tool.
+
+    Goes under @function_tool() so the tool schema still comes from the
+    wrapped function's signature and docstring.
+    """
+    tool_name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        call = ToolCall(tool_name)
+        token = _current.set(call)
+        with _lock:
+            _in_progress[tool_name] = _in_progress.get(tool_name, 0) + 1
+        result = None
+        error: Optional[BaseException] = None
+        try:
+            result = await func(*args, **kwargs)
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            _finish(call, result, error)
+
+    return wrapper
+
+
+def _labels(**labels: str) -> str:
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels.items())
+    joined = ",".join(escaped)
+    return "{" + joined + "}" if joined else ""
+
+
+def _render_histogram(lines: List[str], name: str, histogram: Histogram, **labels: str) -> None:
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=f'{bound:g}')} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.total:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+
+def render_prometheus() -> str:
+    """Return all tool metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        lines.append("# HELP tool_calls_total Tool invocations by outcome.")
+        lines.append("# TYPE tool_calls_total counter")
+        for (tool, outcome), count in sorted(_calls.items()):
+            lines.append(f"tool_calls_total{_labels(tool=tool, outcome=outcome)} {count}")
+
+        lines.append("# HELP tool_errors_total Tool invocations that hit an error, by error class.")
+        lines.append("# TYPE tool_errors_total counter")
+        for (tool, error_class), count in sorted(_errors.items()):
+            lines.append(f"tool_errors_total{_labels(tool=tool, error_class=error_class)} {count}")
+
+        lines.append("# HELP tool_in_progress Tool invocations currently running.")
+        lines.append("# TYPE tool_in_progress gauge")
+        for tool, count in sorted(_in_progress.items()):
+            lines.append(f"tool_in_progress{_labels(tool=tool)} {count}")
+
+        lines.append("# HELP tool_latency_seconds Tool latency, split into network and processing time.")
+        lines.append("# TYPE tool_latency_seconds histogram")
+        for (tool, phase), histogram in sorted(_latency.items()):
+            _render_histogram(lines, "tool_latency_seconds", histogram, tool=tool, phase=phase)
+
+        lines.append("# HELP tool_response_bytes Size of the text returned to the LLM.")
+        lines.append("# TYPE tool_response_bytes histogram")
+        for tool, histogram in sorted(_sizes.items()):
+            _render_histogram(lines, "tool_response_bytes", histogram, tool=tool)
+
+        lines.append("# HELP tool_cache_requests_total Cache lookups made by tools.")
+        lines.append("# TYPE tool_cache_requests_total counter")
+        for (tool, cache, result), count in sorted(_cache.items()):
+            lines.append(f"tool_cache_requests_total{_labels(tool=tool, cache=cache, result=result)} {count}")
+
+        lines.append("# HELP event_loop_lag_seconds How late the event loop ran a periodic heartbeat.")
+        lines.append("# TYPE event_loop_lag_seconds histogram")
+        _render_histogram(lines, "event_loop_lag_seconds", _loop_lag)
+
+        lines.append("# HELP event_loop_stall_seconds Event-loop stalls over the threshold, by the tool that caused them.")
+        lines.append("# TYPE event_loop_stall_seconds histogram")
+        for tool, histogram in sorted(_stalls.items()):
+            _render_histogram(lines, "event_loop_stall_seconds", histogram, tool=tool)
+
+        lines.append("# HELP search_provider_requests_total Search backend requests by outcome.")
+        lines.append("# TYPE search_provider_requests_total counter")
+        for (provider, outcome), count in sorted(_providers.items()):
+            lines.append(f"search_provider_requests_total{_labels(provider=provider, outcome=outcome)} {count}")
+
+        lines.append("# HELP search_provider_circuit_open 1 while a search backend is being skipped after failures.")
+        lines.append("# TYPE search_provider_circuit_open gauge")
+        for provider, state in sorted(_circuits.items()):
+            lines.append(f"search_provider_circuit_open{_labels(provider=provider)} {state}")
+
+        lines.append("# HELP tool_time_to_first_sentence_seconds Time from tool start until the first sentence of a streamed answer was handed to TTS.")
+        lines.append("# TYPE tool_time_to_first_sentence_seconds histogram")
+        for tool, histogram in sorted(_first_sentence.items()):
+            _render_histogram(lines, "tool_time_to_first_sentence_seconds", histogram, tool=tool)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server() -> Optional[int]:
+    """Serve /metrics on a background thread when METRICS_PORT is set; returns the port used."""
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+    if not METRICS_PORT:
+        return None
+
+    base = int(METRICS_PORT)
+    for port in range(base, base + METRICS_PORT_RANGE):
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError:
+            continue
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Serving tool metrics on :{port}/metrics")
+        return port
+
+    logging.warning(f"No free metrics port in {base}-{base + METRICS_PORT_RANGE - 1}")
+    return None
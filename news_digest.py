@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import IO, Dict, FrozenSet, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from metrics import record_cache, start_shared, wait_shared
+from page_cache import normalize_url
+from search_cache import SEARCH_CACHE_PATH, get_search_cache
+from search_providers import SearchHit, hedged_search
+
+# A digest older than REFRESH_SECONDS is still served but rebuilt in the
+# background; past MAX_AGE_SECONDS a tool call waits for a fresh one.
+REFRESH_SECONDS = float(os.getenv("NEWS_REFRESH_SECONDS", "600"))
+MAX_AGE_SECONDS = float(os.getenv("NEWS_MAX_AGE_SECONDS", "1800"))
+REFRESH_STAGGER_SECONDS = 2.0
+# How often a process without the refresher lock checks whether it is free,
+# so the refresher moves to another job when its conversation ends.
+LOCK_RETRY_SECONDS = 60.0
+
+# Locations whose local news the host's refresher keeps warm; others get a
+# digest when a user asks, up to MAX_EXTRA_LOCATIONS at a time.
+DEFAULT_LOCATIONS = [loc.strip() for loc in os.getenv("NEWS_LOCATIONS", "United States,Bangladesh").split(",")
+                     if loc.strip()]
+MAX_EXTRA_LOCATIONS = 8
+
+MAX_STORIES = 8
+# Two headlines sharing this fraction of their words are treated as one story.
+SAME_STORY_OVERLAP = 0.6
+
+# Each digest merges several searches ("sources"); the same story found by
+# more than one of them is kept once.
+NEWS_OUTLETS = "site:bbc.com OR site:reuters.com OR site:apnews.com OR site:cnn.com"
+CATEGORY_QUERIES: Dict[str, List[str]] = {
+    "general": ["top news headlines today current events", f"top headlines today {NEWS_OUTLETS}"],
+    "health": ["health news medical breakthroughs elderly seniors today", f"health news today {NEWS_OUTLETS}"],
+    "technology": ["technology news simple easy seniors elderly friendly", f"technology news today {NEWS_OUTLETS}"],
+    "world": ["world news international headlines today", f"world news today {NEWS_OUTLETS}"],
+}
+LOCAL_QUERIES = ["{location} local news today headlines", "{location} news today"]
+
+
+@dataclass
+class Story:
+    title: str
+    url: str
+    snippet: str
+    source: str  # host the story came from
+    words: FrozenSet[str] = field(default_factory=frozenset, repr=False)
+
+
+@dataclass
+class Digest:
+    key: str
+    stories: List[Story]
+    refreshed_at: float
+
+    def render(self) -> str:
+        lines = []
+        for story in self.stories:
+            line = f"• {story.title or story.source} ({story.source})"
+            lines.append(f"{line}: {story.snippet}" if story.snippet else line)
+        return "\n".join(lines)
+
+
+def _title_words(title: str) -> FrozenSet[str]:
+    return frozenset(word for word in re.findall(r"\w+", title.lower()) if len(word) > 2)
+
+
+def merge_stories(results: Sequence[Sequence[SearchHit]], limit: int = MAX_STORIES) -> List[Story]:
+    """
+    Interleave hits from several searches, dropping repeats of the same story.
+
+    A repeat is the same normalized URL, or a headline sharing most of its
+    words with one already kept (the same wire story on two sites).
+    """
+    stories: List[Story] = []
+    seen_urls = set()
+    longest = max((len(hits) for hits in results), default=0)
+    for rank in range(longest):
+        for hits in results:
+            if rank >= len(hits) or len(stories) >= limit:
+                continue
+            hit = hits[rank]
+            url = normalize_url(hit.url) if hit.url else ""
+            words = _title_words(hit.title or hit.snippet[:120])
+            if url and url in seen_urls:
+                continue
+            if words and any(story.words and len(words & story.words) / len(words | story.words) >= SAME_STORY_OVERLAP
+                             for story in stories):
+                continue
+            seen_urls.add(url)
+            source = urlsplit(hit.url).netloc.lower().removeprefix("www.") if hit.url else ""
+            stories.append(Story(hit.title, hit.url, hit.snippet, source, words))
+    return stories
+
+
+async def build_digest(key: str, queries: Sequence[str], tool_name: str = "news_digest") -> Digest:
+    """Run a digest's searches concurrently and merge them; fails only if every search failed."""
+    results = await asyncio.gather(*(hedged_search(query, tool_name=tool_name) for query in queries),
+                                   return_exceptions=True)
+    hit_lists = []
+    for query, result in zip(queries, results):
+        if isinstance(result, BaseException):
+            logging.warning(f"News search '{query}' failed: {result}")
+        else:
+            hit_lists.append(result.hits)
+    if not hit_lists:
+        raise next(r for r in results if isinstance(r, BaseException))
+    return Digest(key, merge_stories(hit_lists), time.time())
+
+
+def _digest_key(category: str, location: Optional[str] = None) -> str:
+    if category == "local":
+        return f"local:{' '.join((location or '').lower().split())}"
+    return category if category in CATEGORY_QUERIES else "general"
+
+
+def _to_json(digest: Digest) -> str:
+    return json.dumps({"refreshed_at": digest.refreshed_at,
+                       "stories": [[s.title, s.url, s.snippet, s.source] for s in digest.stories]})
+
+
+def _from_json(key: str, value: str) -> Optional[Digest]:
+    try:
+        data = json.loads(value)
+        stories = [Story(title, url, snippet, source, _title_words(title or snippet[:120]))
+                   for title, url, snippet, source in data["stories"]]
+        return Digest(key, stories, float(data["refreshed_at"]))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class NewsDigests:
+    """
+    Per-category and per-location news digests, built on first request.
+
+    Tool calls are served from memory; a digest is built when first asked
+    for, rebuilt in the background once it is older than REFRESH_SECONDS, and
+    concurrent requests for it share one build. Built digests are also
+    written to the search cache, which is shared on disk by default
+    (SEARCH_CACHE_PATH): one running process per host keeps the default
+    digests warm there and every other process reads them instead of
+    searching.
+    """
+
+    def __init__(self):
+        self._digests: Dict[str, Digest] = {}
+        self._queries: Dict[str, List[str]] = {key: list(queries) for key, queries in CATEGORY_QUERIES.items()}
+        self._default_keys = set(self._queries)
+        self._extra_locations: Dict[str, float] = {}  # key -> when last requested
+        self._building: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file: Optional[IO[str]] = None
+        for location in DEFAULT_LOCATIONS:
+            self._default_keys.add(self._add_location(location))
+
+    def _add_location(self, location: str) -> str:
+        key = _digest_key("local", location)
+        if key not in self._queries:
+            self._queries[key] = [query.format(location=location) for query in LOCAL_QUERIES]
+        return key
+
+    def _watch_location(self, location: str) -> str:
+        key = self._add_location(location)
+        if key not in self._default_keys:
+            if key not in self._extra_locations and len(self._extra_locations) >= MAX_EXTRA_LOCATIONS:
+                self._forget(min(self._extra_locations, key=self._extra_locations.get))
+            self._extra_locations[key] = time.time()
+        return key
+
+    def _forget(self, key: str) -> None:
+        self._extra_locations.pop(key, None)
+        self._queries.pop(key, None)
+        self._digests.pop(key, None)
+
+    def start(self) -> None:
+        """
+        Keep the default digests warm while this process is the host's refresher.
+
+        Every job process competes for the refresher lock next to the shared
+        SEARCH_CACHE_PATH and the holder refreshes; when its conversation
+        ends another running job takes over. With SEARCH_CACHE_PATH set to ""
+        every job process would search for every digest, so digests are then
+        only built on request. Safe to call more than once.
+        """
+        if not SEARCH_CACHE_PATH or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if self._lock_file is None:
+                self._lock_file = _refresher_lock()
+                if self._lock_file is None:
+                    await asyncio.sleep(LOCK_RETRY_SECONDS)
+                    continue
+                logging.info("This process keeps the shared news digests warm")
+            started = time.time()
+            for key in sorted(self._default_keys):
+                try:
+                    await self._build(key, force=True)
+                except Exception as e:
+                    logging.warning(f"Could not refresh news digest {key}: {e}")
+                # Spread the searches out so a refresh never crowds out live tool calls
+                await asyncio.sleep(REFRESH_STAGGER_SECONDS)
+            # A little ahead of REFRESH_SECONDS, so other processes always find a shared copy young enough to use
+            await asyncio.sleep(max(0.0, 0.8 * REFRESH_SECONDS - (time.time() - started)))
+
+    def _build(self, key: str, force: bool = False) -> "asyncio.Task[Digest]":
+        task = self._building.get(key)
+        if task is None:
+            task = start_shared(self._refresh(key, force))
+            self._building[key] = task
+
+            def _done(finished: asyncio.Task) -> None:
+                self._building.pop(key, None)
+                if finished.cancelled():
+                    return
+                if finished.exception() is not None:
+                    logging.warning(f"Building news digest {key} failed: {finished.exception()}")
+                elif key in self._queries:
+                    self._digests[key] = finished.result()
+
+            task.add_done_callback(_done)
+        return task
+
+    async def _refresh(self, key: str, force: bool = False) -> Digest:
+        """Use another process's copy if it is recent enough, else search; force always searches."""
+        cache = get_search_cache()
+        if not force:
+            stored = cache.get_stale(f"news digest {key}")
+            shared = _from_json(key, stored) if stored else None
+            if shared is not None and time.time() - shared.refreshed_at < REFRESH_SECONDS:
+                return shared
+        queries = self._queries.get(key)
+        if queries is None:
+            raise RuntimeError(f"news digest {key} is no longer tracked")
+        digest = await build_digest(key, queries)
+        if digest.stories:
+            cache.put(f"news digest {key}", _to_json(digest))
+        return digest
+
+    async def get(self, tool_name: str, category: str, location: Optional[str] = None) -> Digest:
+        key = self._watch_location(location or "") if category == "local" else _digest_key(category)
+        digest = self._digests.get(key)
+        age = time.time() - digest.refreshed_at if digest is not None else None
+        if age is not None and age <= MAX_AGE_SECONDS:
+            record_cache(tool_name, "news_digest", True)
+            if age > REFRESH_SECONDS:
+                self._build(key)  # for the next caller; this one gets the current digest
+            return digest
+        record_cache(tool_name, "news_digest", False)
+        return await wait_shared(self._build(key))
+
+    def digest_count(self) -> int:
+        return len(self._digests)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._building.values()):
+            task.cancel()
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the refresher lock
+            self._lock_file = None
+
+
+def _refresher_lock() -> Optional[IO[str]]:
+    """Take the host-wide refresher lock next to the shared search cache; None if another process has it."""
+    try:
+        import fcntl
+    except ImportError:
+        return None  # no flock on this platform; digests are built on request only
+    lock_file = open(f"{SEARCH_CACHE_PATH}.news-refresher.lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+_digests: Optional[NewsDigests] = None
+
+
+def get_news_digests() -> NewsDigests:
+    """Return the process-wide news digests."""
+    global _digests
+    if _digests is None:
+        _digests = NewsDigests()
+    return _digests
+
+
+async def close_news_digests() -> None:
+    if _digests is not None:
+        await _digests.close()
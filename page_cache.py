@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from html_extract import PageContent
+from metrics import record_cache, start_shared, wait_shared
+from page_fetch import fetch_page
+
+# Within this window a cached page is served without touching the network;
+# after it, the page is revalidated with a conditional GET.
+FRESH_SECONDS = float(os.getenv("PAGE_CACHE_FRESH_SECONDS", "300"))
+# Entries are dropped entirely after this, even if the server still answers 304.
+MAX_AGE_SECONDS = float(os.getenv("PAGE_CACHE_MAX_AGE_SECONDS", str(6 * 60 * 60)))
+
+# Query parameters that only track where a click came from.
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref_src"}
+
+
+@dataclass
+class CachedPage:
+    url: str  # after redirects
+    page: PageContent
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float  # time of the last fetch or successful revalidation
+    fetched_at: float  # time the body was last downloaded
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class PageCacheStats:
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+def with_scheme(url: str) -> str:
+    """The URL as given, with https:// added when it has no scheme."""
+    url = url.strip()
+    if not url.lower().startswith(("http://", "https://")):
+        url = "https://" + url
+    return url
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for cache keys: lowercase scheme and host, no fragment or tracking parameters."""
+    parts = urlsplit(with_scheme(url))
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "https" and parts.port == 443) or (scheme == "http" and parts.port == 80)):
+        host = f"{host}:{parts.port}"
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ])
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class PageCache:
+    """
+    LRU cache of extracted pages keyed by normalized URL.
+
+    Holds the parsed PageContent, not the HTML, so every view a tool can give
+    (summary, full text, headlines, links, article in any reading level) is
+    rendered from one fetch. Fresh entries cost no network and no parsing;
+    older ones are revalidated with If-None-Match / If-Modified-Since.
+
+    The normalized URL is only the key: requests go to the URL as the user
+    gave it, and concurrent misses for one key share a single download.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.stats = PageCacheStats()
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._fetching: Dict[str, "asyncio.Task[Tuple[CachedPage, bool]]"] = {}
+
+    async def get_page(self, tool_name: str, url: str) -> CachedPage:
+        key = normalize_url(url)
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and now - entry.fetched_at > MAX_AGE_SECONDS:
+            entry = None
+
+        if entry is not None and now - entry.stored_at <= FRESH_SECONDS:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            record_cache(tool_name, "page", True)
+            return entry
+
+        task = self._fetching.get(key)
+        if task is None:
+            task = start_shared(self._load(key, with_scheme(url), entry))
+            self._fetching[key] = task
+
+            def _done(finished: "asyncio.Task[Tuple[CachedPage, bool]]") -> None:
+                self._fetching.pop(key, None)
+                if not finished.cancelled():
+                    finished.exception()  # retrieved here in case every caller gave up
+
+            task.add_done_callback(_done)
+        page, revalidated = await wait_shared(task)
+        record_cache(tool_name, "page", revalidated)
+        return page
+
+    async def _load(self, key: str, url: str, entry: Optional[CachedPage]) -> Tuple[CachedPage, bool]:
+        """Revalidate or download a page and store it; returns (entry, revalidated)."""
+        validators = entry.validators() if entry is not None else {}
+        fetched = await fetch_page(url, headers=validators or None)
+        if fetched.not_modified and entry is not None:
+            entry.stored_at = time.time()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stats.revalidated += 1
+            logging.info(f"Page {key} not modified, reusing cached copy")
+            return entry, True
+
+        self.stats.misses += 1
+        now = time.time()
+        entry = CachedPage(fetched.url, fetched.page, fetched.etag, fetched.last_modified, now, now)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        return entry, False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    """Return the process-wide page cache, configured from the environment."""
+    global _cache
+    if _cache is None:
+        _cache = PageCache(max_entries=int(os.getenv("PAGE_CACHE_SIZE", "64")))
+    return _cache
@@ -0,0 +1,117 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from executor import run_blocking
+from html_extract import PageContent, PageExtractor
+from http_client import stream
+from metrics import network_time
+
+# Most articles fit in a few hundred KB of HTML; beyond this the download stops
+# and whatever has been parsed so far is used.
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", str(2 * 1024 * 1024)))
+CHUNK_BYTES = 64 * 1024
+
+# The tools show at most 2500 characters, so ~10x that in readable text is
+# plenty for every view (summary, full, headlines, links, article).
+ENOUGH_TEXT_CHARS = int(os.getenv("PAGE_ENOUGH_TEXT_CHARS", "25000"))
+
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+# Servers often send these for HTML they did not bother to label; sniff the body instead.
+AMBIGUOUS_CONTENT_TYPES = {"", "application/octet-stream", "binary/octet-stream", "text/octet-stream"}
+SNIFF_BYTES = 1024
+HTML_MARKERS = (b"<!doctype html", b"<html", b"<head", b"<body", b"<title", b"<p", b"<div")
+
+
+class UnsupportedContent(Exception):
+    """The URL points at something other than a web page (PDF, image, archive, ...)."""
+
+    def __init__(self, content_type: str):
+        super().__init__(f"unsupported content type: {content_type or 'unknown'}")
+        self.content_type = content_type
+
+
+@dataclass
+class FetchedPage:
+    url: str  # after redirects
+    status_code: int
+    content_type: str
+    page: Optional[PageContent]  # None for a 304 Not Modified
+    bytes_read: int
+    truncated: bool  # stopped before the end of the body
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+def _media_type(header: str) -> str:
+    return header.split(";", 1)[0].strip().lower()
+
+
+def looks_like_html(head: bytes) -> bool:
+    """Guess from the first bytes of a body whether it is HTML."""
+    sample = head[:SNIFF_BYTES]
+    if b"\x00" in sample:
+        return False
+    sample = sample.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    return any(marker in sample for marker in HTML_MARKERS)
+
+
+async def fetch_page(url: str, max_bytes: int = MAX_PAGE_BYTES, enough_chars: int = ENOUGH_TEXT_CHARS,
+                     headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+    """
+    Stream a page and parse it as it arrives, stopping early when possible.
+
+    Non-HTML responses raise UnsupportedContent before the body is read. The
+    download ends after max_bytes, or as soon as enough_chars of readable text
+    have been collected, so memory stays bounded by one chunk plus the
+    extractor's capped output however large the page is.
+
+    headers can carry conditional-request validators; a 304 answer comes back
+    with page set to None.
+    """
+    async with stream("GET", url, headers=headers) as response:
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if response.status_code == 304:
+            return FetchedPage(str(response.url), 304, "", None, 0, False, etag, last_modified)
+        response.raise_for_status()
+        content_type = _media_type(response.headers.get("content-type", ""))
+        if content_type not in HTML_CONTENT_TYPES and content_type not in AMBIGUOUS_CONTENT_TYPES:
+            raise UnsupportedContent(content_type)
+
+        final_url = str(response.url)
+        extractor = PageExtractor(final_url, response.charset_encoding)
+        chunks = response.aiter_bytes(CHUNK_BYTES)
+        bytes_read = 0
+        truncated = False
+        sniffed = content_type in HTML_CONTENT_TYPES
+
+        while True:
+            with network_time():
+                chunk: Optional[bytes] = await anext(chunks, None)
+            if chunk is None:
+                break
+            if not sniffed:
+                if not looks_like_html(chunk):
+                    raise UnsupportedContent(content_type)
+                sniffed = True
+            if bytes_read + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - bytes_read]
+                truncated = True
+            bytes_read += len(chunk)
+            await run_blocking("html_parse", extractor.feed, chunk)
+            if truncated or extractor.collected_chars >= enough_chars:
+                truncated = True
+                break
+
+        page = await run_blocking("html_parse", extractor.close)
+
+    if truncated:
+        logging.info(f"Stopped reading {final_url} after {bytes_read} bytes")
+    return FetchedPage(final_url, response.status_code, content_type, page, bytes_read, truncated, etag, last_modified)
+
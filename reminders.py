@@ -0,0 +1,316 @@
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from executor import run_blocking
+
+REMINDER_DB_PATH = os.getenv("REMINDER_DB_PATH", "reminders.sqlite3")
+DEFAULT_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "Asia/Dhaka")
+
+# A dose found this late (worker down, user away) is skipped rather than
+# announced, so nobody is prompted to take two doses close together.
+MISSED_DOSE_GRACE_SECONDS = 60 * 60
+
+# Heap entry kinds.
+ONE_OFF = 0
+RECURRING = 1
+
+
+@dataclass
+class RecurrenceRule:
+    """
+    Daily doses at a fixed interval, in local wall-clock time.
+
+    Stored as one row; occurrences are computed on demand by next_after().
+    """
+    first_minute: int  # minutes after local midnight of the first dose
+    interval_minutes: int
+    doses_per_day: int
+    timezone: str
+    start_date: str  # ISO date of the first day
+    days: Optional[int] = None  # None means until cancelled
+
+    def dose_times(self) -> List[str]:
+        base = datetime(2000, 1, 1)
+        return [
+            (base + timedelta(minutes=self.first_minute + k * self.interval_minutes)).strftime("%I:%M %p")
+            for k in range(self.doses_per_day)
+        ]
+
+    def next_after(self, after_ts: float) -> Optional[float]:
+        """Return the first occurrence strictly after after_ts, or None when the schedule has ended."""
+        tz = ZoneInfo(self.timezone)
+        start = date.fromisoformat(self.start_date)
+        day = max(datetime.fromtimestamp(after_ts, tz).date(), start)
+        # Late doses of the previous day can fall after midnight.
+        for offset in (-1, 0, 1):
+            current = day + timedelta(days=offset)
+            if current < start:
+                continue
+            if self.days is not None and (current - start).days >= self.days:
+                return None
+            midnight = datetime(current.year, current.month, current.day, tzinfo=tz)
+            for k in range(self.doses_per_day):
+                occurrence = midnight + timedelta(minutes=self.first_minute + k * self.interval_minutes)
+                if occurrence.timestamp() > after_ts:
+                    return occurrence.timestamp()
+        return None
+
+
+class ReminderStore:
+    """SQLite table of reminders; the text lives here, not in memory."""
+
+    def __init__(self, path: str = REMINDER_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY,
+                room TEXT NOT NULL,
+                text TEXT NOT NULL,
+                due_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                delivered_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS reminders_pending ON reminders (room, status, due_at);
+            CREATE TABLE IF NOT EXISTS schedules (
+                id INTEGER PRIMARY KEY,
+                room TEXT NOT NULL,
+                text TEXT NOT NULL,
+                first_minute INTEGER NOT NULL,
+                interval_minutes INTEGER NOT NULL,
+                doses_per_day INTEGER NOT NULL,
+                timezone TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                days INTEGER,
+                next_due REAL,
+                status TEXT NOT NULL DEFAULT 'active',
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS schedules_active ON schedules (room, status);
+        """)
+        self._conn.commit()
+
+    def add(self, room: str, text: str, due_at: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO reminders (room, text, due_at, created_at) VALUES (?, ?, ?, ?)",
+                (room, text, due_at, time.time()),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def pending(self, room: str) -> List[Tuple[float, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT due_at, id FROM reminders WHERE room = ? AND status = 'pending'", (room,)
+            ).fetchall()
+
+    def claim(self, reminder_id: int) -> Optional[str]:
+        """Mark a reminder delivered and return its text, or None if another worker got it first."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE reminders SET status = 'delivered', delivered_at = ? "
+                "WHERE id = ? AND status = 'pending'", (time.time(), reminder_id),
+            )
+            self._conn.commit()
+            if not cursor.rowcount:
+                return None
+            row = self._conn.execute("SELECT text FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+            return row[0] if row else None
+
+    def add_schedule(self, room: str, text: str, rule: RecurrenceRule) -> Tuple[int, Optional[float]]:
+        next_due = rule.next_after(time.time())
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO schedules (room, text, first_minute, interval_minutes, doses_per_day, "
+                "timezone, start_date, days, next_due, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (room, text, rule.first_minute, rule.interval_minutes, rule.doses_per_day,
+                 rule.timezone, rule.start_date, rule.days, next_due,
+                 'active' if next_due is not None else 'ended', time.time()),
+            )
+            self._conn.commit()
+            return cursor.lastrowid, next_due
+
+    def active_schedules(self, room: str) -> List[Tuple[float, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT next_due, id FROM schedules WHERE room = ? AND status = 'active'", (room,)
+            ).fetchall()
+
+    def claim_occurrence(self, schedule_id: int, due_at: float, skip_until: float) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Advance a schedule past the occurrence at due_at.
+
+        Returns (text, next due time) if this caller advanced it, or None if the
+        occurrence was already handled elsewhere. The next occurrence is the
+        first one after skip_until, so missed doses are not replayed.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, first_minute, interval_minutes, doses_per_day, timezone, start_date, days "
+                "FROM schedules WHERE id = ? AND status = 'active' AND next_due = ?",
+                (schedule_id, due_at),
+            ).fetchone()
+            if row is None:
+                return None
+            text, *fields = row
+            next_due = RecurrenceRule(*fields).next_after(max(due_at, skip_until))
+            cursor = self._conn.execute(
+                "UPDATE schedules SET next_due = ?, status = ? WHERE id = ? AND next_due = ?",
+                (next_due, 'active' if next_due is not None else 'ended', schedule_id, due_at),
+            )
+            self._conn.commit()
+            return (text, next_due) if cursor.rowcount else None
+
+    def release(self, reminder_id: int) -> None:
+        """Put a claimed reminder back to pending after a failed delivery."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reminders SET status = 'pending', delivered_at = NULL WHERE id = ?", (reminder_id,))
+            self._conn.commit()
+
+
+class ReminderScheduler:
+    """
+    Heap-based dispatcher that wakes once for the next due reminder.
+
+    The heap holds only (due time, kind, id, room) per pending reminder, and
+    one entry per recurring schedule for its next occurrence. Reminders are
+    dispatched for rooms with an attached session in this process; those for
+    rooms nobody is in stay pending in the store and are delivered when the
+    user's room is attached again.
+    """
+
+    def __init__(self, store: ReminderStore):
+        self.store = store
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._sessions: Dict[str, Any] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def room_for(self, session: Any) -> Optional[str]:
+        for room, attached in self._sessions.items():
+            if attached is session:
+                return room
+        return None
+
+    async def attach(self, room: str, session: Any) -> None:
+        """Start delivering a room's reminders into its session, including any still pending."""
+        self._sessions[room] = session
+        for due_at, reminder_id in await run_blocking("reminders", self.store.pending, room):
+            self._push(due_at, ONE_OFF, reminder_id, room)
+        for due_at, schedule_id in await run_blocking("reminders", self.store.active_schedules, room):
+            self._push(due_at, RECURRING, schedule_id, room)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def detach(self, room: str) -> None:
+        self._sessions.pop(room, None)
+        # Entries for the room are dropped lazily when they reach the top of the heap.
+
+    async def schedule(self, room: str, text: str, due_at: float) -> int:
+        reminder_id = await run_blocking("reminders", self.store.add, room, text, due_at)
+        if room in self._sessions:
+            self._push(due_at, ONE_OFF, reminder_id, room)
+        return reminder_id
+
+    async def schedule_recurring(self, room: str, text: str, rule: RecurrenceRule) -> Tuple[int, Optional[float]]:
+        """Store a recurring schedule; returns its id and first due time."""
+        schedule_id, next_due = await run_blocking("reminders", self.store.add_schedule, room, text, rule)
+        if next_due is not None and room in self._sessions:
+            self._push(next_due, RECURRING, schedule_id, room)
+        return schedule_id, next_due
+
+    def _push(self, due_at: float, kind: int, item_id: int, room: str) -> None:
+        wake = not self._heap or due_at < self._heap[0][0]
+        heapq.heappush(self._heap, (due_at, kind, item_id, room))
+        if wake:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due_at, kind, item_id, room = self._heap[0]
+            delay = due_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            try:
+                if kind == RECURRING:
+                    await self._deliver_occurrence(item_id, due_at, room)
+                else:
+                    await self._deliver(item_id, room)
+            except Exception as e:
+                logging.error(f"Error delivering reminder {item_id}: {e}")
+
+    async def _deliver_occurrence(self, schedule_id: int, due_at: float, room: str) -> None:
+        session = self._sessions.get(room)
+        if session is None:
+            return
+        now = time.time()
+        claimed = await run_blocking("reminders", self.store.claim_occurrence, schedule_id, due_at, now)
+        if claimed is None:
+            return
+        text, next_due = claimed
+        if next_due is not None:
+            self._push(next_due, RECURRING, schedule_id, room)
+        if now - due_at > MISSED_DOSE_GRACE_SECONDS:
+            logging.info(f"Skipped missed occurrence of schedule {schedule_id} in room {room}")
+            return
+        session.generate_reply(instructions=f"Interrupt politely and remind the user now: {text}")
+        logging.info(f"Schedule {schedule_id} occurrence delivered to room {room}")
+
+    async def _deliver(self, reminder_id: int, room: str) -> None:
+        session = self._sessions.get(room)
+        if session is None:
+            return
+        text = await run_blocking("reminders", self.store.claim, reminder_id)
+        if text is None:
+            return
+        try:
+            session.generate_reply(
+                instructions=f"Interrupt politely and remind the user now: {text}")
+            logging.info(f"Reminder {reminder_id} delivered to room {room}")
+        except Exception:
+            await run_blocking("reminders", self.store.release, reminder_id)
+            raise
+
+    def pending_count(self) -> int:
+        return len(self._heap)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._sessions.clear()
+        self._heap.clear()
+
+
+_scheduler: Optional[ReminderScheduler] = None
+
+
+def get_scheduler() -> ReminderScheduler:
+    """Return the process-wide reminder scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(ReminderStore())
+    return _scheduler
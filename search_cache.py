@@ -0,0 +1,185 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from metrics import record_cache
+
+DEFAULT_TTL_SECONDS = 15 * 60
+
+# SQLite file shared by every job process on the host, so results (and the
+# news digests) survive restarts and are searched for once per host. Set it
+# to an empty string to keep the cache in memory only.
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3")
+
+# How long a cached result stays fresh for each tool. News goes stale in
+# minutes; how to reset a phone or where the pharmacy is does not.
+TOOL_TTLS: Dict[str, float] = {
+    "get_news_summary": 10 * 60,
+    "search_google_news": 10 * 60,
+    "search_web": 30 * 60,
+    "search_google": 30 * 60,
+    "answer_complex_question": 60 * 60,
+    "get_factual_information": 6 * 60 * 60,
+    "check_health_symptoms": 6 * 60 * 60,
+    "find_local_services": 6 * 60 * 60,
+    "help_with_technology": 12 * 60 * 60,
+    "convert_units": 24 * 60 * 60,
+}
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters, overall and per tool."""
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    disk_hits: int = 0
+    per_tool: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def count(self, tool_name: str, outcome: str) -> None:
+        tool = self.per_tool.setdefault(tool_name, {"hits": 0, "misses": 0})
+        tool[outcome] = tool.get(outcome, 0) + 1
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, trim punctuation and collapse whitespace so repeats share an entry."""
+    query = query.lower().strip().strip("?!.,;:")
+    return re.sub(r"\s+", " ", query)
+
+
+class _DiskStore:
+    """SQLite-backed store so cached results survive worker restarts."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, value: str, stored_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, stored_at),
+            )
+            self._conn.commit()
+
+    def prune(self, older_than: float) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache WHERE stored_at < ?", (older_than,))
+            self._conn.commit()
+
+
+class SearchCache:
+    """
+    Size-bounded LRU cache of search results keyed by normalized query.
+
+    Entries remember when they were stored; freshness is decided per tool at
+    read time, so one result can be fresh for tech help and stale for news.
+    """
+
+    def __init__(self, max_entries: int = 512, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._disk: Optional[_DiskStore] = None
+        if disk_path:
+            try:
+                self._disk = _DiskStore(disk_path)
+                self._disk.prune(time.time() - max(TOOL_TTLS.values()))
+            except sqlite3.Error as e:
+                logging.error(f"Could not open search cache at {disk_path}: {e}")
+
+    def get(self, tool_name: str, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        ttl = TOOL_TTLS.get(tool_name, DEFAULT_TTL_SECONDS)
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[1] > ttl:
+            entry = self._newest(key, entry)
+
+        if entry is not None:
+            value, stored_at = entry
+            if time.time() - stored_at <= ttl:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                self.stats.count(tool_name, "hits")
+                record_cache(tool_name, "search", True)
+                return value
+            self.stats.expired += 1
+
+        self.stats.misses += 1
+        self.stats.count(tool_name, "misses")
+        record_cache(tool_name, "search", False)
+        return None
+
+    def get_stale(self, query: str) -> Optional[str]:
+        """Return the stored result for a query however old it is, for when a fresh search fails."""
+        key = normalize_query(query)
+        entry = self._newest(key, self._entries.get(key))
+        return entry[0] if entry is not None else None
+
+    def _newest(self, key: str, entry: Optional[Tuple[str, float]]) -> Optional[Tuple[str, float]]:
+        # Another process sharing the disk store may have stored a newer result since this one last looked
+        if self._disk is None:
+            return entry
+        stored = self._disk.get(key)
+        if stored is None or (entry is not None and stored[1] <= entry[1]):
+            return entry
+        self.stats.disk_hits += 1
+        self._store(key, stored)
+        return stored
+
+    def put(self, query: str, value: str) -> None:
+        if not value or not value.strip():
+            return
+        key = normalize_query(query)
+        entry = (value, time.time())
+        self._store(key, entry)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, entry[0], entry[1])
+            except sqlite3.Error as e:
+                logging.warning(f"Could not persist search cache entry: {e}")
+
+    def _store(self, key: str, entry: Tuple[str, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache, configured from the environment."""
+    global _cache
+    if _cache is None:
+        _cache = SearchCache(
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+            disk_path=SEARCH_CACHE_PATH or None,
+        )
+    return _cache
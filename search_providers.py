@@ -0,0 +1,330 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from executor import run_blocking
+from metrics import network_time, record_cache, record_provider, set_circuit_state, start_shared, wait_shared
+from search_cache import normalize_query
+
+# How long the first provider gets before the next one is asked as well.
+HEDGE_DELAY = float(os.getenv("SEARCH_HEDGE_DELAY_MS", "1500")) / 1000
+DEFAULT_NUM_RESULTS = 8
+
+# Consecutive failures that open a provider's circuit, and how long it stays
+# open before one trial request is let through. A rate limit opens it at once.
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = float(os.getenv("SEARCH_CIRCUIT_OPEN_SECONDS", "60"))
+MAX_OPEN_SECONDS = 10 * 60
+
+# A request may queue this long for its provider's rate limiter; past that the
+# provider is treated as busy and the hedge moves on to the next one.
+MAX_THROTTLE_WAIT = float(os.getenv("SEARCH_MAX_THROTTLE_WAIT_MS", "3000")) / 1000
+
+
+@dataclass
+class SearchHit:
+    title: str
+    url: str
+    snippet: str
+
+
+@dataclass
+class SearchOutcome:
+    provider: str
+    hits: List[SearchHit] = field(default_factory=list)
+
+    def text(self) -> str:
+        """Snippets joined into one passage, the shape DuckDuckGoSearchRun used to return."""
+        return " ".join(hit.snippet or hit.title or hit.url for hit in self.hits)
+
+
+class SearchProvider(ABC):
+    """
+    A blocking web search backend; search() runs on the executor under the provider's own limit.
+
+    rate_per_second and burst configure the token bucket that keeps this
+    process under the backend's rate limit.
+    """
+
+    name = "provider"
+    rate_per_second = 1.0
+    burst = 5
+
+    def __init__(self, rate_per_second: Optional[float] = None, burst: Optional[int] = None):
+        if rate_per_second is not None:
+            self.rate_per_second = rate_per_second
+        if burst is not None:
+            self.burst = burst
+
+    @abstractmethod
+    def search(self, query: str, num_results: int) -> List[SearchHit]:
+        """Return up to num_results hits; runs on an executor thread."""
+
+
+class DuckDuckGoProvider(SearchProvider):
+    name = "duckduckgo"
+
+    def __init__(self, rate_per_second: Optional[float] = None, burst: Optional[int] = None):
+        super().__init__(rate_per_second, burst)
+        self._wrapper = None
+
+    def search(self, query: str, num_results: int) -> List[SearchHit]:
+        if self._wrapper is None:
+            from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+            self._wrapper = DuckDuckGoSearchAPIWrapper()
+        results = self._wrapper.results(query, max_results=num_results)
+        return [SearchHit(r.get("title", ""), r.get("link", ""), r.get("snippet", "")) for r in results]
+
+
+class GoogleProvider(SearchProvider):
+    name = "google"
+    # Scraped result pages; Google starts answering 429 well before DuckDuckGo does
+    rate_per_second = 0.5
+    burst = 3
+
+    def search(self, query: str, num_results: int) -> List[SearchHit]:
+        from googlesearch import search
+
+        hits = []
+        for item in search(query, num_results=num_results, advanced=True):
+            # advanced results carry title and description; older versions yield bare URLs
+            hits.append(SearchHit(getattr(item, "title", "") or "", getattr(item, "url", item),
+                                  getattr(item, "description", "") or ""))
+            if len(hits) >= num_results:
+                break
+        return hits
+
+
+class Throttled(Exception):
+    """The provider's rate limiter has no token free within MAX_THROTTLE_WAIT."""
+
+
+class TokenBucket:
+    """Allows rate_per_second requests on average with bursts of up to burst; shared by the whole process."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token, returning how long to wait before using it.
+
+        Returns None, taking nothing, when the wait would exceed max_wait.
+        Tokens can go negative, which queues callers in arrival order.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "ratelimit" in text or "rate limit" in text or "too many requests" in text
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after repeated failures -> half-open trial after a cooldown.
+
+    Each time a trial fails the cooldown doubles, up to MAX_OPEN_SECONDS.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = OPEN_SECONDS
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    def allow(self) -> bool:
+        if self.open_until == 0.0:
+            return True
+        if self.is_open or self._trial_running:
+            return False
+        self._trial_running = True  # half-open: let one request test the provider
+        return True
+
+    def succeeded(self) -> None:
+        if self.open_until:
+            logging.info(f"Search provider {self.name} recovered")
+            set_circuit_state(self.name, False)
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = OPEN_SECONDS
+        self._trial_running = False
+
+    def failed(self, error: BaseException) -> None:
+        self.failures += 1
+        trial = self._trial_running
+        self._trial_running = False
+        if trial or self.failures >= FAILURE_THRESHOLD or _is_rate_limit(error):
+            if trial:
+                self.cooldown = min(self.cooldown * 2, MAX_OPEN_SECONDS)
+            self.open_until = time.monotonic() + self.cooldown
+            set_circuit_state(self.name, True)
+            logging.warning(f"Search provider {self.name} disabled for {self.cooldown:.0f}s after: {error}")
+
+    def released(self) -> None:
+        # A trial abandoned before it finished proves nothing either way
+        self._trial_running = False
+
+
+_providers: Dict[str, SearchProvider] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_buckets: Dict[str, TokenBucket] = {}
+_inflight: Dict[Tuple[str, Tuple[str, ...], int], "asyncio.Task[SearchOutcome]"] = {}
+
+
+def _module_available(name: str) -> bool:
+    # find_spec checks without importing; a module already loaded counts as available
+    try:
+        return name in sys.modules or importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _ensure_providers() -> None:
+    if not _providers:
+        providers: List[SearchProvider] = [DuckDuckGoProvider()]
+        if _module_available("googlesearch"):
+            providers.append(GoogleProvider())
+        else:
+            logging.info("googlesearch not installed, searches will use DuckDuckGo only")
+        use_providers(providers)
+
+
+def use_providers(providers: Sequence[SearchProvider]) -> None:
+    """Replace the registered providers, for example with local stand-ins."""
+    _providers.clear()
+    _breakers.clear()
+    _buckets.clear()
+    for provider in providers:
+        _providers[provider.name] = provider
+        _breakers[provider.name] = CircuitBreaker(provider.name)
+        _buckets[provider.name] = TokenBucket(provider.rate_per_second, provider.burst)
+
+
+async def _attempt(provider: SearchProvider, query: str, num_results: int) -> List[SearchHit]:
+    breaker = _breakers[provider.name]
+    delay = _buckets[provider.name].reserve(MAX_THROTTLE_WAIT)
+    if delay is None:
+        breaker.released()
+        record_provider(provider.name, "throttled")
+        raise Throttled(f"{provider.name} is at its request rate limit")
+    try:
+        if delay:
+            await asyncio.sleep(delay)
+        with network_time():
+            hits = await run_blocking(f"search:{provider.name}", provider.search, query, num_results)
+    except asyncio.CancelledError:
+        breaker.released()
+        raise
+    except Exception as e:
+        breaker.failed(e)
+        record_provider(provider.name, "error")
+        raise
+    breaker.succeeded()
+    record_provider(provider.name, "ok" if hits else "empty")
+    return hits
+
+
+async def hedged_search(query: str, order: Sequence[str] = ("duckduckgo", "google"),
+                        num_results: int = DEFAULT_NUM_RESULTS, hedge_delay: Optional[float] = None,
+                        tool_name: str = "") -> SearchOutcome:
+    """
+    Search with the first healthy provider in order, hedging with the next ones.
+
+    A provider gets hedge_delay seconds (or until it fails or comes back empty)
+    before the next one is started too; the first non-empty answer wins and the
+    rest are abandoned. Providers whose circuit is open are skipped. Raises the
+    last error only when every provider failed.
+
+    Concurrent calls for the same normalized query share one in-flight search.
+    """
+    key = (normalize_query(query), tuple(order), num_results)
+    task = _inflight.get(key)
+    if tool_name:
+        record_cache(tool_name, "search_inflight", task is not None)
+    if task is None:
+        task = start_shared(_hedged_search(query, order, num_results, hedge_delay))
+        _inflight[key] = task
+
+        def _done(finished: "asyncio.Task[SearchOutcome]") -> None:
+            if _inflight.get(key) is finished:
+                del _inflight[key]
+            if not finished.cancelled():
+                finished.exception()  # retrieved here in case every caller gave up
+
+        task.add_done_callback(_done)
+    return await wait_shared(task)
+
+
+async def _hedged_search(query: str, order: Sequence[str], num_results: int,
+                         hedge_delay: Optional[float]) -> SearchOutcome:
+    _ensure_providers()
+    hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+    waiting = [name for name in order if name in _providers]
+    running: Dict[asyncio.Task, str] = {}
+    last_error: Optional[BaseException] = None
+    empty: Optional[str] = None
+
+    def _launch_next() -> bool:
+        while waiting:
+            name = waiting.pop(0)
+            if _breakers[name].allow():
+                running[asyncio.ensure_future(_attempt(_providers[name], query, num_results))] = name
+                return True
+            record_provider(name, "skipped")
+        return False
+
+    try:
+        _launch_next()
+        while running:
+            done, _ = await asyncio.wait(running, timeout=hedge_delay if waiting else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                _launch_next()  # the running provider is slow: hedge
+                continue
+            for task in done:
+                name = running.pop(task)
+                if isinstance(task.exception(), Throttled):
+                    last_error = task.exception()
+                    logging.info(f"Search provider {name} is busy, trying the next one for '{query}'")
+                elif task.exception() is not None:
+                    last_error = task.exception()
+                    logging.warning(f"Search provider {name} failed for '{query}': {last_error}")
+                elif task.result():
+                    if name != order[0]:
+                        logging.info(f"Search for '{query}' answered by fallback provider {name}")
+                    return SearchOutcome(name, task.result())
+                else:
+                    empty = empty or name
+            if not running:
+                _launch_next()  # everything started so far failed or was empty
+    finally:
+        for task in running:
+            task.cancel()
+
+    if empty is not None:
+        return SearchOutcome(empty)
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError("all search providers are temporarily disabled")
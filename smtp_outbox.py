@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from executor import run_blocking
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+
+# Messages sent over one connection per delivery round.
+BATCH_SIZE = 10
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 300.0
+# Probe an idle session with NOOP before reuse; Gmail drops idle ones after a few minutes.
+PROBE_AFTER_SECONDS = 60.0
+# Delivery records kept for status lookups.
+STATUS_HISTORY = 200
+# How long shutdown waits for the queue to drain.
+DRAIN_TIMEOUT_SECONDS = 20.0
+# Mail still undelivered at shutdown is kept here and sent by the next process.
+OUTBOX_SPOOL_PATH = os.getenv("OUTBOX_SPOOL_PATH", "outbox.sqlite3")
+# How often a timed-out delivery round is checked for having finished.
+DELIVERY_POLL_SECONDS = 1.0
+
+
+@dataclass
+class OutgoingMail:
+    """One queued message and its delivery state."""
+    id: str
+    sender: str
+    recipients: List[str]
+    to_email: str
+    subject: str
+    payload: str = field(repr=False)
+    status: str = "queued"  # queued, sending, retrying, sent, failed
+    attempts: int = 0
+    error: str = ""
+    queued_at: float = field(default_factory=time.time)
+    sent_at: Optional[float] = None
+
+
+def _is_transient(error: Exception) -> bool:
+    """4xx replies and dropped connections are worth retrying; 5xx replies are not."""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class OutboxSpool:
+    """SQLite table of mail that was accepted but not delivered before its process shut down."""
+
+    def __init__(self, path: str = OUTBOX_SPOOL_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id TEXT PRIMARY KEY, account TEXT NOT NULL, sender TEXT NOT NULL, recipients TEXT NOT NULL, "
+            "to_email TEXT NOT NULL, subject TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, error TEXT NOT NULL, queued_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def save(self, account: str, mails: List[OutgoingMail]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(m.id, account, m.sender, json.dumps(m.recipients), m.to_email, m.subject, m.payload,
+                  m.attempts, m.error, m.queued_at) for m in mails],
+            )
+            self._conn.commit()
+
+    def accounts(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT account FROM pending")]
+
+    def take(self, account: str) -> List[OutgoingMail]:
+        """Remove and return the account's spooled mail, oldest first."""
+        with self._lock:
+            # Taken in one write transaction, so two processes starting together never both send it
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT id, sender, recipients, to_email, subject, payload, attempts, error, queued_at "
+                "FROM pending WHERE account = ? ORDER BY queued_at", (account,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM pending WHERE account = ?", (account,))
+            self._conn.commit()
+        return [
+            OutgoingMail(id=mail_id, sender=sender, recipients=json.loads(recipients), to_email=to_email,
+                         subject=subject, payload=payload, attempts=attempts, error=error, queued_at=queued_at)
+            for mail_id, sender, recipients, to_email, subject, payload, attempts, error, queued_at in rows
+        ]
+
+
+class SmtpOutbox:
+    """
+    Outbound mail queue for one account with a persistent authenticated SMTP session.
+
+    submit() returns once the message is queued. A single worker task drains
+    the queue in batches over the same connection and retries transient
+    failures with exponential backoff. Mail still undelivered when the outbox
+    closes is spooled to disk and resumed by the next outbox for the account.
+    """
+
+    def __init__(self, user: str, password: str):
+        self.user = user
+        self._password = password
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._queue: "asyncio.Queue[OutgoingMail]" = asyncio.Queue()
+        self._history: "OrderedDict[str, OutgoingMail]" = OrderedDict()
+        self._worker: Optional[asyncio.Task] = None
+        self._retries: Dict[asyncio.Task, OutgoingMail] = {}
+
+    async def submit(self, sender: str, recipients: List[str], to_email: str,
+                     subject: str, payload: str) -> OutgoingMail:
+        mail = OutgoingMail(id=uuid.uuid4().hex[:8], sender=sender, recipients=recipients,
+                            to_email=to_email, subject=subject, payload=payload)
+        await self._enqueue(mail)
+        return mail
+
+    async def resume(self, mails: List[OutgoingMail]) -> None:
+        """Queue mail spooled by an earlier process."""
+        for mail in mails:
+            mail.status = "queued"
+            await self._enqueue(mail)
+        if mails:
+            logging.info(f"Resumed {len(mails)} emails left undelivered by an earlier shutdown")
+
+    async def _enqueue(self, mail: OutgoingMail) -> None:
+        self._history[mail.id] = mail
+        while len(self._history) > STATUS_HISTORY:
+            self._history.popitem(last=False)
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        await self._queue.put(mail)
+
+    def status(self, mail_id: str) -> Optional[OutgoingMail]:
+        return self._history.get(mail_id)
+
+    def recent(self, limit: int = 5) -> List[OutgoingMail]:
+        return list(self._history.values())[-limit:][::-1]
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            finished = threading.Event()
+            error: Optional[Exception] = None
+            try:
+                await run_blocking("smtp_delivery", self._deliver_batch, batch, finished)
+            except asyncio.TimeoutError as e:
+                # The delivery thread is still running and may yet send the batch;
+                # requeueing now could send the same mail twice.
+                error = e
+                logging.error("SMTP delivery round timed out, waiting for it to finish before retrying")
+                while not finished.is_set():
+                    await asyncio.sleep(DELIVERY_POLL_SECONDS)
+            except Exception as e:
+                error = e
+                logging.error(f"SMTP delivery round failed: {e}")
+            if error is not None:
+                # Whatever the round did not settle is treated as transient.
+                self._drop_session()
+                for mail in batch:
+                    if mail.status in ("queued", "sending"):
+                        mail.status, mail.error = "retrying", str(error) or type(error).__name__
+
+            for mail in batch:
+                if mail.status == "retrying":
+                    self._schedule_retry(mail)
+                self._queue.task_done()
+
+    def _schedule_retry(self, mail: OutgoingMail) -> None:
+        if mail.attempts >= MAX_ATTEMPTS:
+            mail.status = "failed"
+            logging.error(f"Giving up on email {mail.id} to {mail.to_email}: {mail.error}")
+            return
+        delay = min(MAX_BACKOFF_SECONDS, 5 * 2 ** (mail.attempts - 1)) * random.uniform(0.8, 1.2)
+        logging.warning(f"Retrying email {mail.id} in {delay:.0f}s: {mail.error}")
+
+        async def _later() -> None:
+            await asyncio.sleep(delay)
+            await self._queue.put(mail)
+
+        task = asyncio.create_task(_later())
+        self._retries[task] = mail
+        task.add_done_callback(lambda finished: self._retries.pop(finished, None))
+
+    def _flush_retries(self) -> None:
+        """Queue mail waiting out a retry backoff right away."""
+        for task, mail in list(self._retries.items()):
+            task.cancel()
+            self._retries.pop(task, None)
+            if self._worker is None or self._worker.done():
+                self._worker = asyncio.create_task(self._run())
+            self._queue.put_nowait(mail)
+
+    def _session(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > PROBE_AFTER_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._drop_session()
+            except (smtplib.SMTPException, OSError):
+                self._drop_session()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20)
+            try:
+                if SMTP_STARTTLS:
+                    smtp.starttls()
+                smtp.login(self.user, self._password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            logging.info(f"Opened SMTP session for {self.user}")
+        self._last_used = time.monotonic()
+        return self._smtp
+
+    def _drop_session(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _deliver_batch(self, batch: List[OutgoingMail], finished: threading.Event) -> None:
+        try:
+            self._send_each(batch)
+        finally:
+            finished.set()
+
+    def _send_each(self, batch: List[OutgoingMail]) -> None:
+        for mail in batch:
+            mail.status = "sending"
+            mail.attempts += 1
+            for reconnect in (False, True):
+                try:
+                    self._session().sendmail(mail.sender, mail.recipients, mail.payload)
+                    mail.status, mail.error, mail.sent_at = "sent", "", time.time()
+                    logging.info(f"Email {mail.id} sent to {mail.to_email}")
+                    break
+                except smtplib.SMTPServerDisconnected as e:
+                    # A pooled session that went away gets one immediate reconnect.
+                    self._drop_session()
+                    if not reconnect:
+                        continue
+                    mail.status, mail.error = "retrying", str(e)
+                except Exception as e:
+                    if isinstance(e, (smtplib.SMTPAuthenticationError, OSError)):
+                        self._drop_session()
+                    mail.status = "retrying" if _is_transient(e) else "failed"
+                    mail.error = str(e)
+                    if mail.status == "failed":
+                        logging.error(f"Email {mail.id} to {mail.to_email} failed: {e}")
+                    break
+
+    async def close(self) -> None:
+        """
+        Give queued mail a last chance to go out, then close the session.
+
+        Mail waiting for a retry gets one attempt now instead of after its
+        backoff. What is still undelivered after that, or after
+        DRAIN_TIMEOUT_SECONDS, is spooled to disk for the next outbox.
+        """
+        self._flush_retries()
+        if self._worker is not None and not self._worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=DRAIN_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logging.warning(f"{self._queue.qsize()} emails still queued at shutdown")
+        if self._worker is not None:
+            self._worker.cancel()
+        for task in list(self._retries):
+            task.cancel()
+
+        pending = [mail for mail in self._history.values() if mail.status in ("queued", "retrying")]
+        if pending:
+            await run_blocking("smtp_delivery", get_spool().save, self.user, pending)
+            for mail in pending:
+                logging.error(f"Email {mail.id} to {mail.to_email} not delivered before shutdown, "
+                              f"spooled for the next session: {mail.error or 'not attempted yet'}")
+        sending = [mail for mail in self._history.values() if mail.status == "sending"]
+        for mail in sending:
+            logging.error(f"Email {mail.id} to {mail.to_email} was still being sent at shutdown "
+                          f"and may not have been delivered")
+        if sending:
+            return  # the delivery thread still holds the session and closes nothing else
+
+        def _quit() -> None:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception:
+                    pass
+                self._smtp = None
+
+        await run_blocking("smtp_delivery", _quit)
+
+
+_outboxes: Dict[str, SmtpOutbox] = {}
+_spool: Optional[OutboxSpool] = None
+
+
+def get_spool() -> OutboxSpool:
+    """Return the process-wide spool of undelivered mail."""
+    global _spool
+    if _spool is None:
+        _spool = OutboxSpool()
+    return _spool
+
+
+def get_outbox(user: str, password: str) -> SmtpOutbox:
+    """Return the worker-wide outbox for an account."""
+    outbox = _outboxes.get(user)
+    if outbox is None:
+        outbox = SmtpOutbox(user, password)
+        _outboxes[user] = outbox
+    return outbox
+
+
+async def open_outbox(user: str, password: str) -> SmtpOutbox:
+    """Return the account's outbox, first queueing any mail an earlier process spooled at shutdown."""
+    new = user not in _outboxes
+    outbox = get_outbox(user, password)
+    if new:
+        await outbox.resume(await run_blocking("smtp_delivery", get_spool().take, user))
+    return outbox
+
+
+async def resume_spooled() -> None:
+    """
+    Queue mail spooled by earlier processes, when a job starts.
+
+    Spooled mail then goes out even if the user never sends another email.
+    Only the configured account (GMAIL_USER) has its password here; mail
+    spooled for any other account stays in the spool.
+    """
+    if not os.path.exists(OUTBOX_SPOOL_PATH):
+        return
+    user, password = os.getenv("GMAIL_USER"), os.getenv("GMAIL_APP_PASSWORD")
+    for account in await run_blocking("smtp_delivery", get_spool().accounts):
+        if account == user and password:
+            await open_outbox(user, password)
+        else:
+            logging.warning(f"Mail spooled for {account} stays queued: no credentials for it in this process")
+
+
+def find_outgoing(mail_id: str) -> Optional[OutgoingMail]:
+    """Look up a message by reference across all accounts."""
+    for outbox in _outboxes.values():
+        mail = outbox.status(mail_id)
+        if mail is not None:
+            return mail
+    return None
+
+
+async def close_outboxes() -> None:
+    for outbox in list(_outboxes.values()):
+        await outbox.close()
+    _outboxes.clear()
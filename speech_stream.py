@@ -0,0 +1,91 @@
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+# Sentence ends we can safely hand to TTS; speaking whole sentences keeps the
+# prosody natural while still starting long before generation finishes.
+_SENTENCE_END = re.compile(r"(?<=[.!?:।])\s+|\n+")
+_CODE_FENCE = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+_MARKDOWN = re.compile(r"[*_#`>|]+")
+
+# Fragments shorter than this are held back until more text arrives.
+MIN_SPOKEN_CHARS = 40
+
+
+class StreamOutcome:
+    """Collected text of a streamed generation and when its first sentence was handed to TTS."""
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.first_sentence: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def speakable(text: str) -> str:
+    """Strip code blocks and markdown symbols that should not be read aloud."""
+    text = _CODE_FENCE.sub(" ", text)
+    return _MARKDOWN.sub("", text).strip()
+
+
+def _split_ready(buffer: str) -> Tuple[str, str]:
+    """Split off the longest prefix that ends on a sentence boundary outside a code block."""
+    for match in reversed(list(_SENTENCE_END.finditer(buffer))):
+        head = buffer[:match.start()]
+        if head.count("```") % 2 == 0:
+            return head, buffer[match.end():]
+    return "", buffer
+
+
+def session_can_speak(context: Any) -> bool:
+    """True when the tool's session has a TTS that session.say() can use (see agent.build_stream_tts)."""
+    session = getattr(context, "session", None)
+    return session is not None and getattr(session, "tts", None) is not None
+
+
+async def stream_to_session(context: Any, chunks: AsyncIterator[str],
+                            started: Optional[float] = None) -> StreamOutcome:
+    """
+    Forward streamed text to the AgentSession sentence by sentence while collecting it.
+
+    Speech runs alongside generation; this returns once generation is done,
+    without waiting for playout.
+    """
+    started = started if started is not None else time.perf_counter()
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    outcome = StreamOutcome()
+
+    async def _sentences() -> AsyncIterator[str]:
+        while True:
+            sentence = await queue.get()
+            if sentence is None:
+                return
+            yield sentence
+
+    def _speak(text: str) -> None:
+        spoken = speakable(text)
+        if not spoken:
+            return
+        if outcome.first_sentence is None:
+            outcome.first_sentence = time.perf_counter() - started
+        queue.put_nowait(spoken + " ")
+
+    context.session.say(_sentences(), add_to_chat_ctx=False)
+
+    buffer = ""
+    try:
+        async for chunk in chunks:
+            outcome.parts.append(chunk)
+            buffer += chunk
+            ready, rest = _split_ready(buffer)
+            if len(ready) >= MIN_SPOKEN_CHARS:
+                _speak(ready)
+                buffer = rest
+        _speak(buffer)
+    finally:
+        queue.put_nowait(None)
+    return outcome
+
@@ -0,0 +1,30 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Seconds spent in each timed import, in load order. Modules already loaded by
+# an earlier entry cost nothing again, so each figure is what that import added.
+IMPORT_TIMES: Dict[str, float] = {}
+_process_started = time.perf_counter()
+
+
+@contextmanager
+def import_timer(label: str) -> Iterator[None]:
+    """Time the imports inside the block and record them under label."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        IMPORT_TIMES[label] = IMPORT_TIMES.get(label, 0.0) + time.perf_counter() - started
+
+
+def log_startup_report(stage: str) -> None:
+    """Log the import breakdown so far, slowest first."""
+    total = sum(IMPORT_TIMES.values())
+    lines = [f"  {label:<28} {seconds * 1000:8.1f} ms"
+             for label, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: item[1], reverse=True)]
+    logging.info(
+        f"Startup ({stage}): {total * 1000:.1f} ms in imports, "
+        f"{(time.perf_counter() - _process_started) * 1000:.1f} ms since process start\n" + "\n".join(lines)
+    )
@@ -0,0 +1,80 @@
+import asyncio
+
+import weather
+from weather import WeatherCache, normalize_city, wttr_location
+
+
+def _payload(country: str, region: str = "") -> dict:
+    return {
+        "current_condition": [{"temp_C": "30", "FeelsLikeC": "34", "humidity": "70", "windspeedKmph": "9",
+                               "weatherDesc": [{"value": "Haze"}]}],
+        "nearest_area": [{"areaName": [{"value": "Dhaka"}], "country": [{"value": country}],
+                          "region": [{"value": region}]}],
+        "weather": [{"maxtempC": "33", "mintempC": "26", "hourly": []}],
+    }
+
+
+class _Response:
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self._payload
+
+
+def _serve(monkeypatch, countries: dict) -> list:
+    """Answer wttr.in requests from countries (location -> (country, region)) and record the URLs asked for."""
+    requested = []
+
+    async def fake_request(method, url, **kwargs):
+        requested.append(url)
+        location = url.split("wttr.in/", 1)[1].split("?", 1)[0]
+        return _Response(_payload(*countries[location]))
+
+    monkeypatch.setattr(weather, "http_request", fake_request)
+    return requested
+
+
+def test_city_spellings_share_one_entry(monkeypatch):
+    requested = _serve(monkeypatch, {"Dhaka": ("Bangladesh", "Dhaka"), "Dhaka,BD": ("Bangladesh", "Dhaka")})
+    cache = WeatherCache()
+
+    async def ask():
+        return [await cache.get("get_weather", city) for city in ("Dhaka", "dhaka ", "Dhaka, BD", "Dhaka, BD", "dhaka")]
+
+    reports = asyncio.run(ask())
+    assert normalize_city("Dhaka") == normalize_city("dhaka ") == normalize_city("Dhaka, BD") == "dhaka"
+    assert list(cache._entries) == ["dhaka/bangladesh"]
+    # the bare name is fetched once; the qualified name once more to learn where it resolves
+    assert requested == ["https://wttr.in/Dhaka?format=j1", "https://wttr.in/Dhaka,BD?format=j1"]
+    assert reports[-1] is reports[-2]
+
+
+def test_qualifier_naming_a_cached_country_is_not_fetched(monkeypatch):
+    requested = _serve(monkeypatch, {"Dhaka": ("Bangladesh", "Dhaka")})
+    cache = WeatherCache()
+
+    async def ask():
+        await cache.get("get_weather", "Dhaka")
+        await cache.get("get_weather", "Dhaka, Bangladesh")
+
+    asyncio.run(ask())
+    assert len(requested) == 1
+
+
+def test_qualified_city_stays_apart(monkeypatch):
+    requested = _serve(monkeypatch, {"Paris": ("France", "Ile-de-France"),
+                                     "Paris,TX": ("United States of America", "Texas")})
+    cache = WeatherCache()
+
+    async def ask():
+        return await cache.get("get_weather", "Paris"), await cache.get("get_weather", "Paris, TX")
+
+    (paris, _), (texas, _) = asyncio.run(ask())
+    assert wttr_location("Paris, TX") == "Paris,TX"
+    assert requested == ["https://wttr.in/Paris?format=j1", "https://wttr.in/Paris,TX?format=j1"]
+    assert paris.country == "France" and texas.country == "United States of America"
+    assert sorted(cache._entries) == ["paris/france", "paris/united states of america"]
@@ -1,40 +1,85 @@
 import logging
 from livekit.agents import function_tool, RunContext
-import requests
-from langchain_community.tools import DuckDuckGoSearchRun
+import httpx
 import os
-import smtplib
 from email.mime.multipart import MIMEMultipart  
 from email.mime.text import MIMEText
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import asyncio
-from dotenv import load_dotenv
-from google.generativeai.client import configure as genai_configure
-from google.generativeai.generative_models import GenerativeModel as genai
-# Load environment variables from .env file
-load_dotenv()
+import re
+import time
+from urllib.parse import urlsplit
+from executor import run_async, tool_slot
+from http_client import request as http_request
+from search_cache import get_search_cache
+from gemini_client import get_gemini_client
+from speech_stream import session_can_speak, stream_to_session
+from reminders import get_scheduler
+from metrics import instrumented
+from html_extract import PageContent
+from page_fetch import UnsupportedContent
+from page_cache import get_page_cache, normalize_url
+from search_providers import hedged_search
+from news_digest import NEWS_OUTLETS, build_digest, get_news_digests
+from weather import describe_current, describe_today, describe_umbrella, get_weather_cache
+
+# Seldom-used dependencies (the search backends, lxml, the mail modules) are
+# imported where they are first needed, so loading this module stays cheap.
+
+
+async def _web_search(tool_name: str, query: str) -> str:
+    """Search the web (DuckDuckGo, hedged with Google), serving repeats from the search cache."""
+    cache = get_search_cache()
+    cached = cache.get(tool_name, query)
+    if cached is not None:
+        return cached
+    try:
+        outcome = await run_async(tool_name, hedged_search(query, tool_name=tool_name))
+    except Exception:
+        # Every provider failed or is throttled: an older answer beats an error
+        stale = cache.get_stale(query)
+        if stale is None:
+            raise
+        logging.warning(f"Search for '{query}' failed, serving an older cached result")
+        return stale
+    result = outcome.text()
+    cache.put(query, result)
+    return result
+
 
 @function_tool()
+@instrumented
 async def get_weather(
     context: RunContext,  # type: ignore
-    city: str) -> str:
+    city: str,
+    mode: Optional[str] = "current") -> str:
     """
-    Get the current weather for a given city.
+    Get the weather for a given city.
+    
+    Args:
+        city: City name, e.g. 'Dhaka'
+        mode: 'current' for conditions now, 'today' for today's forecast, 'umbrella' for whether to take an umbrella
     """
     try:
-        response = requests.get(
-            f"https://wttr.in/{city}?format=3")
-        if response.status_code == 200:
-            logging.info(f"Weather for {city}: {response.text.strip()}")
-            return response.text.strip()   
+        # One cached wttr.in report per city answers every mode
+        report, fetched_at = await run_async("get_weather", get_weather_cache().get("get_weather", city))
+        if mode == "today":
+            result = describe_today(report)
+        elif mode == "umbrella":
+            result = describe_umbrella(report)
         else:
-            logging.error(f"Failed to get weather for {city}: {response.status_code}")
-            return f"Could not retrieve weather for {city}."
+            result = describe_current(report)
+        age_minutes = (time.time() - fetched_at) / 60
+        if age_minutes > 60:
+            result += f"\n(This report is about {age_minutes / 60:.0f} hours old; the weather service is not answering right now.)"
+        logging.info(f"Weather ({mode}) for {city}: {result.splitlines()[0]}")
+        return result
     except Exception as e:
         logging.error(f"Error retrieving weather for {city}: {e}")
         return f"An error occurred while retrieving weather for {city}." 
 
 @function_tool()
+@instrumented
 async def search_web(
     context: RunContext,  # type: ignore
     query: str) -> str:
@@ -42,14 +87,30 @@ async def search_web(
     Search the web using DuckDuckGo.
     """
     try:
-        results = DuckDuckGoSearchRun().run(tool_input=query)
-        logging.info(f"Search results for '{query}': {results}")
+        results = await _web_search("search_web", query)
+        logging.info(f"Search for '{query}' returned {len(results)} characters")
         return results
     except Exception as e:
         logging.error(f"Error searching the web for '{query}': {e}")
         return f"An error occurred while searching the web for '{query}'."    
 
+# Overall time budget for the parallel searches of a comprehensive answer.
+COMPREHENSIVE_SEARCH_DEADLINE = 8.0
+
+
+def _drop_seen_snippets(result: str, seen: set) -> str:
+    """Remove sentences already returned by another query, recording new ones in seen."""
+    kept = []
+    for sentence in re.split(r"(?<=[.!?])\s+", result.strip()):
+        key = " ".join(sentence.lower().split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        kept.append(sentence)
+    return " ".join(kept)
+
 @function_tool()
+@instrumented
 async def answer_complex_question(
     context: RunContext,  # type: ignore
     question: str,
@@ -74,14 +135,31 @@ async def answer_complex_question(
                 f"{question} latest information"
             ]
             
+            # Run all searches at once; whatever has not answered by the
+            # deadline is dropped so the user waits for about one search.
+            tasks = {
+                asyncio.ensure_future(_web_search("answer_complex_question", query)): query
+                for query in search_queries
+            }
+            done, pending = await asyncio.wait(tasks, timeout=COMPREHENSIVE_SEARCH_DEADLINE)
+            for task in pending:
+                logging.warning(f"Search for '{tasks[task]}' missed the deadline")
+                task.cancel()
+            
             all_results = []
-            for query in search_queries:
-                try:
-                    result = DuckDuckGoSearchRun().run(tool_input=query)
-                    all_results.append(f"Search for '{query}':\n{result}\n")
-                except Exception as e:
-                    logging.warning(f"Failed to search for '{query}': {e}")
+            seen_snippets = set()
+            for task, query in tasks.items():
+                if task not in done:
+                    continue
+                if task.exception() is not None:
+                    logging.warning(f"Failed to search for '{query}': {task.exception()}")
                     continue
+                result = _drop_seen_snippets(task.result(), seen_snippets)
+                if result:
+                    all_results.append(f"Search for '{query}':\n{result}\n")
+            
+            if not all_results:
+                raise RuntimeError("no search finished before the deadline")
             
             combined_results = "\n".join(all_results)
             
@@ -94,7 +172,7 @@ Summary: This information has been gathered from multiple sources to provide you
             
         else:
             # Basic single search
-            result = DuckDuckGoSearchRun().run(tool_input=question)
+            result = await _web_search("answer_complex_question", question)
             response = f"""Here's what I found about your question: "{question}"
 
 {result}
@@ -109,6 +187,7 @@ If you need more detailed information, please let me know and I can search more
         return f"I apologize, but I encountered an error while researching your question: '{question}'. Please try rephrasing your question or ask me to search for something more specific."
 
 @function_tool()
+@instrumented
 async def get_factual_information(
     context: RunContext,  # type: ignore
     topic: str,
@@ -134,7 +213,7 @@ async def get_factual_information(
         else:  # general
             query = f"{topic} facts information overview"
         
-        result = DuckDuckGoSearchRun().run(tool_input=query)
+        result = await _web_search("get_factual_information", query)
         
         response = f"""Here's {information_type} information about "{topic}":
 
@@ -150,6 +229,7 @@ Would you like me to search for more specific aspects of this topic or provide i
         return f"I encountered an error while looking up information about '{topic}'. Please try again or rephrase your request."
 
 @function_tool()    
+@instrumented
 async def send_email(
     context: RunContext,  # type: ignore
     to_email: str,
@@ -167,9 +247,7 @@ async def send_email(
         cc_email: Optional CC email address
     """
     try:
-        # Gmail SMTP configuration
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
+        from smtp_outbox import open_outbox
         
         # Get credentials from environment variables
         gmail_user = os.getenv("GMAIL_USER")
@@ -194,34 +272,73 @@ async def send_email(
         # Attach message body
         msg.attach(MIMEText(message, 'plain'))
         
-        # Connect to Gmail SMTP server
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()  # Enable TLS encryption
-        server.login(gmail_user, gmail_password)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(gmail_user, recipients, text)
-        server.quit()
-        
-        logging.info(f"Email sent successfully to {to_email}")
-        return f"Email sent successfully to {to_email}"
-        
-    except smtplib.SMTPAuthenticationError:
-        logging.error("Gmail authentication failed")
-        return "Email sending failed: Authentication error. Please check your Gmail credentials."
-    except smtplib.SMTPException as e:
-        logging.error(f"SMTP error occurred: {e}")
-        return f"Email sending failed: SMTP error - {str(e)}"
+        # Hand off to the outbox; delivery happens in the background over a reused SMTP session
+        outgoing = await (await open_outbox(gmail_user, gmail_password)).submit(
+            gmail_user, recipients, to_email, subject, msg.as_string())
+        
+        logging.info(f"Email {outgoing.id} to {to_email} queued for delivery")
+        return f"Email to {to_email} is on its way (reference {outgoing.id}). You can ask me to check whether it was delivered."
+        
     except Exception as e:
         logging.error(f"Error sending email: {e}")
         return f"An error occurred while sending email: {str(e)}"
 
+@function_tool()
+@instrumented
+async def check_email_status(
+    context: RunContext,  # type: ignore
+    reference: Optional[str] = None
+) -> str:
+    """
+    Check whether emails sent earlier have been delivered.
+    
+    Args:
+        reference: Reference returned by send_email; leave empty to see the most recent emails
+    """
+    try:
+        from smtp_outbox import find_outgoing, get_outbox
+        
+        if reference:
+            outgoing = find_outgoing(reference.strip())
+            if outgoing is None:
+                return f"I don't have any record of an email with reference {reference}."
+            sent_mails = [outgoing]
+        else:
+            gmail_user = os.getenv("GMAIL_USER")
+            gmail_password = os.getenv("GMAIL_APP_PASSWORD")
+            if not gmail_user or not gmail_password:
+                return "Email status unavailable: Gmail credentials not configured."
+            sent_mails = get_outbox(gmail_user, gmail_password).recent()
+            if not sent_mails:
+                return "You haven't sent any emails in this session yet."
+        
+        status_text = {
+            "queued": "waiting to be sent",
+            "sending": "being sent right now",
+            "retrying": "delayed, I'll keep trying",
+            "sent": "delivered to the mail server",
+            "failed": "could not be sent",
+        }
+        lines = []
+        for outgoing in sent_mails:
+            line = f"• To {outgoing.to_email} - \"{outgoing.subject}\": {status_text.get(outgoing.status, outgoing.status)}"
+            if outgoing.status in ("retrying", "failed") and outgoing.error:
+                line += f" ({outgoing.error})"
+            lines.append(line)
+        
+        logging.info(f"Email status checked for {len(lines)} emails")
+        return "📤 Email delivery status:\n\n" + "\n".join(lines)
+        
+    except Exception as e:
+        logging.error(f"Error checking email status: {e}")
+        return "I couldn't check the email delivery status right now. Please try again."
+
 
 
 
 
 @function_tool()
+@instrumented
 async def set_reminder(
     context: RunContext,  # type: ignore
     reminder_text: str,
@@ -235,16 +352,18 @@ async def set_reminder(
         time_delay_minutes: How many minutes from now to remind (default 30)
     """
     try:
-        import asyncio
         from datetime import datetime, timedelta
         
         remind_time = datetime.now() + timedelta(minutes=time_delay_minutes)
         
-        # Store reminder (in a real app, you'd use a database)
-        logging.info(f"Reminder set: '{reminder_text}' for {remind_time.strftime('%I:%M %p')}")
+        # Store the reminder durably; the scheduler delivers it into this user's room when due
+        scheduler = get_scheduler()
+        room = scheduler.room_for(context.session)
+        if room is None:
+            return "Sorry, I couldn't set the reminder because I don't know which conversation to send it to."
+        reminder_id = await scheduler.schedule(room, reminder_text, remind_time.timestamp())
         
-        # Simple async reminder (for demo purposes)
-        asyncio.create_task(send_reminder_after_delay(reminder_text, time_delay_minutes))
+        logging.info(f"Reminder {reminder_id} set: '{reminder_text}' for {remind_time.strftime('%I:%M %p')}")
         
         return f"Reminder set: I'll remind you about '{reminder_text}' in {time_delay_minutes} minutes at {remind_time.strftime('%I:%M %p')}."
         
@@ -252,49 +371,76 @@ async def set_reminder(
         logging.error(f"Error setting reminder: {e}")
         return f"Sorry, I couldn't set the reminder: {str(e)}"
 
-async def send_reminder_after_delay(reminder_text: str, delay_minutes: int):
-    """Helper function to send reminder after delay"""
-    await asyncio.sleep(delay_minutes * 60)
-    logging.info(f"REMINDER: {reminder_text}")
-
 @function_tool()
+@instrumented
 async def calculate_medication_schedule(
     context: RunContext,  # type: ignore
     medication_name: str,
     dosage_times_per_day: int,
-    first_dose_time: str = "8:00 AM"
+    first_dose_time: str = "8:00 AM",
+    days: Optional[int] = None,
+    timezone: Optional[str] = None,
+    set_reminders: bool = True
 ) -> str:
     """
-    Calculate a medication schedule based on doses per day.
+    Calculate a medication schedule based on doses per day and remind the user at each dose.
     
     Args:
         medication_name: Name of the medication
         dosage_times_per_day: How many times per day to take it
         first_dose_time: Time for first dose (e.g., "8:00 AM")
+        days: How many days to take it for (leave empty if ongoing)
+        timezone: IANA timezone of the user (e.g., "Asia/Dhaka"); defaults to the assistant's timezone
+        set_reminders: Whether to remind the user at each dose time
     """
     try:
-        from datetime import datetime, timedelta
+        from datetime import datetime
+        from zoneinfo import ZoneInfo
+        from reminders import DEFAULT_TIMEZONE, RecurrenceRule
+        
+        if dosage_times_per_day < 1 or dosage_times_per_day > 24:
+            return "Sorry, the number of doses per day should be between 1 and 24."
         
         # Parse first dose time
         first_time = datetime.strptime(first_dose_time, "%I:%M %p")
+        tz_name = timezone or DEFAULT_TIMEZONE
         
         # Calculate intervals
         hours_between = 24 / dosage_times_per_day
         
-        schedule = []
-        current_time = first_time
-        
-        for i in range(dosage_times_per_day):
-            schedule.append(current_time.strftime("%I:%M %p"))
-            current_time += timedelta(hours=hours_between)
+        # The schedule is kept as one rule; dose times are expanded from it when needed
+        rule = RecurrenceRule(
+            first_minute=first_time.hour * 60 + first_time.minute,
+            interval_minutes=round(hours_between * 60),
+            doses_per_day=dosage_times_per_day,
+            timezone=tz_name,
+            start_date=datetime.now(ZoneInfo(tz_name)).date().isoformat(),
+            days=days,
+        )
+        schedule = rule.dose_times()
         
         schedule_text = "\n".join([f"Dose {i+1}: {time}" for i, time in enumerate(schedule)])
+        duration_text = f" for {days} days" if days else ""
+        
+        reminder_text = ""
+        if set_reminders:
+            scheduler = get_scheduler()
+            room = scheduler.room_for(context.session)
+            if room is None:
+                reminder_text = "\n\nI couldn't set dose reminders because I don't know which conversation to send them to."
+            else:
+                schedule_id, next_due = await scheduler.schedule_recurring(
+                    room, f"time to take your {medication_name}", rule)
+                if next_due is not None:
+                    next_text = datetime.fromtimestamp(next_due, ZoneInfo(tz_name)).strftime("%I:%M %p")
+                    reminder_text = f"\n\nI'll remind you at each dose time. The next reminder is at {next_text}."
+                    logging.info(f"Medication schedule {schedule_id} stored for {medication_name}")
         
         response = f"""Medication Schedule for {medication_name}:
 
 {schedule_text}
 
-Take {dosage_times_per_day} doses per day, approximately {hours_between:.1f} hours apart.
+Take {dosage_times_per_day} doses per day{duration_text}, approximately {hours_between:.1f} hours apart.{reminder_text}
 
 ⚠️ Important: Always follow your doctor's specific instructions. This is just a general schedule calculator."""
         
@@ -306,6 +452,7 @@ Take {dosage_times_per_day} doses per day, approximately {hours_between:.1f} hou
         return f"Sorry, I couldn't calculate the medication schedule: {str(e)}"
 
 @function_tool()
+@instrumented
 async def check_health_symptoms(
     context: RunContext,  # type: ignore
     symptoms: str,
@@ -321,7 +468,7 @@ async def check_health_symptoms(
     try:
         # Search for general health information
         query = f"{symptoms} health information general causes when to see doctor"
-        search_result = DuckDuckGoSearchRun().run(tool_input=query)
+        search_result = await _web_search("check_health_symptoms", query)
         
         # Emergency warning
         emergency_keywords = ["chest pain", "difficulty breathing", "severe pain", "bleeding", "unconscious", "stroke", "heart attack"]
@@ -356,6 +503,7 @@ async def check_health_symptoms(
         return "I'm sorry, I couldn't retrieve health information right now. If you're experiencing concerning symptoms, please contact your healthcare provider."
 
 @function_tool()
+@instrumented
 async def get_news_summary(
     context: RunContext,  # type: ignore
     news_category: Optional[str] = "general",
@@ -369,18 +517,11 @@ async def get_news_summary(
         location: Location for local news
     """
     try:
-        if news_category == "local":
-            query = f"{location} local news today headlines"
-        elif news_category == "health":
-            query = "health news medical breakthroughs elderly seniors today"
-        elif news_category == "technology":
-            query = "technology news simple easy seniors elderly friendly"
-        elif news_category == "world":
-            query = "world news international headlines today"
-        else:
-            query = "top news headlines today current events"
-        
-        result = DuckDuckGoSearchRun().run(tool_input=query)
+        # Served from the background-refreshed digest for the category (or location);
+        # only a missing or stale digest costs a live search
+        digest = await run_async("get_news_summary", get_news_digests().get(
+            "get_news_summary", news_category or "general", location))
+        result = digest.render() or "I couldn't find fresh headlines right now."
         
         category_display = news_category.title() if news_category else "General"
         response = f"""📰 {category_display} News Summary:
@@ -397,6 +538,7 @@ Would you like me to search for news about a specific topic or a different categ
         return "I'm sorry, I couldn't retrieve the news right now. Please try again later."
 
 @function_tool()
+@instrumented
 async def help_with_technology(
     context: RunContext,  # type: ignore
     technology_issue: str,
@@ -411,7 +553,7 @@ async def help_with_technology(
     """
     try:
         query = f"{technology_issue} {device_type} simple easy steps seniors elderly help tutorial"
-        result = DuckDuckGoSearchRun().run(tool_input=query)
+        result = await _web_search("help_with_technology", query)
         
         device_type_display = device_type.title() if device_type else "General"
         response = f"""🔧 Technology Help for {device_type_display}:
@@ -436,6 +578,7 @@ Would you like me to explain any of these steps in more detail?"""
         return "I'm sorry, I couldn't find technology help right now. You might want to ask a family member or visit a local computer store for assistance."
 
 @function_tool()
+@instrumented
 async def find_local_services(
     context: RunContext,  # type: ignore
     service_type: str,
@@ -454,7 +597,7 @@ async def find_local_services(
         senior_terms = "seniors elderly friendly" if senior_friendly else ""
         query = f"{service_type} {location} {senior_terms} services near me"
         
-        result = DuckDuckGoSearchRun().run(tool_input=query)
+        result = await _web_search("find_local_services", query)
         
         response = f"""📍 Local {service_type.title()} Services in {location}:
 
@@ -477,6 +620,7 @@ Would you like me to search for a different type of service or in a different ar
         return f"I'm sorry, I couldn't find local services right now. You might want to call 211 for local service information or ask your local library for assistance."
 
 @function_tool()
+@instrumented
 async def convert_units(
     context: RunContext,  # type: ignore
     value: float,
@@ -522,7 +666,7 @@ async def convert_units(
         else:
             # Fallback to web search
             query = f"convert {value} {from_unit} to {to_unit}"
-            search_result = DuckDuckGoSearchRun().run(tool_input=query)
+            search_result = await _web_search("convert_units", query)
             response = f"Conversion result:\n{search_result}"
         
         logging.info(f"Converted {value} {from_unit} to {to_unit}")
@@ -533,6 +677,7 @@ async def convert_units(
         return f"Sorry, I couldn't convert {value} {from_unit} to {to_unit}. Please check that both units are valid."
 
 @function_tool()
+@instrumented
 async def emergency_contacts_info(
     context: RunContext,  # type: ignore
     emergency_type: Optional[str] = "general"
@@ -612,6 +757,7 @@ Stay safe! 💙"""
 
 
 @function_tool()
+@instrumented
 async def get_current_date_time(
     context: RunContext,  # type: ignore
     query_type: Optional[str] = "full"
@@ -659,6 +805,7 @@ Date formats:
         return "দুঃখিত, আমি বর্তমান তারিখ এবং সময়ের তথ্য আনতে পারিনি।"
 
 @function_tool()
+@instrumented
 async def spark_imagination(
     context: RunContext,  # type: ignore
     activity_type: Optional[str] = "story",
@@ -813,11 +960,16 @@ What type of imaginative activity sounds most appealing to you today?"""
         logging.error(f"Error providing imagination activity: {e}")
         return """✨ Let's use our imagination! Try this: Close your eyes and think of your favorite place. What do you see, hear, and feel there? What makes it special? Imagination keeps our minds young and creative!"""
 
+# Total time allowed for reading the result pages in search_google's summary mode.
+SEARCH_SUMMARY_DEADLINE = 5.0
+
 @function_tool()
+@instrumented
 async def search_google(
     context: RunContext,  # type: ignore
     query: str,
-    num_results: Optional[int] = 5
+    num_results: Optional[int] = 5,
+    with_summaries: Optional[bool] = False
 ) -> str:
     """
     Search Google for more comprehensive results than DuckDuckGo.
@@ -825,54 +977,65 @@ async def search_google(
     Args:
         query: Search query
         num_results: Number of results to return (default 5)
+        with_summaries: Also read the results (up to 8) and include their title, snippet and a short summary
     """
     try:
-        from googlesearch import search
-        import time
-        
         logging.info(f"Searching Google for: {query}")
         
         # Ensure num_results is not None
         if num_results is None:
             num_results = 5
 
-        # Get search results
-        results = []
-        for i, url in enumerate(search(query, num_results=num_results)):
-            results.append(f"{i+1}. {url}")
-            if i >= num_results - 1:
-                break
-        
-        if results:
+        # Google first; DuckDuckGo is raced in when Google is slow, failing or rate-limited
+        outcome = await run_async("search_google", hedged_search(
+            query, order=("google", "duckduckgo"), num_results=num_results, tool_name="search_google"))
+        hits = [hit for hit in outcome.hits if hit.url][:num_results]
+        results = [f"{i+1}. {hit.url}" for i, hit in enumerate(hits)]
+        
+        if hits and with_summaries:
+            # Read every result at once instead of one visit_website call per link;
+            # pages seen recently come from the page cache
+            pages = await _fetch_pages("search_google", [hit.url for hit in hits[:MAX_BATCH_URLS]],
+                                       SEARCH_SUMMARY_DEADLINE)
+            sections = []
+            for i, (hit, (page, problem)) in enumerate(zip(hits, pages), 1):
+                title = (page.title if page is not None else "") or hit.title or hit.url
+                lines = [f"{i}. {title}", f"   {hit.url}"]
+                if hit.snippet:
+                    lines.append(f"   {hit.snippet}")
+                summary_text = _page_summary(page, max_paragraphs=2, max_chars=400) if page is not None else ""
+                lines.append(f"   Summary: {summary_text or problem or 'No readable summary on this page.'}")
+                sections.append("\n".join(lines))
+            # Only the first MAX_BATCH_URLS pages are read; the rest are still listed
+            for i, hit in enumerate(hits[MAX_BATCH_URLS:], MAX_BATCH_URLS + 1):
+                lines = [f"{i}. {hit.title or hit.url}", f"   {hit.url}"]
+                if hit.snippet:
+                    lines.append(f"   {hit.snippet}")
+                lines.append("   Summary: not read, ask me to visit this page for one.")
+                sections.append("\n".join(lines))
+            response = f"""🔍 Google Search Results for "{query}", with summaries:
+
+{(chr(10) * 2).join(sections)}
+
+💡 I can read any of these pages in full, or search for something more specific."""
+        elif results:
             response = f"""🔍 Google Search Results for "{query}":
 
 {chr(10).join(results)}
 
-💡 These are direct links to websites. You can ask me to search for more specific information or get details about any of these topics."""
+💡 These are direct links to websites. I can read these pages for you, or search for more specific information about any of these topics."""
         else:
-            response = f"I couldn't find Google search results for '{query}'. Let me try a different search method."
-            # Fallback to DuckDuckGo
-            fallback_result = DuckDuckGoSearchRun().run(tool_input=query)
-            response += f"\n\nHere's what I found using an alternative search:\n{fallback_result}"
+            response = f"I couldn't find any search results for '{query}'. Please try different words."
         
-        logging.info(f"Google search completed for: {query}")
+        logging.info(f"Google search completed for: {query} (via {outcome.provider})")
         return response
         
-    except ImportError:
-        logging.warning("Google search library not available, falling back to DuckDuckGo")
-        # Fallback to DuckDuckGo search
-        result = DuckDuckGoSearchRun().run(tool_input=query)
-        return f"Google search not available, but here's what I found:\n\n{result}"
     except Exception as e:
         logging.error(f"Error performing Google search for '{query}': {e}")
-        # Fallback to DuckDuckGo search
-        try:
-            result = DuckDuckGoSearchRun().run(tool_input=query)
-            return f"Had trouble with Google search, but here's what I found using alternative search:\n\n{result}"
-        except:
-            return f"I'm sorry, I couldn't search for '{query}' right now. Please try again later."
+        return f"I'm sorry, I couldn't search for '{query}' right now. Please try again later."
 
 @function_tool()
+@instrumented
 async def search_google_news(
     context: RunContext,  # type: ignore
     topic: str,
@@ -896,12 +1059,17 @@ async def search_google_news(
         else:  # recent
             query = f"{topic} latest news"
         
-        # Use DuckDuckGo to search for news since it's more reliable
-        result = DuckDuckGoSearchRun().run(tool_input=f"site:news.google.com {query}")
-        
-        if not result or len(result.strip()) < 10:
-            # Fallback to general news search
-            result = DuckDuckGoSearchRun().run(tool_input=f"{query} site:cnn.com OR site:bbc.com OR site:reuters.com")
+        # On-demand topics take the live path: Google News and the major outlets are
+        # searched at once and their stories merged, then cached like other searches
+        cache = get_search_cache()
+        cache_key = f"news topic {query}"
+        result = cache.get("search_google_news", cache_key)
+        if result is None:
+            digest = await run_async("search_google_news", build_digest(
+                query, [f"site:news.google.com {query}", f"{query} {NEWS_OUTLETS}"], tool_name="search_google_news"))
+            result = digest.render() or f"I couldn't find recent news about '{topic}'."
+            if digest.stories:
+                cache.put(cache_key, result)
         
         response = f"""📰 News Search Results for "{topic}" ({time_range}):
 
@@ -919,7 +1087,55 @@ async def search_google_news(
 
 
 
+def _page_summary(page, max_paragraphs: int, max_chars: int) -> str:
+    paragraphs = [text for text in page.paragraphs if len(text) > 50]  # Only substantial paragraphs
+    summary_text = '\n\n'.join(paragraphs[:max_paragraphs])
+    if len(summary_text) > max_chars:
+        summary_text = summary_text[:max_chars] + "..."
+    return summary_text
+
+
+# Batch page reads: at most this many pages per call, and per host at a time,
+# so a list of results from one site is read politely rather than all at once.
+MAX_BATCH_URLS = 8
+BATCH_PER_HOST = 2
+
+
+async def _fetch_pages(tool_name: str, urls: List[str], timeout: float) -> List[Tuple[Optional[PageContent], str]]:
+    """
+    Fetch and extract several pages concurrently through the page cache, under one deadline.
+
+    Returns (page, problem) for each URL in order; page is None and problem
+    says why when the page failed or was still loading at the deadline.
+    """
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def _visit(url: str) -> PageContent:
+        host = urlsplit(url).netloc.lower()
+        async with host_limits.setdefault(host, asyncio.Semaphore(BATCH_PER_HOST)):
+            return (await get_page_cache().get_page(tool_name, url)).page
+
+    tasks = [asyncio.create_task(_visit(url)) for url in urls]
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    results: List[Tuple[Optional[PageContent], str]] = []
+    for url, task in zip(urls, tasks):
+        if task in pending:
+            results.append((None, "This page took too long to load, so I skipped it."))
+        elif isinstance(task.exception(), UnsupportedContent):
+            results.append((None, "This link is not a web page, so I can't read it out."))
+        elif task.exception() is not None:
+            logging.warning(f"Failed to visit {url}: {task.exception()}")
+            results.append((None, "I couldn't open this page."))
+        else:
+            results.append((task.result(), ""))
+    return results
+
+
 @function_tool()
+@instrumented
 async def visit_website(
     context: RunContext,  # type: ignore
     url: str,
@@ -933,43 +1149,22 @@ async def visit_website(
         content_type: Type of content to extract - 'summary', 'full', 'headlines', 'links'
     """
     try:
-        import requests
-        from bs4 import BeautifulSoup
-        import re
-        from urllib.parse import urljoin, urlparse
-        
         logging.info(f"Visiting website: {url}")
         
         # Add protocol if missing
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
         
-        # Set headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Make request with timeout
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get page title
-        title = soup.find('title')
-        page_title = title.get_text().strip() if title else "No title found"
+        # Stream the page through the shared client and parse it as it arrives, off the
+        # event loop; the parsed page is cached, so other views of it cost no refetch
+        page = (await run_async("visit_website", get_page_cache().get_page("visit_website", url))).page
+        page_title = page.title or "No title found"
         
         if content_type == "headlines":
             # Extract headlines (h1, h2, h3 tags)
             headlines = []
-            for tag in soup.find_all(['h1', 'h2', 'h3']):
-                text = tag.get_text().strip()
-                if text and len(text) > 3:  # Filter out very short text
+            for text in page.headings:
+                if len(text) > 3:  # Filter out very short text
                     headlines.append(f"• {text}")
             
             headlines_text = '\n'.join(headlines[:15])  # Limit to 15 headlines
@@ -984,17 +1179,9 @@ Would you like me to get the full content or summary of this page?"""
         elif content_type == "links":
             # Extract links
             links = []
-            from bs4 import Tag
-            for link in soup.find_all('a', href=True):
-                if isinstance(link, Tag):
-                    href = link.get('href')
-                    text = link.get_text().strip()
-                    
-                    # Convert relative URLs to absolute
-                    full_url = urljoin(url, str(href))
-                    
-                    if text and len(text) > 3 and len(text) < 100:  # Filter reasonable link text
-                        links.append(f"• {text}: {full_url}")
+            for text, full_url in page.links:  # already absolute
+                if len(text) > 3 and len(text) < 100:  # Filter reasonable link text
+                    links.append(f"• {text}: {full_url}")
             
             links_text = '\n'.join(links[:20])  # Limit to 20 links
             
@@ -1006,13 +1193,8 @@ URL: {url}
 I can visit any of these links for you if you'd like more information."""
 
         elif content_type == "full":
-            # Get full text content
-            text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            clean_text = ' '.join(chunk for chunk in chunks if chunk)
+            # Full readable text, already cleaned of scripts, styles and extra whitespace
+            clean_text = page.text
             
             # Limit text length for readability
             if len(clean_text) > 2000:
@@ -1026,18 +1208,8 @@ URL: {url}
 This is the complete text content from the webpage. Would you like me to summarize this information or search for something specific?"""
 
         else:  # summary (default)
-            # Get main content paragraphs
-            paragraphs = []
-            for p in soup.find_all('p'):
-                text = p.get_text().strip()
-                if len(text) > 50:  # Only include substantial paragraphs
-                    paragraphs.append(text)
-            
-            # Take first few paragraphs for summary
-            summary_text = '\n\n'.join(paragraphs[:5])
-            
-            if len(summary_text) > 1500:
-                summary_text = summary_text[:1500] + "..."
+            # First few substantial paragraphs
+            summary_text = _page_summary(page, max_paragraphs=5, max_chars=1500)
             
             response = f"""📄 Summary from "{page_title}":
 URL: {url}
@@ -1049,11 +1221,15 @@ URL: {url}
         logging.info(f"Successfully visited website: {url}")
         return response
 
-    except requests.exceptions.Timeout:
+    except UnsupportedContent as e:
+        logging.info(f"Not visiting {url}: {e}")
+        return f"The link {url} is not a web page (it looks like a {e.content_type or 'file'}), so I can't read it out. Please share a web page link instead."
+
+    except (httpx.TimeoutException, asyncio.TimeoutError):
         logging.error(f"Website visit timed out: {url}")
         return f"The website {url} took too long to respond. Please try again later or check if the URL is correct."
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"Error visiting website {url}: {e}")
         return f"I couldn't access the website {url}. Please check that the URL is correct and the website is available."
     
@@ -1062,6 +1238,7 @@ URL: {url}
         return f"I encountered an error while trying to visit {url}. Please try again or provide a different website."
 
 @function_tool()
+@instrumented
 async def read_article(
     context: RunContext,  # type: ignore
     url: str,
@@ -1075,47 +1252,19 @@ async def read_article(
         reading_level: How to present the content - 'simple', 'detailed', 'bullet_points'
     """
     try:
-        import requests
-        from bs4 import BeautifulSoup
-        
         logging.info(f"Reading article: {url}")
         
         # Add protocol if missing
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Get title
-        title = soup.find('title')
-        article_title = title.get_text().strip() if title else "Article"
-        
-        # Try to find article content (common article selectors)
-        article_selectors = ['article', '.article-body', '.content', '.post-content', '.entry-content', 'main']
-        article_content = None
+        # Shares the page cache with visit_website ("now read it in bullet points")
+        page = (await run_async("read_article", get_page_cache().get_page("read_article", url))).page
+        article_title = page.title or "Article"
         
-        for selector in article_selectors:
-            article_content = soup.select_one(selector)
-            if article_content:
-                break
-        
-        if not article_content:
-            # Fallback to all paragraphs
-            article_content = soup
-        
-        # Extract paragraphs
-        paragraphs = []
-        for p in article_content.find_all('p'):
-            text = p.get_text().strip()
-            if len(text) > 30:  # Only substantial paragraphs
-                paragraphs.append(text)
+        # Paragraphs from the main article container (article, .article-body, .content, ... main),
+        # or from the whole page when there is none
+        paragraphs = [text for text in page.article_paragraphs if len(text) > 30]  # Only substantial paragraphs
         
         if not paragraphs:
             return f"I couldn't extract readable content from this article: {url}"
@@ -1160,6 +1309,10 @@ Would you like me to read it differently or explain any part of this article?"""
         logging.info(f"Successfully read article: {url}")
         return response
 
+    except UnsupportedContent as e:
+        logging.info(f"Not reading {url}: {e}")
+        return f"The link {url} is not an article (it looks like a {e.content_type or 'file'}), so I can't read it out. Please share a web page link instead."
+
     except Exception as e:
         logging.error(f"Error reading article {url}: {e}")
         return f"I couldn't read the article from {url}. Please check the URL or try a different article."
@@ -1167,6 +1320,88 @@ Would you like me to read it differently or explain any part of this article?"""
 
 
 @function_tool()
+@instrumented
+async def visit_websites(
+    context: RunContext,  # type: ignore
+    urls: List[str],
+) -> str:
+    """
+    Visit several websites at once and summarize each, e.g. the links from a search.
+    
+    Args:
+        urls: The website URLs to read (up to 8)
+    """
+    try:
+        # Add protocol if missing and drop repeats, keeping the user's order
+        targets = []
+        seen = set()
+        for url in urls or []:
+            url = url.strip()
+            if not url:
+                continue
+            if not url.startswith(('http://', 'https://')):
+                url = 'https://' + url
+            if normalize_url(url) not in seen:
+                seen.add(normalize_url(url))
+                targets.append(url)
+        targets = targets[:MAX_BATCH_URLS]
+        if not targets:
+            return "Please give me one or more website links to read."
+
+        logging.info(f"Visiting {len(targets)} websites")
+
+        # One deadline for the whole batch: pages still loading when it passes are
+        # skipped, so the answer takes about as long as the slowest page that made it
+        async with tool_slot("visit_websites") as limit:
+            results = await _fetch_pages("visit_websites", targets, limit.timeout)
+
+        sections = []
+        for i, (url, (page, problem)) in enumerate(zip(targets, results), 1):
+            if page is None:
+                body = problem
+            else:
+                summary_text = _page_summary(page, max_paragraphs=2, max_chars=500)
+                body = f'"{page.title or "No title found"}"\n{summary_text or "Could not extract readable content from this page."}'
+            sections.append(f"{i}. {url}\n{body}")
+
+        response = f"""📄 Summaries of {len(targets)} websites:
+
+{(chr(10) * 2).join(sections)}
+
+💡 I can read any of these pages in full or as an article. Just tell me which one!"""
+
+        logging.info(f"Visited {sum(page is not None for page, _ in results)} of {len(targets)} websites")
+        return response
+
+    except Exception as e:
+        logging.error(f"Error visiting websites {urls}: {e}")
+        return "I encountered an error while trying to read those websites. Please try again or give me one link at a time."
+
+
+# Speak Gemini answers while they are generated, when the session has a TTS voice.
+GEMINI_STREAM_TO_VOICE = os.getenv("GEMINI_STREAM_TO_VOICE", "1") != "0"
+
+
+async def _generate_with_gemini(context, tool_name: str, client, prompt: str):
+    """Generate with Gemini, speaking the text as it streams in when possible. Returns (text, spoken)."""
+    if GEMINI_STREAM_TO_VOICE and session_can_speak(context):
+        started = time.perf_counter()
+        outcome = await stream_to_session(context, client.stream(tool_name, prompt), started)
+        if outcome.first_sentence is not None:
+            client.record_first_sentence(tool_name, outcome.first_sentence)
+        return outcome.text, True
+    result = await client.generate(tool_name, prompt)
+    return result.text, False
+
+
+def _mark_spoken(response: str, spoken: bool) -> str:
+    """Tell the model the answer was already read aloud so it doesn't repeat it."""
+    if not spoken:
+        return response
+    return "(This answer has already been read aloud to the user. Don't repeat it; just offer follow-up help.)\n\n" + response
+
+@function_tool()
+@instrumented
 async def write_code_with_gemini(
     context: RunContext,  # type: ignore
     programming_request: str,
@@ -1182,20 +1417,11 @@ async def write_code_with_gemini(
         complexity_level: 'beginner', 'intermediate', 'advanced'
     """
     try:
-        import os
-        from google.generativeai.client import configure as genai_configure
-        from google.generativeai.generative_models import GenerativeModel
-
-        # Configure Gemini API
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        # Shared client: configured once per process, models reused across calls
+        client = get_gemini_client()
+        if client is None:
             return "Sorry, I need a Google API key to help with code writing. Please configure your GOOGLE_API_KEY environment variable."
         
-        genai_configure(api_key=api_key)
-        
-        # Create the model
-        model = GenerativeModel('gemini-pro')
-        
         # Craft a detailed prompt for code generation
         prompt = f"""
 You are a helpful coding assistant for elderly users who may be new to programming. 
@@ -1219,15 +1445,15 @@ Code Request: {programming_request}
         logging.info(f"Generating code with Gemini for: {programming_request}")
         
         # Generate code using Gemini
-        response = model.generate_content(prompt)
+        text, spoken = await _generate_with_gemini(context, "write_code_with_gemini", client, prompt)
         
-        if response.text:
+        if text:
             formatted_response = f"""💻 **Code Generated for: "{programming_request}"**
 
 **Language:** {(language.title() if language else "Unknown")}
 **Complexity:** {(complexity_level.title() if complexity_level else "Unknown")}
 
-{response.text}
+{text}
 
 ---
 
@@ -1244,7 +1470,7 @@ Code Request: {programming_request}
 """
             
             logging.info(f"Code successfully generated for: {programming_request}")
-            return formatted_response
+            return _mark_spoken(formatted_response, spoken)
         else:
             return f"I couldn't generate code for '{programming_request}'. Please try rephrasing your request or being more specific about what you need."
     
@@ -1256,6 +1482,7 @@ Code Request: {programming_request}
         return f"I encountered an error while trying to generate code for '{programming_request}'. Please try again or rephrase your request."
 
 @function_tool()
+@instrumented
 async def explain_code_with_gemini(
     context: RunContext,  # type: ignore
     code_snippet: str,
@@ -1269,20 +1496,11 @@ async def explain_code_with_gemini(
         language: Programming language of the code
     """
     try:
-        import os
-        from google.generativeai.client import configure as genai_configure
-        from google.generativeai.generative_models import GenerativeModel
-
-        # Configure Gemini API
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        # Shared client: configured once per process, models reused across calls
+        client = get_gemini_client()
+        if client is None:
             return "Sorry, I need a Google API key to help explain code. Please configure your GOOGLE_API_KEY environment variable."
         
-        genai_configure(api_key=api_key)
-        
-        # Create the model
-        model = GenerativeModel('gemini-pro')
-        
         # Craft a prompt for code explanation
         prompt = f"""
 You are explaining code to elderly users who may be new to programming. 
@@ -1306,9 +1524,9 @@ Make it conversational and avoid technical jargon. Use analogies or real-world e
         logging.info(f"Explaining code with Gemini for {language} code")
         
         # Generate explanation using Gemini
-        response = model.generate_content(prompt)
+        text, spoken = await _generate_with_gemini(context, "explain_code_with_gemini", client, prompt)
         
-        if response.text:
+        if text:
             formatted_response = f"""📖 **Code Explanation ({language.title()})**
 
 **Your Code:**
@@ -1317,7 +1535,7 @@ Make it conversational and avoid technical jargon. Use analogies or real-world e
 ```
 
 **Explanation:**
-{response.text}
+{text}
 
 ---
 
@@ -1329,7 +1547,7 @@ Make it conversational and avoid technical jargon. Use analogies or real-world e
 """
             
             logging.info(f"Code explanation completed for {language} code")
-            return formatted_response
+            return _mark_spoken(formatted_response, spoken)
         else:
             return f"I couldn't explain this code right now. Please try again or ask me to explain specific parts of the code."
     
@@ -1341,6 +1559,7 @@ Make it conversational and avoid technical jargon. Use analogies or real-world e
         return f"I encountered an error while trying to explain the code. Please try again."
 
 @function_tool()
+@instrumented
 async def debug_code_with_gemini(
     context: RunContext,  # type: ignore
     code_with_error: str,
@@ -1356,20 +1575,11 @@ async def debug_code_with_gemini(
         language: Programming language of the code
     """
     try:
-        import os
-        from google.generativeai.client import configure as genai_configure
-        from google.generativeai.generative_models import GenerativeModel
-
-        # Configure Gemini API
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        # Shared client: configured once per process, models reused across calls
+        client = get_gemini_client()
+        if client is None:
             return "Sorry, I need a Google API key to help debug code. Please configure your GOOGLE_API_KEY environment variable."
         
-        genai_configure(api_key=api_key)
-        
-        # Create the model
-        model = GenerativeModel('gemini-pro')
-        
         # Craft a prompt for code debugging
         error_section = f"\n\nError Message: {error_message}" if error_message else ""
         
@@ -1395,9 +1605,9 @@ Use simple language and be encouraging - debugging can be frustrating for beginn
         logging.info(f"Debugging code with Gemini for {language} code")
         
         # Generate debugging help using Gemini
-        response = model.generate_content(prompt)
+        text, spoken = await _generate_with_gemini(context, "debug_code_with_gemini", client, prompt)
         
-        if response.text:
+        if text:
             formatted_response = f"""🔧 **Code Debugging Help ({language.title()})**
 
 **Your Original Code:**
@@ -1408,7 +1618,7 @@ Use simple language and be encouraging - debugging can be frustrating for beginn
 {f"**Error Message:** {error_message}" if error_message else ""}
 
 **Debugging Analysis:**
-{response.text}
+{text}
 
 ---
 
@@ -1425,7 +1635,7 @@ Use simple language and be encouraging - debugging can be frustrating for beginn
 """
             
             logging.info(f"Code debugging completed for {language} code")
-            return formatted_response
+            return _mark_spoken(formatted_response, spoken)
         else:
             return f"I couldn't analyze the code issues right now. Please try again or describe the specific problem you're experiencing."
     
@@ -1437,6 +1647,7 @@ Use simple language and be encouraging - debugging can be frustrating for beginn
         return f"I encountered an error while trying to debug the code. Please try again."
 
 @function_tool()
+@instrumented
 async def learn_programming_with_gemini(
     context: RunContext,  # type: ignore
     topic: str,
@@ -1452,19 +1663,11 @@ async def learn_programming_with_gemini(
         learning_style: 'beginner', 'visual', 'hands-on', 'theoretical'
     """
     try:
-        import google.generativeai as genai
-        import os
-        
-        # Configure Gemini API
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        # Shared client: configured once per process, models reused across calls
+        client = get_gemini_client()
+        if client is None:
             return "Sorry, I need a Google API key to create programming lessons. Please configure your GOOGLE_API_KEY environment variable."
         
-        genai.configure(api_key=api_key)
-        
-        # Create the model
-        model = genai.GenerativeModel('gemini-pro')
-        
         # Craft a prompt for programming education
         prompt = f"""
 Create a programming lesson for elderly learners who are new to coding.
@@ -1489,14 +1692,14 @@ Include real-world examples that would be relevant to elderly users.
         logging.info(f"Creating programming lesson with Gemini for: {topic}")
         
         # Generate lesson using Gemini
-        response = model.generate_content(prompt)
+        text, spoken = await _generate_with_gemini(context, "learn_programming_with_gemini", client, prompt)
         
-        if response.text:
+        if text:
             formatted_response = f"""📚 **Programming Lesson: {topic.title()} in {language.title()}**
 
 **Learning Style:** {learning_style.title()}
 
-{response.text}
+{text}
 
 ---
 
@@ -1516,7 +1719,7 @@ Learning to code at any age is an achievement. Take it one step at a time and ce
 """
             
             logging.info(f"Programming lesson created for: {topic}")
-            return formatted_response
+            return _mark_spoken(formatted_response, spoken)
         else:
             return f"I couldn't create a lesson for '{topic}' right now. Please try asking about a different programming concept."
     
@@ -1533,6 +1736,7 @@ Learning to code at any age is an achievement. Take it one step at a time and ce
 
 
 @function_tool()
+@instrumented
 async def read_emails(
     context: RunContext,  # type: ignore
     num_emails: Optional[int] = 5,
@@ -1549,10 +1753,8 @@ async def read_emails(
     """
     try:
         import imaplib
-        import email
-        from email.header import decode_header
         import os
-        from datetime import datetime
+        from mail_index import read_mail
         
         # Get credentials from environment variables
         gmail_user = os.getenv("GMAIL_USER")
@@ -1567,94 +1769,42 @@ Please set up your credentials in the .env file:
 
 Note: You need a Gmail App Password, not your regular password."""
         
-        logging.info(f"Connecting to Gmail for {gmail_user}")
-        
-        # Connect to Gmail IMAP server
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(gmail_user, gmail_password)
+        logging.info(f"Reading Gmail for {gmail_user}")
         
-        # Select the mailbox folder
-        mail.select(email_folder)
-        
-        # Search for emails
-        if unread_only:
-            status, messages = mail.search(None, 'UNSEEN')
-            search_criteria = "unread"
-        else:
-            status, messages = mail.search(None, 'ALL')
-            search_criteria = "all"
-        
-        if status != 'OK':
-            return f"Failed to search emails in {email_folder} folder."
+        # Limit number of emails to read
+        if num_emails is None:
+            num_emails = 5
+        search_criteria = "unread" if unread_only else "all"
         
-        # Get list of email IDs
-        email_ids = messages[0].split()
+        # Serve from the local mail index, syncing new messages from the server when stale;
+        # total is the mailbox's own count on the server
+        email_folder = email_folder or "INBOX"
+        total, summaries = await read_mail(
+            "read_emails", gmail_user, gmail_password, email_folder, bool(unread_only), num_emails)
         
-        if not email_ids:
+        if not total:
             return f"""📧 No {search_criteria} emails found in {email_folder}.
 
 Your mailbox appears to be empty or all emails have been read."""
         
-        # Limit number of emails to read
-        if num_emails is None:
-            num_emails = 5
-        recent_emails = email_ids[-num_emails:]  # Get most recent emails
-        
         email_summaries = []
         
-        for email_id in reversed(recent_emails):  # Show newest first
-            try:
-                # Fetch the email
-                status, msg_data = mail.fetch(email_id, '(RFC822)')
-                
-                if status != 'OK':
-                    continue
-                
-                # Parse the email
-                raw_email = msg_data[0][1]
-                email_message = email.message_from_bytes(raw_email)
-                
-                # Extract email details
-                subject = decode_header(email_message["Subject"])[0][0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode()
-                
-                from_email = email_message.get("From")
-                date_received = email_message.get("Date")
-                
-                # Get email body
-                body = ""
-                if email_message.is_multipart():
-                    for part in email_message.walk():
-                        if part.get_content_type() == "text/plain":
-                            body = part.get_payload(decode=True).decode()
-                            break
-                else:
-                    body = email_message.get_payload(decode=True).decode()
-                
-                # Limit body length for readability
-                if len(body) > 300:
-                    body = body[:300] + "..."
-                
-                email_summary = f"""📩 **From:** {from_email}
-**Subject:** {subject}
-**Date:** {date_received}
-**Preview:** {body.strip()[:200]}{"..." if len(body.strip()) > 200 else ""}
+        for summary in summaries:
+            # Limit body length for readability
+            body = summary.preview.strip()
+            
+            email_summary = f"""📩 **From:** {summary.sender}
+**Subject:** {summary.subject}
+**Date:** {summary.date}
+**Preview:** {body[:200]}{"..." if len(body) > 200 else ""}
 
 ---"""
-                
-                email_summaries.append(email_summary)
-                
-            except Exception as e:
-                logging.error(f"Error processing email ID {email_id}: {e}")
-                continue
+            
+            email_summaries.append(email_summary)
         
-        # Close the connection
-        mail.close()
-        mail.logout()
         
         if email_summaries:
-            response = f"""📬 **Your {search_criteria.title()} Emails ({len(email_summaries)} of {len(email_ids)} total):**
+            response = f"""📬 **Your {search_criteria.title()} Emails ({len(email_summaries)} of {total} total):**
 
 {chr(10).join(email_summaries)}
 
@@ -1664,7 +1814,7 @@ Your mailbox appears to be empty or all emails have been read."""
 • Consider marking important emails for easy finding later
 • Ask me to search for emails from specific people or with certain subjects"""
         else:
-            response = f"I found {len(email_ids)} {search_criteria} emails but couldn't read their content. There might be formatting issues with these emails."
+            response = f"I found {total} {search_criteria} emails but couldn't read their content. There might be formatting issues with these emails."
         
         logging.info(f"Successfully read {len(email_summaries)} emails")
         return response
@@ -1683,11 +1833,13 @@ Please check:
         return f"I encountered an error while reading your emails: {str(e)}"
 
 @function_tool()
+@instrumented
 async def search_emails(
     context: RunContext,  # type: ignore
     search_query: str,
     num_results: Optional[int] = 10,
-    search_in: Optional[str] = "all"
+    search_in: Optional[str] = "all",
+    deep_search: Optional[bool] = False
 ) -> str:
     """
     Search for specific emails in Gmail.
@@ -1696,12 +1848,11 @@ async def search_emails(
         search_query: What to search for (sender, subject, content, etc.)
         num_results: Maximum number of results to return
         search_in: Where to search - 'all', 'subject', 'from', 'body'
+        deep_search: Also search on the mail server, which matches parts of words; use when the user is sure an email exists but a normal search found nothing
     """
     try:
-        import imaplib
-        import email
-        from email.header import decode_header
         import os
+        from mail_index import search_mail
         
         # Get credentials
         gmail_user = os.getenv("GMAIL_USER")
@@ -1712,30 +1863,18 @@ async def search_emails(
         
         logging.info(f"Searching emails for: {search_query}")
         
-        # Connect to Gmail
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(gmail_user, gmail_password)
-        mail.select("INBOX")
-        
-        # Construct search criteria based on search_in parameter
-        if search_in == "subject":
-            search_criteria = f'SUBJECT "{search_query}"'
-        elif search_in == "from":
-            search_criteria = f'FROM "{search_query}"'
-        elif search_in == "body":
-            search_criteria = f'BODY "{search_query}"'
-        else:  # all
-            search_criteria = f'OR OR SUBJECT "{search_query}" FROM "{search_query}" BODY "{search_query}"'
-        
-        # Search for emails
-        status, messages = mail.search(None, search_criteria)
-        
-        if status != 'OK':
-            return f"Failed to search emails for '{search_query}'."
+        # Limit results
+        if num_results is None:
+            num_results = 10
         
-        email_ids = messages[0].split()
+        # Search the local mail index, falling back to the server while it is still
+        # backfilling older mail or when a deep search is asked for.
+        # search_in picks the field: 'subject', 'from', 'body', or all of them
+        total, summaries = await search_mail(
+            "search_emails", gmail_user, gmail_password, "INBOX", search_query, search_in or "all", num_results,
+            deep=bool(deep_search))
         
-        if not email_ids:
+        if not total:
             return f"""🔍 No emails found matching '{search_query}'.
 
 Try searching for:
@@ -1744,44 +1883,17 @@ Try searching for:
 • Words from the email content
 • Try broadening your search terms"""
         
-        # Limit results
-        if num_results is None:
-            num_results = 10
-        recent_matches = email_ids[-num_results:]  # Get most recent matches
-        
         search_results = []
         
-        for email_id in reversed(recent_matches):
-            try:
-                status, msg_data = mail.fetch(email_id, '(RFC822)')
-                if status != 'OK':
-                    continue
-                
-                raw_email = msg_data[0][1]
-                email_message = email.message_from_bytes(raw_email)
-                
-                # Extract email details
-                subject = decode_header(email_message["Subject"])[0][0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode()
-                
-                from_email = email_message.get("From")
-                date_received = email_message.get("Date")
-                
-                search_result = f"""📧 **From:** {from_email}
-**Subject:** {subject}
-**Date:** {date_received}
+        for summary in summaries:
+            search_result = f"""📧 **From:** {summary.sender}
+**Subject:** {summary.subject}
+**Date:** {summary.date}
 
 ---"""
-                
-                search_results.append(search_result)
-                
-            except Exception as e:
-                logging.error(f"Error processing search result {email_id}: {e}")
-                continue
+            
+            search_results.append(search_result)
         
-        mail.close()
-        mail.logout()
         
         response = f"""🔍 **Search Results for '{search_query}' ({len(search_results)} found):**
 
@@ -1802,6 +1914,7 @@ Try searching for:
 
 
 @function_tool()
+@instrumented
 async def recognize_song(
     context: RunContext,  # type: ignore
     audio_url: str
@@ -1826,7 +1939,7 @@ async def recognize_song(
             'return': 'apple_music,spotify',
         }
 
-        response = requests.post(api_url, data=data, timeout=20)
+        response = await run_async("recognize_song", http_request("POST", api_url, data=data, timeout=20))
         if response.status_code != 200:
             return f"Failed to contact song recognition service (status {response.status_code})."
 
@@ -1868,6 +1981,7 @@ Would you like more information about this song or artist?
 
 
 @function_tool()
+@instrumented
 async def get_agent_capabilities(
     context: RunContext,  # type: ignore
     capability_category: Optional[str] = "all"
@@ -1905,7 +2019,7 @@ async def get_agent_capabilities(
             'information': """📚 Information & Learning:
 • Get current date and time information
 • Search for factual information on any topic
-• Get weather information for any city
+• Get weather information for any city, today's forecast, or whether to take an umbrella
 • Convert between different units of measurement
 • Help with technology issues in simple terms
 • Summarize or read online articles
@@ -1942,7 +2056,9 @@ async def get_agent_capabilities(
             'web': """🌐 Web & Online Tools:
 • Search the web using DuckDuckGo or Google
 • Search Google News for current topics
+• Search Google with a short summary of every result
 • Visit and summarize website content
+• Read several websites at once, such as search results
 • Read and simplify online articles
 • Extract headlines or links from web pages
 • Get summaries or full content from websites
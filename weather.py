@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from http_client import request as http_request
+from metrics import record_cache, start_shared, wait_shared
+
+# wttr.in updates its observations roughly every 15 minutes.
+WEATHER_TTL_SECONDS = float(os.getenv("WEATHER_TTL_SECONDS", "900"))
+# Past the TTL a cached report is still served, marked as older, if wttr.in is down.
+WEATHER_STALE_SECONDS = 6 * 60 * 60
+MAX_CITIES = 128
+
+# Chance of rain (percent) over the rest of the day that decides the umbrella answer.
+UMBRELLA_YES = 50
+UMBRELLA_MAYBE = 30
+
+
+@dataclass
+class HourlyForecast:
+    hour: int  # local hour of the day, 0-21 in steps of 3
+    temp_c: int
+    chance_of_rain: int
+    precip_mm: float
+    description: str
+
+
+@dataclass
+class CityWeather:
+    """The parts of wttr.in's j1 payload the tool answers from."""
+    area: str
+    country: str
+    description: str
+    temp_c: int
+    feels_like_c: int
+    humidity: int
+    wind_kmph: int
+    observed_hour: Optional[int]  # local hour of the observation, when wttr.in reports it
+    max_temp_c: int
+    min_temp_c: int
+    hourly: List[HourlyForecast] = field(default_factory=list)
+    region: str = ""  # wttr.in's state or province for the nearest area
+
+    def remaining_hours(self) -> List[HourlyForecast]:
+        """Forecast slots from the current 3-hour block to the end of the day."""
+        if self.observed_hour is None:
+            return self.hourly
+        return [slot for slot in self.hourly if slot.hour + 3 > self.observed_hour] or self.hourly[-1:]
+
+
+def _city_parts(city: str) -> List[str]:
+    # "Paris, TX" -> ["Paris", "TX"]; the state or country after a comma picks which Paris
+    return [" ".join(part.split()) for part in city.split(",") if part.strip()]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", text.lower()).split())
+
+
+def normalize_city(city: str) -> str:
+    """The city itself, ignoring case, spacing and any state or country: 'Dhaka, BD' -> 'dhaka'."""
+    parts = _city_parts(city)
+    return _normalize(parts[0]) if parts else ""
+
+
+def normalize_query(city: str) -> str:
+    """The whole place as asked, qualifiers included: 'Paris, TX' -> 'paris tx'."""
+    return _normalize(city)
+
+
+def _qualifier(city: str) -> str:
+    return _normalize(" ".join(_city_parts(city)[1:]))
+
+
+def entry_key(city_key: str, report: CityWeather) -> str:
+    """Cache key for a fetched report: the city plus the country wttr.in resolved it to."""
+    return f"{city_key}/{_normalize(report.country)}"
+
+
+def wttr_location(city: str) -> str:
+    """The place as wttr.in expects it in the URL path: 'Portland, Maine' -> 'Portland,Maine'."""
+    return quote(",".join(part.replace(" ", "+") for part in _city_parts(city)), safe=",+")
+
+
+def display_name(city: str) -> str:
+    """The place as the user named it, with the city itself capitalised: 'paris, TX' -> 'Paris, TX'."""
+    parts = _city_parts(city)
+    return ", ".join([parts[0].title(), *parts[1:]]) if parts else ""
+
+
+def _int(value: Any, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _desc(entry: Dict[str, Any]) -> str:
+    return ((entry.get("weatherDesc") or [{}])[0].get("value") or "").strip()
+
+
+def _observed_hour(stamp: str) -> Optional[int]:
+    # localObsDateTime looks like "2025-06-01 03:12 PM"
+    try:
+        return datetime.strptime(stamp.strip(), "%Y-%m-%d %I:%M %p").hour
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_j1(payload: Dict[str, Any], city_name: str = "") -> CityWeather:
+    """
+    Pull current conditions and today's forecast out of a wttr.in ?format=j1 response.
+
+    city_name is shown as the place; wttr.in's own nearest area is only used
+    without one, since it is sometimes a suburb the user never mentioned.
+    """
+    current = payload["current_condition"][0]
+    today = (payload.get("weather") or [{}])[0]
+    area = (payload.get("nearest_area") or [{}])[0]
+    hourly = [
+        HourlyForecast(
+            hour=_int(slot.get("time")) // 100,
+            temp_c=_int(slot.get("tempC")),
+            chance_of_rain=_int(slot.get("chanceofrain")),
+            precip_mm=float(slot.get("precipMM") or 0),
+            description=_desc(slot),
+        )
+        for slot in today.get("hourly", [])
+    ]
+    return CityWeather(
+        area=city_name or ((area.get("areaName") or [{}])[0].get("value") or "").strip(),
+        country=((area.get("country") or [{}])[0].get("value") or "").strip(),
+        description=_desc(current),
+        temp_c=_int(current.get("temp_C")),
+        feels_like_c=_int(current.get("FeelsLikeC")),
+        humidity=_int(current.get("humidity")),
+        wind_kmph=_int(current.get("windspeedKmph")),
+        observed_hour=_observed_hour(current.get("localObsDateTime", "")),
+        max_temp_c=_int(today.get("maxtempC")),
+        min_temp_c=_int(today.get("mintempC")),
+        hourly=hourly,
+        region=((area.get("region") or [{}])[0].get("value") or "").strip(),
+    )
+
+
+class WeatherCache:
+    """
+    Structured weather per city, fetched from wttr.in once per TTL.
+
+    Current conditions, today's forecast and the umbrella answer are all
+    rendered from the same cached report, and concurrent requests for a city
+    share one fetch.
+
+    Reports are stored per city and resolved country, so "Dhaka", "dhaka "
+    and "Dhaka, BD" share one entry while "Paris, TX" stays apart from
+    "Paris". Each way of asking is remembered as an alias of the entry it
+    resolved to; a qualifier that names a cached report's country or region
+    is matched without a fetch.
+    """
+
+    def __init__(self, ttl: float = WEATHER_TTL_SECONDS, max_cities: int = MAX_CITIES):
+        self.ttl = ttl
+        self.max_cities = max_cities
+        self._entries: "OrderedDict[str, Tuple[CityWeather, float]]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+        self._fetching: Dict[str, asyncio.Task] = {}
+
+    def _lookup(self, city: str) -> Optional[str]:
+        alias = self._aliases.get(normalize_query(city))
+        if alias in self._entries:
+            return alias
+        qualifier = _qualifier(city)
+        if not qualifier:
+            return None
+        prefix = normalize_city(city) + "/"
+        for key, (report, _) in self._entries.items():
+            if key.startswith(prefix) and qualifier in (_normalize(report.country), _normalize(report.region)):
+                return key
+        return None
+
+    async def get(self, tool_name: str, city: str) -> Tuple[CityWeather, float]:
+        """Return (report, fetched_at) for a city, fetching it if missing or expired."""
+        query = normalize_query(city)
+        if not query:
+            raise ValueError("no city given")
+        key = self._lookup(city)
+        entry = self._entries.get(key) if key else None
+        if entry is not None and time.time() - entry[1] <= self.ttl:
+            self._entries.move_to_end(key)
+            record_cache(tool_name, "weather", True)
+            return entry
+        record_cache(tool_name, "weather", False)
+
+        task = self._fetching.get(query)
+        if task is None:
+            task = start_shared(self._fetch(query, city))
+            self._fetching[query] = task
+
+            def _done(finished: asyncio.Task) -> None:
+                self._fetching.pop(query, None)
+                if not finished.cancelled():
+                    finished.exception()  # retrieved here in case every caller gave up
+
+            task.add_done_callback(_done)
+        try:
+            return await wait_shared(task)
+        except Exception as e:
+            if entry is not None and time.time() - entry[1] <= WEATHER_STALE_SECONDS:
+                logging.warning(f"Weather fetch for {query} failed, serving the cached report: {e}")
+                return entry
+            raise
+
+    async def _fetch(self, query: str, city: str) -> Tuple[CityWeather, float]:
+        # The full query goes to wttr.in, so "Paris, TX" is not answered with Paris, France
+        response = await http_request("GET", f"https://wttr.in/{wttr_location(city)}?format=j1")
+        response.raise_for_status()
+        report = parse_j1(response.json(), display_name(city))
+        key = entry_key(normalize_city(city), report)
+        entry = (report, time.time())
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._aliases[query] = key
+        while len(self._entries) > self.max_cities:
+            evicted, _ = self._entries.popitem(last=False)
+            self._aliases = {alias: target for alias, target in self._aliases.items() if target != evicted}
+        return entry
+
+
+def describe_current(report: CityWeather) -> str:
+    place = f"{report.area}, {report.country}" if report.country else report.area
+    return (f"{place}: {report.description or 'Weather'}, {report.temp_c}°C "
+            f"(feels like {report.feels_like_c}°C), humidity {report.humidity}%, wind {report.wind_kmph} km/h")
+
+
+def describe_today(report: CityWeather) -> str:
+    lines = [f"Today in {report.area}: between {report.min_temp_c}°C and {report.max_temp_c}°C."]
+    for slot in report.remaining_hours():
+        lines.append(f"• {slot.hour:02d}:00 - {slot.description or 'n/a'}, {slot.temp_c}°C, "
+                     f"{slot.chance_of_rain}% chance of rain")
+    return "\n".join(lines)
+
+
+def describe_umbrella(report: CityWeather) -> str:
+    slots = report.remaining_hours()
+    chance = max((slot.chance_of_rain for slot in slots), default=0)
+    rain_mm = sum(slot.precip_mm for slot in slots)
+    if chance >= UMBRELLA_YES or rain_mm >= 1.0:
+        wettest = max(slots, key=lambda slot: slot.chance_of_rain)
+        return (f"Yes, take an umbrella in {report.area} today. There is a {chance}% chance of rain, "
+                f"most likely around {wettest.hour:02d}:00.")
+    if chance >= UMBRELLA_MAYBE:
+        return f"Maybe. There is a {chance}% chance of rain in {report.area} later today, so a small umbrella would be wise."
+    return f"No umbrella needed in {report.area} today. The chance of rain is only {chance}%."
+
+
+_cache: Optional[WeatherCache] = None
+
+
+def get_weather_cache() -> WeatherCache:
+    """Return the process-wide weather cache."""
+    global _cache
+    if _cache is None:
+        _cache = WeatherCache()
+    return _cache